@@ -1,11 +1,12 @@
 import os
-import pickle
 import shutil
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
 from common import config
+from common.functions import lexical_index
+from common.functions.chunk_store import write_chunk_store, get_store_path
 
 DATA_PATH = config.DATA_PATH
 DB_PATH = config.DB_PATH
@@ -47,10 +48,11 @@ def create_vector_db():
     os.makedirs(DB_PATH, exist_ok=True)
     
     # Save chunks for BM25 (AFTER creating directory)
-    CHUNKS_FILE = os.path.join(DB_PATH, "chunks.pkl")
-    with open(CHUNKS_FILE, "wb") as f:
-        pickle.dump(chunks, f)
-    print(f"Saved {len(chunks)} chunks to {CHUNKS_FILE}")
+    chunk_ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+    write_chunk_store(chunks, chunk_ids, DB_PATH)
+    print(f"Saved {len(chunks)} chunks to {get_store_path(DB_PATH)}")
+    lexical_index.index_chunks(chunks, chunk_ids, DB_PATH)
+    print(f"Indexed {len(chunks)} chunks for BM25")
     
     # Initialize Embedding Model
     embeddings = OllamaEmbeddings(model=config.EMBEDDING_MODEL_NAME)
@@ -1,14 +1,12 @@
-import pickle
 import os
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings, ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.retrievers import BM25Retriever
 from sentence_transformers import CrossEncoder
 from common import config
+from common.functions import lexical_index
 
 DB_PATH = config.DB_PATH
-CHUNKS_FILE = os.path.join(DB_PATH, "chunks.pkl")
 
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context.
@@ -23,18 +21,13 @@ Answer (include source filenames as evidence):
 """
 
 def query_rag(query_text):
-    # 1. Load chunks for BM25
-    if not os.path.exists(CHUNKS_FILE):
-        print(f"Chunks file not found at {CHUNKS_FILE}. Run ingest.py first.")
+    # 1. Check the BM25 index
+    if not os.path.exists(lexical_index.get_index_path(DB_PATH)):
+        print(f"BM25 index not found at {lexical_index.get_index_path(DB_PATH)}. Run ingest.py first.")
         return
     
-    with open(CHUNKS_FILE, "rb") as f:
-        all_chunks = pickle.load(f)
-    
     # 2. BM25 Retrieval
-    bm25_retriever = BM25Retriever.from_documents(all_chunks)
-    bm25_retriever.k = 10
-    bm25_results = bm25_retriever.invoke(query_text)
+    bm25_results = lexical_index.search(query_text, k=10, db_path=DB_PATH)
     
     # 3. Vector Retrieval
     embeddings = OllamaEmbeddings(model=config.EMBEDDING_MODEL_NAME)
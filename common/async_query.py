@@ -0,0 +1,208 @@
+import asyncio
+import logging
+
+from functions.async_query_utils import (
+    apolish_question,
+    aget_section,
+    aget_vector_results,
+    agenerate_answer,
+    astream_answer,
+    aembed_question
+)
+from functions.query_utils import build_context, get_bm25_results, get_skill_results, fuse_results, rerank_documents
+from functions.llm_backends import get_llm_backend
+from config import (
+    EMBEDDING_MODEL_NAME,EMBEDDING_BACKEND,ANSWER_CACHE_ENABLED,
+    SPECULATIVE_SECTION_ROUTING,SPECULATIVE_SECTION_MIN_SIMILARITY
+)
+import functions.answer_cache as answer_cache
+from functions.stage_executor import question_similarity
+from functions.tracing import span
+from query import get_read_connection, lookup_candidates, format_sources, cache_answer
+
+# Configure logger
+logger = logging.getLogger('rag_logger')
+
+
+def _lookup_cached_answer(polished_question, entities):
+    with get_read_connection() as conn:
+        return answer_cache.get_cached_answer(conn, polished_question, entities, None)
+
+
+async def _cancel(task):
+    if task is not None and not task.done():
+        task.cancel()
+
+
+async def aretrieve(query_text,use_cache=True):
+    """Async version of query.retrieve, same return shape."""
+    logger.info(f"Starting async RAG query for: {query_text}")
+    logger.info(f"LLM Model: {get_llm_backend().model} ({get_llm_backend().name})")
+    logger.info(f"Embedding Model: {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})")
+
+    # routed on the raw question while the LLM polishes it, see query.retrieve
+    section_task=None
+
+    def start_section_routing():
+        nonlocal section_task
+        section_task=asyncio.create_task(aget_section(query_text))
+
+    question_dict=await apolish_question(query_text,start_section_routing if SPECULATIVE_SECTION_ROUTING else None)
+    logger.info(f"Polished question: {question_dict}")
+    names=question_dict["names"]
+    emails=question_dict["emails"]
+    polished_question=question_dict["polished_question"]
+
+    if polished_question.lower()=="not related":
+        await _cancel(section_task)
+        logger.info("Question not related to context.")
+        return {"answer":"I can only answer questions related to the resume/context.","context":"no context"}
+
+    db_results=[]
+    with span("sql_lookup",names=len(names),emails=len(emails)) as stage:
+        if len(emails)>0 or len(names)>0:
+            # pooled SQLite connections, off the event loop
+            db_results=await asyncio.to_thread(lookup_candidates,names,emails)
+        stage.set(candidates=len(db_results))
+
+    if ANSWER_CACHE_ENABLED and use_cache:
+        # exact matches only, a semantic lookup would add an embedding call
+        with span("answer_cache") as stage:
+            cached=await asyncio.to_thread(_lookup_cached_answer,polished_question,names+emails)
+            stage.set(hit=cached["match"] if cached else False)
+        if cached:
+            await _cancel(section_task)
+            logger.info(f"Answer cache hit ({cached['match']}): {cached['question']}")
+            return {"answer":cached["answer"],"context":cached["context"]}
+
+    section=None
+    if section_task is not None:
+        similarity=question_similarity(query_text,polished_question)
+        if similarity>=SPECULATIVE_SECTION_MIN_SIMILARITY:
+            try:
+                section=await section_task
+            except Exception as e:
+                logger.warning(f"Speculative section routing failed: {e}")
+        else:
+            await _cancel(section_task)
+            logger.info(f"Polished question changed materially ({similarity:.2f}), re-routing sections")
+    if not section:
+        section=await aget_section(polished_question)
+    section_names=section["sections"]
+    logger.info(f"Identified sections: {section_names}")
+
+    chunk_ids=[]
+    for data in db_results:
+        for section_name in section_names:
+            chunk_ids.append(data["email"]+"_"+section_name)
+
+    # the lexical index is a local SQLite file, run it next to the vector search
+    with span("retrieval",chunk_ids=len(chunk_ids)) as stage:
+        bm25_docs,skill_docs,vector_docs=await asyncio.gather(
+            asyncio.to_thread(get_bm25_results,polished_question,section_names,chunk_ids),
+            asyncio.to_thread(get_skill_results,polished_question,chunk_ids),
+            aget_vector_results(polished_question,section_names,chunk_ids)
+        )
+        stage.set(bm25_docs=len(bm25_docs),skill_docs=len(skill_docs),vector_docs=len(vector_docs))
+    logger.info(f"BM25 docs id: {[doc.id for doc in bm25_docs]}")
+    logger.info(f"Vector docs id: {[doc.id for doc in vector_docs]}")
+    docs=vector_docs
+    if not chunk_ids:
+        with span("fusion") as stage:
+            docs=fuse_results({"bm25":bm25_docs,"vector":vector_docs,"skills":skill_docs})
+            stage.set(docs=len(docs))
+        # the model runs on the shared reranker thread, concurrent questions share its batches
+        with span("rerank",candidates=len(docs)) as stage:
+            docs=await asyncio.to_thread(rerank_documents,polished_question,docs)
+            stage.set(docs=len(docs))
+    if not docs:
+        logger.info("No relevant documents found.")
+        return {"answer":"No relevant documents found.","context":"no context"}
+
+    return {
+        "polished_question":polished_question,
+        "names":names,
+        "emails":emails,
+        "section_names":section_names,
+        "chunk_ids":chunk_ids,
+        "docs":docs
+    }
+
+
+async def abuild_context(docs, section_names, full_text=False):
+    """build_context in a thread, it reads the candidate profiles from SQLite."""
+    with span("context_build",docs=len(docs)) as stage:
+        context_text=await asyncio.to_thread(build_context,docs,section_names,None,full_text)
+        stage.set(context_chars=len(context_text))
+        return context_text
+
+
+async def aquery_rag(query_text,full_text=False):
+    """Async version of query_rag."""
+    state=await aretrieve(query_text,use_cache=not full_text)
+    if "answer" in state:
+        return state["answer"],state["context"]
+
+    context_text=await abuild_context(state["docs"],state["section_names"],full_text)
+    answer=await agenerate_answer(query_text,context_text) or ""
+    logger.info("Answer generated successfully.")
+
+    result=answer+format_sources(state["docs"])
+    if answer:
+        await asyncio.to_thread(cache_answer,state,result,context_text)
+    return result,context_text
+
+
+async def aquery_rag_stream(query_text,full_text=False):
+    """Async version of query_rag_stream, yields the same events."""
+    state=await aretrieve(query_text,use_cache=not full_text)
+    if "answer" in state:
+        yield {"type":"token","data":state["answer"]}
+        yield {"type":"done","answer":state["answer"],"context":state["context"]}
+        return
+
+    docs=state["docs"]
+    yield {
+        "type":"candidates",
+        "data":[
+            {
+                "id":doc.id,
+                "email":doc.metadata.get("email"),
+                "section":doc.metadata.get("section"),
+                "source":doc.metadata.get("source")
+            }
+            for doc in docs
+        ]
+    }
+
+    context_text=await abuild_context(docs,state["section_names"],full_text)
+    answer=""
+    # includes the time the consumer takes to send each token on
+    backend=get_llm_backend()
+    with span("llm_generate",backend=backend.name,model=backend.model,context_chars=len(context_text),streamed=True) as stage:
+        async for token in astream_answer(query_text,context_text):
+            answer+=token
+            yield {"type":"token","data":token}
+        stage.set(answer_chars=len(answer))
+    logger.info("Answer streamed successfully.")
+
+    yield {"type":"sources","data":[doc.metadata.get("source","Unknown") for doc in docs]}
+    result=answer+format_sources(docs)
+    if answer:
+        await asyncio.to_thread(cache_answer,state,result,context_text)
+    yield {"type":"done","answer":result,"context":context_text}
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    questions=[
+        "is athul and nihal interested in sports",
+        "who can develop android app",
+    ]
+    # all questions are in flight at the same time
+    for response,_ in await asyncio.gather(*(aquery_rag(q) for q in questions)):
+        print(response)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
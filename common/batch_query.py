@@ -0,0 +1,284 @@
+import json
+import time
+import logging
+import argparse
+from contextlib import contextmanager
+
+from functions.query_utils import (
+    polish_question,
+    get_section,
+    get_vector_results,
+    get_bm25_results,
+    get_skill_results,
+    fuse_results,
+    rerank_documents,
+    embed_questions,
+    generate_answer
+)
+from functions.embedding_cache import normalize_text
+from functions.stage_executor import submit_stage
+from functions.tracing import Trace, use_trace
+from functions.log_stream import LogSession, use_session
+from config import ANSWER_CACHE_ENABLED
+import functions.answer_cache as answer_cache
+from query import get_read_connection, lookup_candidates, get_chunk_ids, format_sources, cache_answer
+
+# Configure logger
+logger = logging.getLogger('rag_logger')
+
+# Batch version of query_rag for screening sweeps. Every stage runs once for
+# all questions: identical questions share polishing, identical polished
+# questions share section routing, embedding and retrieval, the embeddings go
+# to the model in one call and the LLM/retrieval calls of a stage run
+# concurrently on the stage pool.
+#
+# Every distinct question gets its own trace and log lines: the stages run on
+# its behalf record there. A stage shared by several questions (same polished
+# text) records in the first of them only.
+
+
+class _QuestionContexts:
+    """The trace and log session of each distinct question."""
+
+    def __init__(self, unique):
+        self.traces={key:Trace(question) for key,question in unique.items()}
+        self.sessions={key:LogSession() for key in unique}
+
+    @contextmanager
+    def of(self, key):
+        """Records what runs inside the block for the question key (nothing for None)."""
+        if key is None:
+            yield
+            return
+        with use_trace(self.traces[key]), use_session(self.sessions[key]):
+            yield
+
+
+def _run_unique(calls, contexts, owners=None):
+    """
+    Runs {key: (fn, args)} concurrently on the stage pool, each call in the
+    context of its question (owners maps call keys to question keys, by
+    default they are the same).
+    Returns {key: result}, a failed call maps to its exception.
+    """
+    owners=owners or {}
+    futures={}
+    for key,(fn,args) in calls.items():
+        with contexts.of(owners.get(key,key)):
+            futures[key]=submit_stage(fn,*args)
+    results={}
+    for key,future in futures.items():
+        try:
+            results[key]=future.result()
+        except Exception as e:
+            logger.error(f"Batch stage failed for {key}: {e}")
+            results[key]=e
+    return results
+
+
+def _hybrid_results(query_text, section_list, chunk_ids, query_embedding):
+    bm25_docs=get_bm25_results(query_text,section_list,chunk_ids)
+    vector_docs=get_vector_results(query_text,section_list,chunk_ids,query_embedding)
+    if chunk_ids:
+        return vector_docs
+    skill_docs=get_skill_results(query_text,chunk_ids)
+    docs=fuse_results({"bm25":bm25_docs,"vector":vector_docs,"skills":skill_docs})
+    # concurrent retrievals end up in the same reranker batch
+    return rerank_documents(query_text,docs)
+
+
+@contextmanager
+def _timed(timings, stage):
+    start=time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage]=round(time.perf_counter()-start,3)
+
+
+def query_rag_batch(questions):
+    """
+    Answers a list of questions.
+    Returns {"results": [...], "timings": {stage: seconds}, "unique_questions": n}
+    where results has one dict per input question, in order, with question,
+    answer, context, polished_question, sections (or error), and the logs and
+    trace of the question.
+    """
+    timings={}
+    start=time.perf_counter()
+    keys=[normalize_text(q) for q in questions]
+    unique={}
+    for key,question in zip(keys,questions):
+        unique.setdefault(key,question)
+    logger.info(f"Starting RAG batch of {len(questions)} questions ({len(unique)} unique)")
+    contexts=_QuestionContexts(unique)
+
+    # 1. Polish every distinct question
+    with _timed(timings,"polish"):
+        polished=_run_unique({key:(polish_question,(q,)) for key,q in unique.items()},contexts)
+
+    states={}
+    for key,question_dict in polished.items():
+        if isinstance(question_dict,Exception):
+            states[key]={"error":str(question_dict)}
+        elif question_dict["polished_question"].lower()=="not related":
+            states[key]={"answer":"I can only answer questions related to the resume/context.","context":"no context"}
+        else:
+            states[key]={
+                "polished_question":question_dict["polished_question"],
+                "names":question_dict["names"],
+                "emails":question_dict["emails"]
+            }
+    pending={key:state for key,state in states.items() if "polished_question" in state}
+    polished_keys={normalize_text(s["polished_question"]):s["polished_question"] for s in pending.values()}
+
+    # 2. One embedding call for every distinct polished question
+    with _timed(timings,"embed"):
+        embeddings={}
+        if polished_keys:
+            try:
+                vectors=embed_questions(list(polished_keys.values()))
+                embeddings=dict(zip(polished_keys,vectors))
+            except Exception as e:
+                logger.warning(f"Batch embedding failed, embedding per question: {e}")
+
+    # 3. Candidates and answer cache
+    with _timed(timings,"lookup"):
+        for key,state in list(pending.items()):
+            with contexts.of(key):
+                state["db_results"]=lookup_candidates(state["names"],state["emails"])
+                if not ANSWER_CACHE_ENABLED:
+                    continue
+                embedding=embeddings.get(normalize_text(state["polished_question"]))
+                with get_read_connection() as conn:
+                    cached=answer_cache.get_cached_answer(
+                        conn,
+                        state["polished_question"],
+                        state["names"]+state["emails"],
+                        (lambda _q,e=embedding:e) if embedding is not None else None
+                    )
+                if cached:
+                    logger.info(f"Answer cache hit ({cached['match']}): {cached['question']}")
+                    states[key]={"answer":cached["answer"],"context":cached["context"],"polished_question":state["polished_question"]}
+                    del pending[key]
+
+    # 4. Section routing per distinct polished question
+    with _timed(timings,"sections"):
+        owners={}
+        for key,state in pending.items():
+            owners.setdefault(normalize_text(state["polished_question"]),key)
+        routed=_run_unique({
+            normalize_text(s["polished_question"]):(get_section,(s["polished_question"],))
+            for s in pending.values()
+        },contexts,owners)
+
+    # 5. Retrieval, shared by questions with the same polished text and scope
+    with _timed(timings,"retrieve"):
+        calls={}
+        owners={}
+        for key,state in list(pending.items()):
+            section=routed.get(normalize_text(state["polished_question"]))
+            if isinstance(section,Exception) or not section:
+                states[key]={"error":f"Section routing failed: {section}"}
+                del pending[key]
+                continue
+            state["section_names"]=section["sections"]
+            state["chunk_ids"]=get_chunk_ids(state["db_results"],state["section_names"])
+            state["retrieval_key"]=(
+                normalize_text(state["polished_question"]),
+                tuple(state["section_names"]),
+                tuple(state["chunk_ids"])
+            )
+            owners.setdefault(state["retrieval_key"],key)
+            calls[state["retrieval_key"]]=(_hybrid_results,(
+                state["polished_question"],
+                state["section_names"],
+                state["chunk_ids"],
+                embeddings.get(state["retrieval_key"][0])
+            ))
+        retrieved=_run_unique(calls,contexts,owners)
+        for key,state in list(pending.items()):
+            docs=retrieved[state["retrieval_key"]]
+            if isinstance(docs,Exception):
+                states[key]={"error":str(docs)}
+                del pending[key]
+            elif not docs:
+                states[key]={"answer":"No relevant documents found.","context":"no context","polished_question":state["polished_question"]}
+                del pending[key]
+            else:
+                state["docs"]=docs
+
+    # 6. Answer generation
+    with _timed(timings,"generate"):
+        generated=_run_unique({
+            key:(generate_answer,(unique[key],state["docs"],state["section_names"]))
+            for key,state in pending.items()
+        },contexts)
+        for key,state in pending.items():
+            if isinstance(generated[key],Exception):
+                states[key]={"error":str(generated[key])}
+                continue
+            answer,context_text=generated[key]
+            state["answer"]=answer+format_sources(state["docs"])
+            state["context"]=context_text
+            if not answer:
+                continue
+            try:
+                with contexts.of(key):
+                    cache_answer(state,state["answer"],context_text)
+            except Exception as e:
+                logger.warning(f"Could not cache batch answer: {e}")
+
+    timings["total"]=round(time.perf_counter()-start,3)
+    logger.info(f"Batch finished in {timings['total']}s: {timings}")
+
+    results=[]
+    for key,question in zip(keys,questions):
+        state=states[key]
+        result={"question":question}
+        if "error" in state:
+            result["error"]=state["error"]
+        else:
+            result["answer"]=state["answer"]
+            result["context"]=state["context"]
+        result["polished_question"]=state.get("polished_question")
+        result["sections"]=state.get("section_names",[])
+        trace=contexts.traces[key]
+        trace.finish()
+        result["logs"]=contexts.sessions[key].getvalue()
+        result["trace"]=trace.to_dict()
+        results.append(result)
+    return {"results":results,"timings":timings,"unique_questions":len(unique)}
+
+
+def main():
+    parser=argparse.ArgumentParser(description="Answer a batch of questions")
+    parser.add_argument("file",nargs="?",help="Text file with one question per line (default: QUESTIONS_FOR_LLM)")
+    parser.add_argument("--output","-o",help="Write the JSON results to this file")
+    parser.add_argument("--with-context",action="store_true",help="Keep the retrieved context in the output")
+    args=parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.file:
+        with open(args.file,"r",encoding="utf-8") as f:
+            questions=[line.strip() for line in f if line.strip()]
+    else:
+        from test_impl import QUESTIONS_FOR_LLM
+        questions=QUESTIONS_FOR_LLM
+
+    batch=query_rag_batch(questions)
+    for result in batch["results"]:
+        # the log lines already went to the console
+        result.pop("logs",None)
+        if not args.with_context:
+            result.pop("context",None)
+    output=json.dumps(batch,indent=4)
+    if args.output:
+        with open(args.output,"w",encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import os
 
 DATA_PATH = "input"
-DB_PATH = "vector_db"
+DB_PATH = os.getenv("DB_PATH", "vector_db") # fake runs use their own, see the backends below
 # MODEL_NAME = "microsoft/Phi-3-mini-4k-instruct"
 EMBEDDING_MODELS=["llama3.2:3b","nomic-embed-text"]
 MODEL_COLLECTIONS=["gemma3:1b","gemma3:4b","llama3.2:3b"]
@@ -21,8 +21,147 @@ MODEL_NAME = "gemini"
 # MODEL_NAME = "llama3:8b"
 PARSER_LIST=["marker","docling"]
 PARSER=PARSER_LIST[0]
-DB_NAME="db.db"
+DB_NAME=os.getenv("DB_NAME", "db.db")
 
 SQL_MODEL="qwen2.5-coder:3b"
 
-COLLECTION_NAME="resume_collection"
\ No newline at end of file
+COLLECTION_NAME="resume_collection"
+
+# Query embedding cache (LRU in memory, optionally persisted to SQLite)
+EMBEDDING_CACHE_SIZE=2048
+EMBEDDING_CACHE_TTL=24*60*60 # seconds
+EMBEDDING_CACHE_PATH=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db") # set to None to keep it in memory only
+
+# Answer cache for query_rag (exact match, then embedding similarity)
+ANSWER_CACHE_ENABLED=True
+ANSWER_CACHE_SIMILARITY_THRESHOLD=0.95
+ANSWER_CACHE_TTL=7*24*60*60 # seconds
+ANSWER_CACHE_MAX_ENTRIES=500
+
+# Concurrent stages in query_rag
+STAGE_EXECUTOR_WORKERS=8
+SPECULATIVE_SECTION_ROUTING=True # route sections on the raw question while it is being polished
+SPECULATIVE_SECTION_MIN_SIMILARITY=0.6 # below this word overlap, re-route on the polished question
+
+# Rule based pre-classifier in front of polish_question
+PRECLASSIFIER_ENABLED=True
+PRECLASSIFIER_MIN_CONFIDENCE=0.8 # below this the LLM polishes the question
+PRECLASSIFIER_NAMES_TTL=5*60 # seconds between reloads of candidate names
+
+# Local section router in front of get_section_using_llm
+SECTION_ROUTER_ENABLED=True
+SECTION_ROUTER_USE_EMBEDDINGS=True # compare against per-section prototype embeddings
+SECTION_ROUTER_MIN_CONFIDENCE="medium" # "high" | "medium" | "low", below this the LLM routes
+
+# BM25 (lexical) retrieval
+BM25_ENABLED=True # hybrid retrieval: BM25 results are merged with the vector results
+BM25_TOP_K=10
+LEXICAL_INDEX_FILE="lexical.sqlite3" # SQLite FTS5 index, inside DB_PATH
+
+# Memory-mapped columnar copy of the chunks, inside DB_PATH
+CHUNK_STORE_DIR="chunk_store"
+
+# Cross-encoder reranking
+RERANK_ENABLED=True
+RERANKER_MODEL="cross-encoder/ms-marco-MiniLM-L6-v2"
+RERANK_CANDIDATES=20 # only the best retrieved chunks are scored
+RERANK_TOP_N=5
+RERANK_BATCH_SIZE=32 # max (question, chunk) pairs per model call
+RERANK_BATCH_WAIT=0.005 # seconds to wait for other queries to join a batch
+RERANK_CACHE_SIZE=4096
+RERANK_CACHE_TTL=24*60*60 # seconds
+
+# Hybrid retrieval fusion (reciprocal rank fusion of BM25 and vector results)
+FUSION_RRF_K=60
+FUSION_WEIGHTS={"bm25":1.0,"vector":1.0,"skills":1.0}
+FUSION_TOP_N=10 # chunks kept after fusion
+
+# Candidate profiles (users + experience rows) cached in-process
+PROFILE_CACHE_SIZE=1024
+PROFILE_CACHE_TTL=10*60 # seconds
+
+# Normalized skills (user_skills table)
+SKILL_FILTER_ENABLED=True # add candidates whose listed skills match the question as a retrieval source
+SKILL_MATCH_TOP_K=10
+SKILL_VOCABULARY_TTL=5*60 # seconds between reloads of the known skills
+
+# SQLite connection pools (functions/database_utils.py)
+SQLITE_POOL_SIZE=4 # writer connections per database file
+SQLITE_READ_POOL_SIZE=8 # read-only connections per database file
+SQLITE_POOL_TIMEOUT=30 # seconds to wait for a free connection
+SQLITE_BUSY_TIMEOUT=30 # seconds to wait for a lock held by another connection
+SQLITE_SYNCHRONOUS="NORMAL" # safe with WAL, much cheaper than FULL
+SQLITE_CACHED_STATEMENTS=256 # prepared statements kept per connection
+
+# Write-behind queue for the QA history (functions/qa_log_writer.py)
+QA_LOG_QUEUE_SIZE=1000
+QA_LOG_BATCH_SIZE=50 # records per transaction
+QA_LOG_FULL_POLICY="block" # "block": wait, then write on the request thread | "drop": discard the record
+QA_LOG_BLOCK_TIMEOUT=5 # seconds
+
+# Live log stream to the web UI (functions/log_stream.py)
+LOG_EMIT_INTERVAL=0.25 # seconds between log batches sent to a session
+LOG_EMIT_MAX_PENDING=200 # lines held per session between batches, INFO lines beyond it are dropped
+
+# QA history API
+HISTORY_PAGE_SIZE=50
+HISTORY_MAX_PAGE_SIZE=200
+HISTORY_QUESTION_PREVIEW=200 # characters of each question in the history list
+
+# Prompt context packing (functions/context_packer.py)
+CONTEXT_TOKEN_BUDGET=3000 # estimated tokens of candidate context per prompt
+CONTEXT_MAX_CANDIDATES=10
+CONTEXT_MIN_CANDIDATE_TOKENS=150 # smaller shares move the candidate to the overflow line
+
+# Section digests computed at ingest (functions/section_digest.py)
+DIGEST_FACT_MAX_CHARS=200
+DIGEST_MAX_CHARS=1200 # per section
+CONTEXT_USE_DIGESTS=True # prompts use the digests, full section text only when asked
+
+# Gemini client (functions/gemini_utils.py)
+GEMINI_MODEL="gemini-2.0-flash"
+GEMINI_BASE_URL=os.getenv("GEMINI_BASE_URL") # e.g. http://127.0.0.1:8765 for a local stand-in
+GEMINI_TIMEOUT=60 # seconds per request
+GEMINI_MAX_CONCURRENCY=8 # requests in flight per process (per event loop for the async calls), a stream counts until it is consumed
+GEMINI_RATE_PER_SEC=0 # request rate limit (token bucket), 0 for none
+GEMINI_RATE_BURST=10
+GEMINI_MAX_RETRIES=4 # on 408/429/5xx and connection errors
+GEMINI_BACKOFF_BASE=0.5 # seconds, doubled per attempt with full jitter
+GEMINI_BACKOFF_MAX=20 # seconds
+
+# On-disk cache of the LLM responses used at ingest (functions/llm_cache.py)
+LLM_CACHE_ENABLED=True
+LLM_CACHE_DIR="llm_cache"
+LLM_CACHE_MAX_BYTES=512*1024*1024 # least recently used entries go beyond this
+LLM_CACHE_BYPASS=os.getenv("LLM_CACHE_BYPASS", "0")=="1" # ask the models again, still storing the answers
+
+# LLM and embedding backends (functions/llm_backends.py): "ollama", "gemini" or "fake"
+LLM_BACKEND=os.getenv("LLM_BACKEND", "gemini" if MODEL_NAME=="gemini" else "ollama")
+EMBEDDING_BACKEND=os.getenv("EMBEDDING_BACKEND", "fake" if LLM_BACKEND=="fake" else "ollama") # EMBEDDING_MODEL_NAME is one of its models
+SQL_BACKEND=os.getenv("SQL_BACKEND", "fake" if LLM_BACKEND=="fake" else "ollama") # SQL_MODEL is one of its models
+# Fake embeddings and answers don't match real ones, so fake runs keep their own
+# vector DB (with the lexical index and chunk store inside it), SQLite DB and
+# embedding cache; DB_PATH, DB_NAME and EMBEDDING_CACHE_PATH in the environment win
+if "fake" in (LLM_BACKEND, EMBEDDING_BACKEND):
+    DB_PATH=os.getenv("DB_PATH", "vector_db_fake")
+    DB_NAME=os.getenv("DB_NAME", "db_fake.db")
+    EMBEDDING_CACHE_PATH=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache_fake.db")
+OLLAMA_MODEL=MODEL_NAME if MODEL_NAME!="gemini" else "llama3.2:3b"
+OLLAMA_BASE_URL=os.getenv("OLLAMA_BASE_URL") # None for the ollama client default (OLLAMA_HOST or localhost:11434)
+GEMINI_EMBEDDING_MODEL="text-embedding-004"
+
+# Local stand-in for Ollama and Gemini (functions/fake_llm_server.py), used by the "fake" backend
+FAKE_LLM_HOST="127.0.0.1"
+FAKE_LLM_PORT=int(os.getenv("FAKE_LLM_PORT", "11500"))
+FAKE_LLM_URL=os.getenv("FAKE_LLM_URL") # a fake server started elsewhere; None to use FAKE_LLM_HOST:FAKE_LLM_PORT
+FAKE_LLM_AUTOSTART=True # start the server in-process when nothing listens on the port
+FAKE_LLM_MODEL="fake"
+FAKE_LLM_LATENCY=float(os.getenv("FAKE_LLM_LATENCY", "0")) # seconds before each response
+FAKE_LLM_LATENCY_JITTER=float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0")) # up to this many seconds more
+FAKE_LLM_CHUNK_DELAY=float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0")) # seconds between streamed chunks
+FAKE_LLM_ERROR_RATE=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")) # share of requests failed with FAKE_LLM_ERROR_STATUS
+FAKE_LLM_ERROR_STATUS=int(os.getenv("FAKE_LLM_ERROR_STATUS", "503"))
+FAKE_LLM_SEED=int(os.getenv("FAKE_LLM_SEED", "0")) # seeds the latency jitter and the injected errors
+FAKE_LLM_EMBEDDING_DIM=768
+FAKE_LLM_ANSWER_WORDS=60
+FAKE_LLM_FIXTURES=os.getenv("FAKE_LLM_FIXTURES") # JSON file of {"match": regex, "response": ...} rules
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import logging
+from array import array
+from sqlite3 import Error
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    MODEL_NAME, EMBEDDING_MODEL_NAME, LLM_BACKEND, EMBEDDING_BACKEND,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES
+)
+from functions.embedding_cache import normalize_text, cosine_similarity
+
+# Answers depend on both the generation model and the embedding model (and their backends)
+CACHE_MODEL_KEY = f"{LLM_BACKEND}:{MODEL_NAME}|{EMBEDDING_BACKEND}:{EMBEDDING_MODEL_NAME}"
+
+
+def create_answer_cache_table(conn):
+    """
+    Create the answer_cache table.
+    emails/sections record what the cached answer was built from, so ingest
+    can drop the entries affected by a changed CV.
+    entities holds the names/emails asked about; similar questions only
+    match when they are about the same people.
+    scoped is 1 when retrieval was restricted to explicit candidates.
+
+    :param conn: Connection object
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS answer_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_key TEXT NOT NULL,
+        model TEXT NOT NULL,
+        question TEXT,
+        embedding BLOB,
+        entities TEXT,
+        answer TEXT,
+        context TEXT,
+        emails TEXT,
+        sections TEXT,
+        scoped INTEGER DEFAULT 0,
+        created_at REAL NOT NULL
+    );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_key ON answer_cache (question_key, model)")
+
+
+def _row_to_entry(row):
+    return {
+        "id": row[0],
+        "question": row[1],
+        "answer": row[2],
+        "context": row[3]
+    }
+
+
+def _entities_key(entities):
+    return json.dumps(sorted({normalize_text(e) for e in entities or []}))
+
+
+def get_cached_answer(conn, polished_question, entities=None, embed_fn=None, threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD):
+    """
+    Look up a cached answer for a polished question.
+    Tries an exact (normalized) match first, then the most similar cached
+    question by embedding when embed_fn is given.
+
+    :param conn: Connection object
+    :param polished_question: The polished question text
+    :param entities: Names and emails extracted from the question
+    :param embed_fn: Callable returning the embedding of a text (optional)
+    :param threshold: Minimum cosine similarity for a semantic hit
+    :return: Dict with id, question, answer, context and match, or None
+    """
+    try:
+        create_answer_cache_table(conn)
+        min_created = time.time() - ANSWER_CACHE_TTL
+        row = conn.execute(
+            """SELECT id, question, answer, context FROM answer_cache
+            WHERE question_key = ? AND model = ? AND created_at >= ?
+            ORDER BY created_at DESC LIMIT 1""",
+            (normalize_text(polished_question), CACHE_MODEL_KEY, min_created)
+        ).fetchone()
+        if row:
+            entry = _row_to_entry(row)
+            entry["match"] = "exact"
+            return entry
+
+        if embed_fn is None:
+            return None
+        rows = conn.execute(
+            """SELECT id, embedding FROM answer_cache
+            WHERE model = ? AND entities = ? AND created_at >= ? AND embedding IS NOT NULL""",
+            (CACHE_MODEL_KEY, _entities_key(entities), min_created)
+        ).fetchall()
+        if not rows:
+            return None
+
+        query_embedding = embed_fn(polished_question)
+        best_id, best_score = None, threshold
+        for cache_id, blob in rows:
+            vector = array("f")
+            vector.frombytes(blob)
+            score = cosine_similarity(query_embedding, vector)
+            if score >= best_score:
+                best_id, best_score = cache_id, score
+        if best_id is None:
+            return None
+
+        row = conn.execute(
+            "SELECT id, question, answer, context FROM answer_cache WHERE id = ?", (best_id,)
+        ).fetchone()
+        entry = _row_to_entry(row)
+        entry["match"] = "similar"
+        entry["similarity"] = round(best_score, 4)
+        return entry
+    except Error as e:
+        logging.error(f"Error reading answer cache: {e}")
+        return None
+
+
+def save_cached_answer(conn, polished_question, answer, context, emails, sections, entities=None, scoped=False, embedding=None):
+    """
+    Store an answer in the cache and trim it to ANSWER_CACHE_MAX_ENTRIES.
+
+    :param conn: Connection object
+    :param polished_question: The polished question text
+    :param answer: Final answer text (including sources)
+    :param context: Context string sent to the LLM
+    :param emails: Emails of the candidates in the context
+    :param sections: Sections used for retrieval
+    :param entities: Names and emails extracted from the question
+    :param scoped: True if retrieval was limited to explicit candidates
+    :param embedding: Embedding of the polished question (optional)
+    """
+    try:
+        create_answer_cache_table(conn)
+        blob = array("f", embedding).tobytes() if embedding is not None else None
+        conn.execute(
+            """INSERT INTO answer_cache
+            (question_key, model, question, embedding, entities, answer, context, emails, sections, scoped, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                normalize_text(polished_question), CACHE_MODEL_KEY, polished_question, blob, _entities_key(entities),
+                answer, context, json.dumps(sorted(set(emails))), json.dumps(sorted(set(sections))),
+                1 if scoped else 0, time.time()
+            )
+        )
+        conn.execute(
+            """DELETE FROM answer_cache WHERE id NOT IN
+            (SELECT id FROM answer_cache ORDER BY created_at DESC LIMIT ?)""",
+            (ANSWER_CACHE_MAX_ENTRIES,)
+        )
+        conn.commit()
+    except Error as e:
+        logging.error(f"Error saving answer cache: {e}")
+
+
+def invalidate_answers(conn, emails=None, sections=None):
+    """
+    Drop cached answers that may change after candidates were (re)ingested.
+    An entry is dropped if it mentions one of the emails, or if it was an
+    open (unscoped) search over one of the sections, since a new candidate
+    could now rank for it. An open search without sections went over every
+    section and is dropped on any change.
+
+    :param conn: Connection object
+    :param emails: Changed candidate emails
+    :param sections: Sections that were (re)ingested
+    :return: Number of entries removed
+    """
+    emails = set(emails or [])
+    sections = set(sections or [])
+    try:
+        create_answer_cache_table(conn)
+        rows = conn.execute("SELECT id, emails, sections, scoped FROM answer_cache").fetchall()
+        stale_ids = []
+        for cache_id, row_emails, row_sections, scoped in rows:
+            if emails & set(json.loads(row_emails or "[]")):
+                stale_ids.append(cache_id)
+            elif not scoped:
+                row_sections = set(json.loads(row_sections or "[]"))
+                if (sections & row_sections) or (not row_sections and (sections or emails)):
+                    stale_ids.append(cache_id)
+        conn.executemany("DELETE FROM answer_cache WHERE id = ?", [(i,) for i in stale_ids])
+        conn.commit()
+        if stale_ids:
+            logging.info(f"Invalidated {len(stale_ids)} cached answer(s)")
+        return len(stale_ids)
+    except Error as e:
+        logging.error(f"Error invalidating answer cache: {e}")
+        return 0
+
+
+def clear_answer_cache(conn):
+    """
+    Remove every cached answer, e.g. after the vector store was reset.
+
+    :param conn: Connection object
+    """
+    try:
+        create_answer_cache_table(conn)
+        conn.execute("DELETE FROM answer_cache")
+        conn.commit()
+    except Error as e:
+        logging.error(f"Error clearing answer cache: {e}")
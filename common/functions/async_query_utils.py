@@ -0,0 +1,110 @@
+import os
+import sys
+import asyncio
+import logging
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DB_PATH, EMBEDDING_MODEL_NAME, COLLECTION_NAME
+from functions.retriever_pool import get_vector_store
+from functions.question_classifier import pre_classify
+from functions.section_router import route_sections
+from functions.llm_backends import get_llm_backend
+from functions.tracing import span
+from functions.query_utils import (
+    PROMPT_TEMPLATE,
+    SECTION_TEMPLATE,
+    POLISH_TEMPLATE,
+    check_question_entities,
+    format_prompt,
+    get_chunks_by_ids
+)
+
+logger = logging.getLogger('rag_logger')
+
+# Async counterparts of the LLM/embedding stages in query_utils.
+# Network calls are awaited; the blocking local stages (pre-classifier,
+# section router, Chroma search on the local SQLite store) run in a thread.
+
+
+async def aget_data_using_llm(question, TEMPLATE, context="", is_json=True):
+    backend = get_llm_backend()
+    prompt = format_prompt(TEMPLATE, question=question, context=context)
+    if not is_json:
+        content = await backend.achat(prompt)
+        return content.strip() if content else None
+    return await backend.ajson_chat(prompt, temperature=0.0)
+
+
+async def apolish_question(question, on_llm=None):
+    """Async polish_question, on_llm() is called right before the LLM is asked."""
+    with span("polish", input_chars=len(question)) as stage:
+        # SQLite read of the candidate names, off the event loop
+        question_dict = await asyncio.to_thread(pre_classify, question)
+        if question_dict:
+            stage.set(source="classifier")
+            return question_dict
+        if on_llm is not None:
+            on_llm()
+        question_dict = await aget_data_using_llm(question, POLISH_TEMPLATE)
+        stage.set(source="llm")
+        return check_question_entities(question, question_dict)
+
+
+async def aget_section(question):
+    """Local section routing, escalating to the LLM when unsure."""
+    with span("section_routing", input_chars=len(question)) as stage:
+        # the router embeds the question (and its prototypes on first use)
+        section = await asyncio.to_thread(route_sections, question)
+        if section:
+            stage.set(source="router", sections=section["sections"])
+            return section
+        section = await aget_data_using_llm(question, SECTION_TEMPLATE)
+        if not isinstance(section, dict) or not isinstance(section.get("sections"), list):
+            # no usable answer from the LLM: search every section
+            section = {"sections": []}
+        stage.set(source="llm", sections=section["sections"])
+        return section
+
+
+async def aembed_question(query_text):
+    db = get_vector_store(DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME)
+    return await db.embeddings.aembed_query(query_text)
+
+
+async def aget_vector_results(query_text, section_list=[], chunk_ids=[]):
+    """Async version of get_vector_results; only the embedding call goes over the network."""
+    db = get_vector_store(DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME)
+    if len(chunk_ids) > 0:
+        return await asyncio.to_thread(get_chunks_by_ids, chunk_ids)
+    lst = [{"section": x} for x in section_list]
+    filter = None
+    if len(section_list) == 1:
+        filter = lst[0]
+    elif len(section_list) > 1:
+        filter = {"$or": lst}
+    embedding = await aembed_question(query_text)
+    results = await asyncio.to_thread(
+        db.similarity_search_by_vector_with_relevance_scores,
+        embedding,
+        k=10,
+        filter=filter
+    )
+    for doc, score in results:
+        doc.metadata["vector_score"] = score
+    return [doc for doc, score in results]
+
+
+async def agenerate_answer(query_text, context_text):
+    backend = get_llm_backend()
+    with span("llm_generate", backend=backend.name, model=backend.model, context_chars=len(context_text)) as stage:
+        answer = await aget_data_using_llm(query_text, PROMPT_TEMPLATE, context_text, is_json=False)
+        stage.set(answer_chars=len(answer or ""))
+        return answer
+
+
+async def astream_answer(query_text, context_text):
+    """Async version of stream_answer. Yields text chunks."""
+    prompt = format_prompt(PROMPT_TEMPLATE, context=context_text, question=query_text)
+    async for chunk in get_llm_backend().astream(prompt):
+        yield chunk
@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import mmap
+import shutil
+import hashlib
+import logging
+import threading
+from array import array
+
+from langchain_core.documents import Document
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DB_PATH, CHUNK_STORE_DIR
+
+logger = logging.getLogger('rag_logger')
+
+# Columnar, memory-mapped store of the ingested chunks.
+#
+#   meta.json      ids, metadata column names and their interned value tables
+#   text.bin       all chunk texts, UTF-8, back to back
+#   offsets.bin    uint64 start of every chunk in text.bin (+ end of the last one)
+#   col_<i>.bin    uint32 code per chunk into the value table of column i
+#
+# Opening the store maps the files and reads meta.json only; Documents are
+# built for the rows that are actually asked for. Worker processes mapping the
+# same files share the pages.
+
+MISSING = 0xFFFFFFFF
+TEXT_FILE = "text.bin"
+OFFSETS_FILE = "offsets.bin"
+META_FILE = "meta.json"
+
+
+def chunk_key(doc):
+    """Identity of a chunk: its id, else its metadata chunk_id, else a hash of its text."""
+    if doc.id:
+        return doc.id
+    if doc.metadata.get("chunk_id"):
+        return doc.metadata["chunk_id"]
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def get_store_path(db_path=DB_PATH):
+    return os.path.join(db_path, CHUNK_STORE_DIR)
+
+
+def _column_file(i):
+    return f"col_{i}.bin"
+
+
+def _write_array(path, typecode, values):
+    with open(path, "wb") as f:
+        array(typecode, values).tofile(f)
+
+
+def write_chunk_store(chunks, ids, db_path=DB_PATH, append=False):
+    """
+    Writes chunks to the store. The files are built in a temporary directory
+    and swapped in, so readers never see a half written store.
+
+    :param chunks: list of Documents
+    :param ids: chunk ids, same order as chunks
+    :param append: keep the chunks already in the store (rows with the same id are replaced)
+    """
+    rows = list(zip(ids, chunks))
+    if append:
+        store = open_chunk_store(db_path)
+        if store is not None:
+            replaced = set(ids)
+            rows = [
+                (id, store.get(id)) for id in store.ids if id not in replaced
+            ] + rows
+            store.close()
+
+    columns = []
+    for _, chunk in rows:
+        for key in chunk.metadata:
+            if key not in columns:
+                columns.append(key)
+    tables = [[] for _ in columns]
+    lookups = [{} for _ in columns]
+    codes = [[] for _ in columns]
+    offsets = [0]
+
+    path = get_store_path(db_path)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    with open(os.path.join(tmp_path, TEXT_FILE), "wb") as text_file:
+        for _, chunk in rows:
+            data = chunk.page_content.encode("utf-8")
+            text_file.write(data)
+            offsets.append(offsets[-1] + len(data))
+            for i, key in enumerate(columns):
+                if key not in chunk.metadata:
+                    codes[i].append(MISSING)
+                    continue
+                # JSON text keeps ints/floats apart from strings when interning
+                value = json.dumps(chunk.metadata[key])
+                code = lookups[i].get(value)
+                if code is None:
+                    code = lookups[i][value] = len(tables[i])
+                    tables[i].append(chunk.metadata[key])
+                codes[i].append(code)
+
+    _write_array(os.path.join(tmp_path, OFFSETS_FILE), "Q", offsets)
+    for i in range(len(columns)):
+        _write_array(os.path.join(tmp_path, _column_file(i)), "I", codes[i])
+    with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"ids": [id for id, _ in rows], "columns": columns, "values": tables}, f)
+
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    logger.info(f"Wrote {len(rows)} chunks to the chunk store in {path}")
+
+
+class ChunkStore:
+    """Read-only view of a chunk store directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.columns = meta["columns"]
+        self.values = meta["values"]
+        self._rows = {id: row for row, id in enumerate(self.ids)}
+        self._files = []
+        self._maps = []
+        self._text = self._map(TEXT_FILE)
+        self._offsets = self._view(OFFSETS_FILE, "Q")
+        self._codes = [self._view(_column_file(i), "I") for i in range(len(self.columns))]
+
+    def _map(self, name):
+        f = open(os.path.join(self.path, name), "rb")
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files can't be mapped
+            return b""
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(m)
+        return m
+
+    def _view(self, name, typecode):
+        return memoryview(self._map(name)).cast(typecode)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return id in self._rows
+
+    def text(self, row):
+        return self._text[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def metadata(self, row):
+        metadata = {}
+        for column, values, codes in zip(self.columns, self.values, self._codes):
+            code = codes[row]
+            if code != MISSING:
+                metadata[column] = values[code]
+        return metadata
+
+    def get(self, id):
+        """Returns the Document for a chunk id, or None."""
+        row = self._rows.get(id)
+        if row is None:
+            return None
+        return Document(id=id, page_content=self.text(row), metadata=self.metadata(row))
+
+    def get_by_ids(self, ids):
+        """Documents for the ids that are in the store, in the given order."""
+        return [doc for doc in (self.get(id) for id in ids) if doc is not None]
+
+    def close(self):
+        for view in [self._offsets] + self._codes:
+            view.release()
+        for m in self._maps:
+            m.close()
+        for f in self._files:
+            f.close()
+        self._maps = []
+        self._files = []
+
+
+def open_chunk_store(db_path=DB_PATH):
+    """Opens the store under db_path, None when nothing was written yet."""
+    path = get_store_path(db_path)
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        return None
+    return ChunkStore(path)
+
+
+_store = None
+_store_version = None
+_lock = threading.Lock()
+
+
+def get_chunk_store(db_path=DB_PATH):
+    """
+    Shared store for the process, reopened when ingest has rewritten it.
+    Returns None when there is no store.
+    """
+    global _store, _store_version
+    try:
+        version = os.stat(os.path.join(get_store_path(db_path), META_FILE)).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        if _store is None or _store_version != version or _store.path != get_store_path(db_path):
+            # the old maps stay valid for readers that still hold them
+            _store = open_chunk_store(db_path)
+            _store_version = version
+        return _store
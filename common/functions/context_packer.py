@@ -0,0 +1,200 @@
+import os
+import sys
+import math
+import logging
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_CANDIDATES, CONTEXT_MIN_CANDIDATE_TOKENS, CONTEXT_USE_DIGESTS
+
+logger = logging.getLogger('rag_logger')
+
+# Builds the prompt context within a token budget.
+#
+# Retrieved chunks are grouped per candidate and the candidates ranked by how
+# many of the asked sections they cover, then by where their chunks came in
+# the retrieval ranking. The budget is shared out max-min fair: small
+# candidates get all they need, the rest split what is left evenly. When a
+# share would be too small to be useful the lowest ranked candidate moves to
+# an overflow line that only names it. Everything is a pure function of the
+# inputs, so the same docs always give the same prompt.
+#
+# Sections are rendered from their ingest-time digest (metadata["digest"],
+# see section_digest.py) unless the full text is asked for; chunks ingested
+# before digests existed fall back to their text.
+
+CANDIDATE_END = "\n\n=== CANDIDATE END ===\n\n"
+TRUNCATED = " [...]"
+
+
+def estimate_tokens(text):
+    """Token estimate, about 4 characters per token for English text."""
+    return math.ceil(len(text) / 4)
+
+
+def _cut(text, tokens):
+    """First `tokens` worth of text, cut at a word boundary."""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip()
+
+
+def rank_candidates(docs, section_list):
+    """
+    Groups docs per candidate (email) and ranks the groups.
+
+    :param docs: retrieved docs, best first
+    :param section_list: the sections the question asked for
+    :return: list of (email, docs) best first
+    """
+    groups = {}
+    for position, doc in enumerate(docs):
+        email = doc.metadata.get("email", "Unknown")
+        group = groups.setdefault(email, {"docs": [], "score": 0.0, "first": position})
+        group["docs"].append(doc)
+        group["score"] += 1 / (1 + position)
+
+    asked = set(section_list)
+
+    def coverage(group):
+        sections = {doc.metadata.get("section") for doc in group["docs"]}
+        return len(sections & asked) if asked else len(sections)
+
+    ranked = sorted(groups.items(), key=lambda x: (-coverage(x[1]), -x[1]["score"], x[1]["first"]))
+    return [(email, group["docs"]) for email, group in ranked]
+
+
+def _header(general):
+    return (
+        f"\t=== CANDIDATE START ===\n"
+        f"\t# This is the cv of {general['name']}\n"
+        f"\t## Personal information\n"
+        f"\tName: {general['name']}\n"
+        f"\tEmail: {general['email']}\n"
+    )
+
+
+def _section(doc, text):
+    return f"\n\n\t## {doc.metadata.get('section', 'contents')}\n\n\t{text}"
+
+
+def section_text(doc, use_digests=CONTEXT_USE_DIGESTS):
+    """The digest of a chunk when there is one and digests are used, else its full text."""
+    if use_digests and doc.metadata.get("digest"):
+        return doc.metadata["digest"]
+    return doc.page_content
+
+
+def render_candidate(general, docs, tokens=None, use_digests=CONTEXT_USE_DIGESTS):
+    """
+    The context block of one candidate. With a token allowance the sections
+    are kept in order until it runs out; the section that overflows is cut and
+    the ones after it are only named.
+    """
+    result = _header(general)
+    if tokens is None:
+        return result + "".join(_section(doc, section_text(doc, use_digests)) for doc in docs)
+    left = tokens - estimate_tokens(result)
+    for i, doc in enumerate(docs):
+        text = section_text(doc, use_digests)
+        block = _section(doc, text)
+        size = estimate_tokens(block)
+        if size <= left:
+            result += block
+            left -= size
+            continue
+        # room for naming the sections that don't fit, then cut this one
+        rest = [d.metadata.get("section", "contents") for d in docs[i:]]
+        left -= estimate_tokens(_omitted_note(rest)) + estimate_tokens(_section(doc, TRUNCATED))
+        if left > 0:
+            result += _section(doc, _cut(text, left) + TRUNCATED)
+            rest = rest[1:]
+        if rest:
+            result += _omitted_note(rest)
+        break
+    return result
+
+
+def _omitted_note(sections):
+    return f"\n\n\t(left out for length: {', '.join(sections)})"
+
+
+def fair_shares(sizes, budget):
+    """Max-min fair split of budget: nobody gets more than they need, the rest is shared evenly."""
+    shares = [0] * len(sizes)
+    left = budget
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i], i))
+    for n, i in enumerate(order):
+        share = min(sizes[i], left // (len(sizes) - n))
+        shares[i] = share
+        left -= share
+    return shares
+
+
+def _overflow_line(generals):
+    names = ", ".join(f"{general['name']} ({general['email']})" for general in generals)
+    return f"Other matching candidates, left out for length: {names}\n"
+
+
+def pack_context(docs, section_list, profiles, budget=CONTEXT_TOKEN_BUDGET,
+                 max_candidates=CONTEXT_MAX_CANDIDATES, min_tokens=CONTEXT_MIN_CANDIDATE_TOKENS,
+                 use_digests=CONTEXT_USE_DIGESTS):
+    """
+    Builds the context text for the docs within about `budget` tokens.
+
+    :param docs: retrieved docs, best first
+    :param section_list: the sections the question asked for
+    :param profiles: email -> profile, for the candidate names
+    :param budget: token budget of the whole context
+    :param max_candidates: candidates shown at most, the others go to the overflow line
+    :param min_tokens: smallest useful allowance for a candidate
+    :param use_digests: render sections from their digests, False for the full text
+    :return: (context_text, stats dict)
+    """
+    def general_of(email):
+        return profiles[email]["general"] if email in profiles else {"name": email, "email": email}
+
+    candidates = rank_candidates(docs, section_list)
+    shown = candidates[:max_candidates]
+    overflow = candidates[max_candidates:]
+    end_tokens = estimate_tokens(CANDIDATE_END)
+
+    while True:
+        blocks = [render_candidate(general_of(email), group, use_digests=use_digests) for email, group in shown]
+        available = budget
+        if overflow:
+            available -= estimate_tokens(_overflow_line([general_of(email) for email, _ in overflow]))
+        sizes = [estimate_tokens(block) + end_tokens for block in blocks]
+        shares = fair_shares(sizes, max(available, 0))
+        if len(shown) <= 1 or all(share >= min(min_tokens, size) for share, size in zip(shares, sizes)):
+            break
+        overflow.insert(0, shown.pop())
+
+    context_list = []
+    truncated = 0
+    for (email, group), block, size, share in zip(shown, blocks, sizes, shares):
+        if share < size:
+            block = render_candidate(general_of(email), group, share - end_tokens, use_digests)
+            truncated += 1
+        context_list.append(block)
+
+    context_text = CANDIDATE_END.join(context_list)
+    context_text += CANDIDATE_END
+    if overflow:
+        context_text += _overflow_line([general_of(email) for email, _ in overflow])
+
+    stats = {
+        "candidates": len(shown),
+        "overflow": len(overflow),
+        "truncated": truncated,
+        "tokens": estimate_tokens(context_text),
+        "budget": budget,
+        "digests": use_digests
+    }
+    logger.info(f"Packed context: {stats}")
+    return context_text, stats
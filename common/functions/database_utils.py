@@ -1,9 +1,27 @@
+import os
+import sys
+import re
+import queue
+import atexit
+import pathlib
 import sqlite3
 from sqlite3 import Error
 import logging
 import json
+import threading
 from contextlib import contextmanager
 
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL,
+    SQLITE_POOL_SIZE, SQLITE_READ_POOL_SIZE, SQLITE_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT, SQLITE_SYNCHRONOUS, SQLITE_CACHED_STATEMENTS,
+    HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, HISTORY_QUESTION_PREVIEW
+)
+from functions.cache_utils import LRUCache
+from functions.skills import normalize_skill
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -18,7 +36,7 @@ def create_connection(db_file):
     conn = None
     try:
         conn = sqlite3.connect(db_file)
-        logging.info(f"Connected to SQLite database: {db_file}")
+        logging.debug(f"Connected to SQLite database: {db_file}")
         return conn
     except Error as e:
         logging.error(f"Error connecting to database: {e}")
@@ -153,28 +171,161 @@ def close_connection(conn):
     """
     if conn:
         conn.close()
-        logging.info("Database connection closed")
+        logging.debug("Database connection closed")
+
+class ConnectionPool:
+    """
+    Pool of persistent connections to one SQLite file.
+    Connections are opened on demand up to max_size, reused most recently
+    used first, and rolled back when returned with an open transaction.
+    The writer pool switches the file to WAL so readers don't block on it;
+    read_only pools open the file with mode=ro.
+    """
+
+    def __init__(self, db_file, max_size=SQLITE_POOL_SIZE, read_only=False):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.read_only:
+            uri = pathlib.Path(os.path.abspath(self.db_file)).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=SQLITE_BUSY_TIMEOUT,
+                                   check_same_thread=False, cached_statements=SQLITE_CACHED_STATEMENTS)
+        else:
+            conn = sqlite3.connect(self.db_file, timeout=SQLITE_BUSY_TIMEOUT,
+                                   check_same_thread=False, cached_statements=SQLITE_CACHED_STATEMENTS)
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        logging.debug(f"Opened pooled SQLite connection to {self.db_file} (read_only={self.read_only})")
+        return conn
+
+    def acquire(self):
+        """
+        Take a connection, opening a new one while the pool is below max_size.
+        Waits up to SQLITE_POOL_TIMEOUT seconds when every connection is in use.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.max_size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=SQLITE_POOL_TIMEOUT)
+        except queue.Empty:
+            raise Error(f"No free connection to {self.db_file} after {SQLITE_POOL_TIMEOUT}s")
+
+    def release(self, conn):
+        """Give a connection back, discarding it when it can't be reset."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def close(self):
+        """Close the idle connections; connections in use are closed when released."""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_file, read_only=False):
+    """
+    Get the process-wide pool for a database file.
+    
+    :param db_file: database file path
+    :param read_only: True for the read-only pool
+    :return: ConnectionPool
+    """
+    key = (os.path.abspath(db_file), read_only)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                size = SQLITE_READ_POOL_SIZE if read_only else SQLITE_POOL_SIZE
+                pool = _pools[key] = ConnectionPool(db_file, size, read_only)
+    return pool
+
+def close_all_pools():
+    """Close every pool, used at shutdown."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+atexit.register(close_all_pools)
 
 @contextmanager
+def _pooled_connection(pool):
+    try:
+        conn = pool.acquire()
+    except Error as e:
+        logging.error(f"Error connecting to database: {e}")
+        conn = None
+    try:
+        yield conn
+    finally:
+        if conn:
+            pool.release(conn)
+
 def get_db_connection(db_file):
     """
     Context manager for database connections.
-    Automatically closes the connection when the block exits.
+    Borrows a connection from the pool of db_file and returns it when the block exits.
     
     Usage:
     with get_db_connection(db_file) as conn:
         # do operations
     """
-    conn = None
-    try:
-        conn = create_connection(db_file)
-        if conn is None:
-            yield None
-        else:
-            yield conn
-    finally:
-        if conn:
-            close_connection(conn)
+    return _pooled_connection(get_pool(db_file))
+
+def get_read_connection(db_file):
+    """
+    Context manager for read-only connections, for query traffic.
+    Falls back to the writer pool while the database file doesn't exist yet.
+    
+    Usage:
+    with get_read_connection(db_file) as conn:
+        # SELECT only
+    """
+    if not os.path.exists(db_file):
+        return get_db_connection(db_file)
+    return _pooled_connection(get_pool(db_file, read_only=True))
 
 def create_resume_tables(conn):
     """
@@ -206,8 +357,61 @@ def create_resume_tables(conn):
     );
     """
     
+    # one row per (candidate, canonical skill), see functions/skills.py
+    skills_sql = """
+    CREATE TABLE IF NOT EXISTS user_skills (
+        email TEXT NOT NULL,
+        skill TEXT,
+        skill_norm TEXT NOT NULL,
+        PRIMARY KEY (email, skill_norm),
+        FOREIGN KEY (email) REFERENCES users (email)
+    ) WITHOUT ROWID;
+    """
+    
     create_table(conn, users_sql)
     create_table(conn, experience_sql)
+    create_table(conn, skills_sql)
+    create_table(conn, "CREATE INDEX IF NOT EXISTS idx_user_skills_norm ON user_skills (skill_norm, email);")
+    backfill_user_skills(conn)
+
+def replace_user_skills(conn, email, skills):
+    """
+    Replace the normalized skills of a candidate.
+    
+    :param conn: Connection object
+    :param email: candidate email
+    :param skills: list of skills as written in the CV
+    """
+    rows = {}
+    for skill in skills or []:
+        skill_norm = normalize_skill(skill)
+        if skill_norm and skill_norm not in rows:
+            rows[skill_norm] = (email, str(skill).strip(), skill_norm)
+    try:
+        with conn:
+            conn.execute("DELETE FROM user_skills WHERE email = ?", (email,))
+            conn.executemany("INSERT INTO user_skills (email, skill, skill_norm) VALUES (?, ?, ?)", list(rows.values()))
+    except Error as e:
+        logging.error(f"Error saving skills of {email}: {e}")
+
+def backfill_user_skills(conn):
+    """
+    Fill user_skills from users.skills for databases created before the table existed.
+    
+    :param conn: Connection object
+    """
+    if read_records(conn, "SELECT 1 FROM user_skills LIMIT 1"):
+        return
+    rows = read_records(conn, "SELECT email, skills FROM users WHERE skills IS NOT NULL")
+    for email, skills_str in rows:
+        try:
+            skills = json.loads(skills_str)
+        except ValueError:
+            continue
+        if isinstance(skills, list):
+            replace_user_skills(conn, email, skills)
+    if rows:
+        logging.info(f"Backfilled user_skills for {len(rows)} users")
 
 def insert_resume_data(conn, resume_data):
     """
@@ -237,6 +441,7 @@ def insert_resume_data(conn, resume_data):
         
         user_params = (email, general.get("name"), general.get("position"), skills_str)
         create_record(conn, user_sql, user_params)
+        replace_user_skills(conn, email, skills)
         
         # Insert experience
         # First, delete existing experience for this user
@@ -259,11 +464,144 @@ def insert_resume_data(conn, resume_data):
             )
             create_record(conn, exp_sql, exp_params)
         
+        invalidate_profiles([email])
         logging.info(f"Inserted resume data for user: {email}")
 
     except Exception as e:
         logging.error(f"Error inserting resume data: {e}")
 
+def user_row_to_dict(user_data):
+    """
+    Convert a users row to a dict, decoding the skills JSON.
+    
+    :param user_data: tuple (email, name, position, skills)
+    :return: Dict with email, name, position, skills
+    """
+    user_dict = {
+        "email": user_data[0],
+        "name": user_data[1],
+        "position": user_data[2],
+        "skills": user_data[3]
+    }
+    
+    try:
+        if user_dict["skills"]:
+            user_dict["skills"] = json.loads(user_dict["skills"])
+    except:
+        pass
+    return user_dict
+
+def experience_row_to_dict(row):
+    """
+    Convert an experience row to a dict.
+    
+    :param row: tuple (id, user_email, company_name, start_date, end_date, position, description)
+    :return: Dict with company_name, start_date, end_date, position, description
+    """
+    return {
+        "company_name": row[2],
+        "start_date": row[3],
+        "end_date": row[4],
+        "position": row[5],
+        "description": row[6]
+    }
+
+# In-process cache of candidate profiles (email -> {"general", "experience"}).
+# insert_resume_data drops the entries it rewrites. Other processes (ingest)
+# are noticed through PROFILES_VERSION_SQL: INSERT OR REPLACE gives a user a new
+# rowid and experience rows are re-inserted, so any change moves the maxima.
+profile_cache = LRUCache(max_size=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+_profile_version = None
+_profile_version_lock = threading.Lock()
+
+PROFILES_VERSION_SQL = """
+SELECT (SELECT COUNT(*) FROM users), (SELECT MAX(rowid) FROM users), (SELECT MAX(id) FROM experience)
+"""
+
+def invalidate_profiles(emails=None):
+    """
+    Drop cached profiles.
+    
+    :param emails: emails to drop, None drops every profile
+    """
+    if emails is None:
+        profile_cache.clear()
+        return
+    for email in emails:
+        profile_cache.delete(email)
+
+def check_profiles_version(version):
+    """
+    Clear the profile cache when the users/experience tables changed since the
+    last check.
+    
+    :param version: row returned by PROFILES_VERSION_SQL
+    """
+    global _profile_version
+    with _profile_version_lock:
+        if version != _profile_version:
+            if _profile_version is not None:
+                logging.info("Candidate tables changed, clearing the profile cache")
+            profile_cache.clear()
+            _profile_version = version
+
+def build_profiles(user_rows, exp_rows):
+    """
+    Build profile dicts from users rows and their experience rows.
+    
+    :param user_rows: rows of the users table
+    :param exp_rows: rows of the experience table for those users
+    :return: Dict of email -> {"general": ..., "experience": [...]}
+    """
+    profiles = {
+        row[0]: {"general": user_row_to_dict(row), "experience": []}
+        for row in user_rows
+    }
+    for row in exp_rows:
+        if row[1] in profiles:
+            profiles[row[1]]["experience"].append(experience_row_to_dict(row))
+    return profiles
+
+def _placeholders(values):
+    return ",".join("?" * len(values))
+
+def get_profiles_by_emails(conn, emails):
+    """
+    Get user and experience data for many emails with one query per table,
+    served from the profile cache where possible.
+    
+    :param conn: Connection object
+    :param emails: Iterable of emails
+    :return: Dict of email -> {"general": ..., "experience": [...]}, unknown emails are left out
+    """
+    emails = list(dict.fromkeys(emails))
+    version_rows = read_records(conn, PROFILES_VERSION_SQL)
+    if version_rows:
+        check_profiles_version(version_rows[0])
+
+    profiles = {}
+    missing = []
+    for email in emails:
+        profile = profile_cache.get(email)
+        if profile is None:
+            missing.append(email)
+        else:
+            profiles[email] = profile
+    if missing:
+        user_rows = read_records(conn, f"SELECT * FROM users WHERE email IN ({_placeholders(missing)})", tuple(missing))
+        exp_rows = []
+        if user_rows:
+            found = [row[0] for row in user_rows]
+            exp_rows = read_records(
+                conn,
+                f"SELECT * FROM experience WHERE user_email IN ({_placeholders(found)}) ORDER BY id",
+                tuple(found)
+            )
+        for email, profile in build_profiles(user_rows, exp_rows).items():
+            profile_cache.set(email, profile)
+            profiles[email] = profile
+    return profiles
+
 def get_data_by_email(conn, email_or_list):
     """
     Get user and experience data by email(s).
@@ -277,52 +615,24 @@ def get_data_by_email(conn, email_or_list):
     else:
         emails = email_or_list
         
-    results = []
+    profiles = get_profiles_by_emails(conn, emails)
+    return [profiles[email] for email in emails if email in profiles]
+
+def match_names(name_rows, names):
+    """
+    Pick, for every name, the first user whose name contains it (like name LIKE '%name%').
     
-    for email in emails:
-        user_sql = "SELECT * FROM users WHERE email = ?"
-        user_rows = read_records(conn, user_sql, (email,))
-        
-        if not user_rows:
-            continue
-            
-        user_data = user_rows[0]
-        # user_data is a tuple (email, name, position, skills)
-        
-        user_dict = {
-            "email": user_data[0],
-            "name": user_data[1],
-            "position": user_data[2],
-            "skills": user_data[3]
-        }
-        
-        try:
-            if user_dict["skills"]:
-                user_dict["skills"] = json.loads(user_dict["skills"])
-        except:
-            pass
-            
-        exp_sql = "SELECT * FROM experience WHERE user_email = ?"
-        exp_rows = read_records(conn, exp_sql, (email,))
-        
-        exp_list = []
-        for row in exp_rows:
-            # row is (id, user_email, company_name, start_date, end_date, position, description)
-            exp_dict = {
-                "company_name": row[2],
-                "start_date": row[3],
-                "end_date": row[4],
-                "position": row[5],
-                "description": row[6]
-            }
-            exp_list.append(exp_dict)
-            
-        results.append({
-            "general": user_dict,
-            "experience": exp_list
-        })
-        
-    return results
+    :param name_rows: (email, name) rows in table order
+    :param names: List of names
+    :return: List of emails, one per matched name
+    """
+    emails = []
+    for name in names:
+        for email, user_name in name_rows:
+            if user_name and name.lower() in user_name.lower():
+                emails.append(email)
+                break
+    return emails
 
 def get_data_by_name(conn, name_or_list):
     """
@@ -336,53 +646,58 @@ def get_data_by_name(conn, name_or_list):
         names = [name_or_list]
     else:
         names = name_or_list
+    if not names:
+        return []
         
-    results = []
+    name_sql = "SELECT email, name FROM users WHERE " + " OR ".join(["name LIKE ?"] * len(names))
+    name_rows = read_records(conn, name_sql, tuple(f"%{name}%" for name in names))
+    emails = match_names(name_rows, names)
     
-    for name in names:
-        user_sql = "SELECT * FROM users WHERE name LIKE ?"
-        user_rows = read_records(conn, user_sql, (f"%{name}%",))
-        
-        if not user_rows:
-            continue
-            
-        user_data = user_rows[0]
-        # user_data is a tuple (email, name, position, skills)
-        
-        user_dict = {
-            "email": user_data[0],
-            "name": user_data[1],
-            "position": user_data[2],
-            "skills": user_data[3]
-        }
-        
-        try:
-            if user_dict["skills"]:
-                user_dict["skills"] = json.loads(user_dict["skills"])
-        except:
-            pass
-            
-        exp_sql = "SELECT * FROM experience WHERE user_email = ?"
-        exp_rows = read_records(conn, exp_sql, (user_data[0],))
-        
-        exp_list = []
-        for row in exp_rows:
-            # row is (id, user_email, company_name, start_date, end_date, position, description)
-            exp_dict = {
-                "company_name": row[2],
-                "start_date": row[3],
-                "end_date": row[4],
-                "position": row[5],
-                "description": row[6]
-            }
-            exp_list.append(exp_dict)
-            
-        results.append({
-            "general": user_dict,
-            "experience": exp_list
-        })
-        
-    return results
+    profiles = get_profiles_by_emails(conn, emails)
+    return [profiles[email] for email in emails if email in profiles]
+
+def find_emails_by_skills(conn, skills, match_all=False):
+    """
+    Get the candidates having the given skills, using the user_skills index.
+    
+    :param conn: Connection object
+    :param skills: list of skills (aliases are canonicalized)
+    :param match_all: True to require every skill (AND), False for any of them (OR)
+    :return: List of (email, number of matched skills), most matches first
+    """
+    skill_norms = list(dict.fromkeys(normalize_skill(skill) for skill in skills if skill))
+    if not skill_norms:
+        return []
+    sql = f"""
+    SELECT email, COUNT(*) AS matched FROM user_skills
+    WHERE skill_norm IN ({_placeholders(skill_norms)})
+    GROUP BY email
+    """
+    params = list(skill_norms)
+    if match_all:
+        sql += " HAVING COUNT(*) = ?"
+        params.append(len(skill_norms))
+    sql += " ORDER BY matched DESC, email"
+    return read_records(conn, sql, tuple(params))
+
+def get_skill_vocabulary(conn):
+    """
+    Get every distinct normalized skill.
+    
+    :param conn: Connection object
+    :return: List of skill_norm values
+    """
+    return [row[0] for row in read_records(conn, "SELECT DISTINCT skill_norm FROM user_skills")]
+
+def get_user_names(conn):
+    """
+    Get the name of every candidate.
+    
+    :param conn: Connection object
+    :return: List of (email, name) tuples
+    """
+    sql = "SELECT email, name FROM users WHERE name IS NOT NULL AND name != ''"
+    return read_records(conn, sql)
 
 def read_db_by_sql(conn, sql, params=None):
     """
@@ -430,10 +745,84 @@ def create_qa_tables(conn):
     );
     """
     
+    traces_sql = """
+    CREATE TABLE IF NOT EXISTS traces (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_id INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        start_ms REAL,
+        duration_ms REAL,
+        attributes TEXT,
+        FOREIGN KEY (question_id) REFERENCES questions (id)
+    );
+    """
+    
     create_table(conn, questions_sql)
     create_table(conn, logs_sql)
+    create_table(conn, traces_sql)
+    create_table(conn, "CREATE INDEX IF NOT EXISTS idx_traces_question ON traces (question_id);")
+    # history pages walk this index newest first, (timestamp, rowid) is the keyset
+    create_table(conn, "CREATE INDEX IF NOT EXISTS idx_questions_timestamp ON questions (timestamp);")
+    create_question_search(conn)
 
-def save_qa_log(conn, question, answer, logs, context=None):
+def create_question_search(conn):
+    """
+    Create the FTS5 index over questions.question (external content, kept in
+    sync by triggers) and fill it from the existing rows when it is new.
+    History search falls back to LIKE when SQLite has no FTS5.
+    
+    :param conn: Connection object
+    """
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'"
+        ).fetchone()
+        with conn:
+            conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+                question,
+                content = 'questions',
+                content_rowid = 'id',
+                tokenize = 'porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+                INSERT INTO questions_fts (rowid, question) VALUES (new.id, new.question);
+            END;
+            CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+                INSERT INTO questions_fts (questions_fts, rowid, question) VALUES ('delete', old.id, old.question);
+            END;
+            CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE OF question ON questions BEGIN
+                INSERT INTO questions_fts (questions_fts, rowid, question) VALUES ('delete', old.id, old.question);
+                INSERT INTO questions_fts (rowid, question) VALUES (new.id, new.question);
+            END;
+            """)
+            if not exists:
+                conn.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+    except Error as e:
+        logging.warning(f"Question search index not available, history search uses LIKE: {e}")
+
+def _insert_trace(conn, question_id, trace):
+    """
+    Insert the spans of a trace (tracing.Trace.to_dict()) for a question.
+    The total request time is stored as a "request" row starting at 0.
+    """
+    if not trace:
+        return
+    rows = [(question_id, "request", 0, trace.get("total_ms"), None)]
+    for span in trace.get("spans", []):
+        rows.append((
+            question_id,
+            span["stage"],
+            span.get("start_ms"),
+            span.get("duration_ms"),
+            json.dumps(span.get("attributes") or {}, default=str)
+        ))
+    conn.executemany(
+        "INSERT INTO traces (question_id, stage, start_ms, duration_ms, attributes) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+def save_qa_log(conn, question, answer, logs, context=None, trace=None):
     """
     Save question, answer, context and logs.
     
@@ -442,6 +831,7 @@ def save_qa_log(conn, question, answer, logs, context=None):
     :param answer: The answer text
     :param logs: The log string
     :param context: The context string (optional)
+    :param trace: The stage trace, tracing.Trace.to_dict() (optional)
     :return: The ID of the saved question
     """
     try:
@@ -451,30 +841,96 @@ def save_qa_log(conn, question, answer, logs, context=None):
         if q_id:
             l_sql = "INSERT INTO logs (question_id, log_entry) VALUES (?, ?)"
             create_record(conn, l_sql, (q_id, logs))
+            if trace:
+                with conn:
+                    _insert_trace(conn, q_id, trace)
             logging.info(f"Saved QA and logs for question ID: {q_id}")
             return q_id
     except Error as e:
         logging.error(f"Error saving QA logs: {e}")
         return None
 
-def get_qa_history(conn):
+def save_qa_logs(conn, records):
     """
-    Get the history of asked questions.
+    Save several QA records in one transaction.
     
     :param conn: Connection object
-    :return: List of dicts with id, question, timestamp
+    :param records: list of (question, answer, logs, context, trace) tuples, trace may be None
+    :return: List of the saved question IDs
+    """
+    q_ids = []
+    with conn:
+        for question, answer, logs, context, trace in records:
+            cur = conn.execute(
+                "INSERT INTO questions (question, answer, context) VALUES (?, ?, ?)",
+                (question, answer, context)
+            )
+            q_ids.append(cur.lastrowid)
+            conn.execute("INSERT INTO logs (question_id, log_entry) VALUES (?, ?)", (cur.lastrowid, logs))
+            _insert_trace(conn, cur.lastrowid, trace)
+    logging.info(f"Saved {len(q_ids)} QA record(s), question IDs: {q_ids}")
+    return q_ids
+
+def _has_question_search(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'"
+    ).fetchone() is not None
+
+def build_question_search(text):
+    """Turns search text into an FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", (text or "").lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return " ".join(terms)
+
+def get_qa_history(conn, before_id=None, limit=HISTORY_PAGE_SIZE, search=None):
     """
-    sql = "SELECT id, question, timestamp FROM questions ORDER BY timestamp DESC"
-    rows = read_records(conn, sql)
+    Get one page of the asked questions, newest first.
+    Pages are keyed on (timestamp, id), so every page costs the same however
+    long the history is. Only a short summary of each question is returned.
+    
+    :param conn: Connection object
+    :param before_id: id of the last question of the previous page (optional)
+    :param limit: page size, capped at HISTORY_MAX_PAGE_SIZE
+    :param search: only questions containing these words (optional)
+    :return: Dict with items (id, question, timestamp) and next_before_id, None on the last page
+    """
+    limit = max(1, min(int(limit), HISTORY_MAX_PAGE_SIZE))
+    sql = "SELECT id, substr(question, 1, ?), timestamp FROM questions"
+    params = [HISTORY_QUESTION_PREVIEW]
+    conditions = []
+    if before_id is not None:
+        conditions.append("(timestamp, id) < (SELECT timestamp, id FROM questions WHERE id = ?)")
+        params.append(before_id)
+    if search:
+        if _has_question_search(conn):
+            match = build_question_search(search)
+            if match is None:
+                return {"items": [], "next_before_id": None}
+            conditions.append("id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?)")
+            params.append(match)
+        else:
+            conditions.append("question LIKE ?")
+            params.append(f"%{search}%")
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    # one extra row tells whether there is a next page
+    params.append(limit + 1)
+    rows = read_records(conn, sql, params)
     
     history = []
-    for row in rows:
+    for row in rows[:limit]:
         history.append({
             "id": row[0],
             "question": row[1],
             "timestamp": row[2]
         })
-    return history
+    return {
+        "items": history,
+        "next_before_id": history[-1]["id"] if len(rows) > limit else None
+    }
 
 def get_qa_details(conn, question_id):
     """
@@ -506,3 +962,37 @@ def get_qa_details(conn, question_id):
         "timestamp": q_rows[0][4],
         "logs": logs
     }
+
+def get_qa_trace(conn, question_id):
+    """
+    Get the stage trace of a question.
+    
+    :param conn: Connection object
+    :param question_id: ID of the question
+    :return: Dict with question_id, total_ms and the spans ordered by start, or None
+    """
+    sql = """
+    SELECT stage, start_ms, duration_ms, attributes FROM traces
+    WHERE question_id = ? ORDER BY start_ms, id
+    """
+    rows = read_records(conn, sql, (question_id,))
+    if not rows:
+        return None
+    
+    total_ms = None
+    spans = []
+    for stage, start_ms, duration_ms, attributes in rows:
+        if stage == "request":
+            total_ms = duration_ms
+            continue
+        spans.append({
+            "stage": stage,
+            "start_ms": start_ms,
+            "duration_ms": duration_ms,
+            "attributes": json.loads(attributes) if attributes else {}
+        })
+    return {
+        "question_id": question_id,
+        "total_ms": total_ms,
+        "spans": spans
+    }
@@ -0,0 +1,190 @@
+import os
+import sys
+import re
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_PATH
+from functions.cache_utils import LRUCache
+
+logger = logging.getLogger('rag_logger')
+
+
+def normalize_text(text):
+    """Lower-cases and collapses whitespace so trivially different questions share a key."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+class EmbeddingCache(LRUCache):
+    """
+    LRU + TTL cache of query embeddings.
+    When db_file is given, entries are also written to a small SQLite file so
+    they survive restarts; memory misses fall back to the file.
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL, db_file=EMBEDDING_CACHE_PATH):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.db_file = db_file
+        self.disk_hits = 0
+        self._conn = None
+        self._db_lock = threading.Lock()
+        if db_file:
+            self._open_db()
+
+    def _open_db(self):
+        try:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache file disabled ({self.db_file}): {e}")
+            self._conn = None
+
+    def _read_disk(self, key):
+        if self._conn is None:
+            return None
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or self._is_expired(row[1], time.time()):
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def _write_disk(self, key, vector):
+        if self._conn is None:
+            return
+        try:
+            with self._db_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, array("f", vector).tobytes(), time.time())
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist embedding: {e}")
+
+    def get(self, key, default=None):
+        vector = super().get(key)
+        if vector is not None:
+            return vector
+        vector = self._read_disk(key)
+        if vector is None:
+            return default
+        with self._lock:
+            # the memory lookup above counted a miss, it was served from disk
+            self.misses -= 1
+            self.hits += 1
+            self.disk_hits += 1
+        super().set(key, vector)
+        return vector
+
+    def set(self, key, value):
+        super().set(key, value)
+        self._write_disk(key, value)
+
+    def clear(self):
+        super().clear()
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+
+    def stats(self):
+        stats = super().stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["persisted"] = self._conn is not None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Returns the process-wide query embedding cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings client and serves embed_query from the cache.
+    Document embedding (ingest) is passed through untouched.
+    """
+
+    def __init__(self, embeddings, model_name, cache=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache if cache is not None else get_embedding_cache()
+
+    def cache_key(self, text):
+        return f"{self.model_name}\x00{normalize_text(text)}"
+
+    def embed_query(self, text):
+        key = self.cache_key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """
+        Embeds several questions, sending only the cache misses to the model
+        in a single batch call.
+        """
+        vectors = [self.cache.get(self.cache_key(text)) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+                self.cache.set(self.cache_key(texts[i]), vector)
+        return vectors
+
+    async def aembed_query(self, text):
+        key = self.cache_key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+
+def cosine_similarity(a, b):
+    """Cosine similarity of two equal length vectors."""
+    dot = 0.0
+    norm_a = 0.0
+    norm_b = 0.0
+    for x, y in zip(a, b):
+        dot += x * y
+        norm_a += x * x
+        norm_b += y * y
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return dot / ((norm_a ** 0.5) * (norm_b ** 0.5))
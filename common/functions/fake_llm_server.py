@@ -0,0 +1,482 @@
+import os
+import sys
+import re
+import json
+import math
+import time
+import random
+import base64
+import hashlib
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    FAKE_LLM_HOST, FAKE_LLM_PORT, FAKE_LLM_LATENCY, FAKE_LLM_LATENCY_JITTER, FAKE_LLM_CHUNK_DELAY,
+    FAKE_LLM_ERROR_RATE, FAKE_LLM_ERROR_STATUS, FAKE_LLM_SEED, FAKE_LLM_EMBEDDING_DIM,
+    FAKE_LLM_ANSWER_WORDS, FAKE_LLM_FIXTURES
+)
+
+logger = logging.getLogger('rag_logger')
+
+# Local stand-in for Ollama and Gemini, for load tests and benchmarks on
+# machines without models or network.
+#
+# It speaks enough of both HTTP APIs for the real clients: Ollama's /api/chat,
+# /api/generate, /api/embed and /api/embeddings (ChatOllama, OllamaEmbeddings)
+# and Gemini's models/<model>:generateContent, :streamGenerateContent,
+# :embedContent and :batchEmbedContents (google-genai with GEMINI_BASE_URL).
+#
+# Answers are a pure function of the prompt: the prompts of this pipeline
+# (polish, section routing, text-to-SQL, CV parsing) get well-formed JSON of
+# the shape the callers expect, anything else a pseudo-random text seeded by
+# the prompt hash. Embeddings hash the words of the text into a fixed size
+# vector, so texts sharing words are close. A fixtures file of
+# {"match": regex, "response": str or JSON} rules answers chosen prompts.
+#
+# Latency (before the first byte, plus jitter), the delay between streamed
+# chunks and a share of failed requests (error_status, picked with a seeded
+# RNG so runs are repeatable) are configurable.
+
+EMAIL = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+WORD = re.compile(r"\w+")
+GEMINI_PATH = re.compile(r"/models/([^/:]+):(\w+)")
+
+SECTION_KEYWORDS = {
+    "skills": ["skill", "develop", "program", "language", "tool", "technolog", "python", "java", "android", "web"],
+    "experience": ["experience", "worked", "work", "employ", "job", "company", "years"],
+    "education": ["education", "degree", "study", "studied", "college", "university"],
+    "projects": ["project", "built", "implemented", "product"],
+    "certifications": ["certif", "course"],
+    "interests": ["interest", "hobby", "hobbies", "sport", "football", "music"],
+    "languages": ["speak", "languages"],
+    "general": ["email", "phone", "name", "contact", "where", "live"]
+}
+
+VOCABULARY = (
+    "candidate experience skills project team python data system design model service "
+    "developer built worked years led cloud api product analysis web mobile testing "
+    "delivery release research backend frontend deployment pipeline platform"
+).split()
+
+
+def _digest(*parts):
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _after(prompt, marker):
+    """Text following the last marker in the prompt, or None."""
+    index = prompt.rfind(marker)
+    if index < 0:
+        return None
+    return prompt[index + len(marker):].strip()
+
+
+class FakeResponder:
+    """Deterministic answers and embeddings."""
+
+    def __init__(self, answer_words=FAKE_LLM_ANSWER_WORDS, embedding_dim=FAKE_LLM_EMBEDDING_DIM, fixtures=FAKE_LLM_FIXTURES):
+        self.answer_words = answer_words
+        self.embedding_dim = embedding_dim
+        self.fixtures = []
+        if fixtures:
+            with open(fixtures, "r", encoding="utf-8") as f:
+                self.fixtures = [(re.compile(rule["match"], re.S), rule["response"]) for rule in json.load(f)]
+
+    def _fixture(self, prompt):
+        for pattern, response in self.fixtures:
+            if pattern.search(prompt):
+                return response if isinstance(response, str) else json.dumps(response)
+        return None
+
+    def filler(self, seed, words):
+        rng = random.Random(seed)
+        return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+    def text(self, prompt, model):
+        fixture = self._fixture(prompt)
+        if fixture is not None:
+            return fixture
+        seed = _digest(model, prompt)
+        question = _after(prompt, "Question:")
+        if question is not None:
+            question = question.split("Answer:")[0].strip()
+            lead = f"Fake answer to: {question}."
+            return lead + " " + self.filler(seed, max(self.answer_words - len(lead.split()), 0))
+        return self.filler(seed, self.answer_words)
+
+    def json(self, prompt, model):
+        fixture = self._fixture(prompt)
+        if fixture is not None:
+            return fixture
+        return json.dumps(self._json_object(prompt, model))
+
+    def _json_object(self, prompt, model):
+        if "Search Query Optimizer" in prompt:
+            question = (_after(prompt, "##input question:") or "").strip()
+            return {
+                "polished_question": question,
+                "names": [],
+                "emails": EMAIL.findall(question),
+                "short_description": question,
+                "intents": []
+            }
+        if "Available CV sections" in prompt:
+            question = (_after(prompt, "Input question:") or "").split("before answering")[0].lower()
+            sections = [name for name, words in SECTION_KEYWORDS.items() if any(w in question for w in words)]
+            return {
+                "sections": sections or ["skills", "experience"],
+                "confidence": "high",
+                "reason": "fake backend",
+                "filter_query": " OR ".join(sections)
+            }
+        if "Text-to-SQL" in prompt:
+            return {"query": "NA", "reason": "fake backend", "query_object": {}}
+        if "Input CV Text:" in prompt:
+            return self._cv_object(prompt)
+        return {"response": self.text(prompt, model)}
+
+    def _cv_object(self, prompt):
+        cv_text = _after(prompt, "Input CV Text:") or ""
+        lines = [line.strip(" #*-\t") for line in cv_text.splitlines() if line.strip(" #*-\t")]
+        emails = EMAIL.findall(cv_text)
+        general = {"name": lines[0] if lines else "", "email": emails[0] if emails else "", "position": ""}
+        skills = []
+        for item in re.split(r"[,\n;|•]", cv_text):
+            item = item.strip(" #*-\t:")
+            if not item or len(item.split()) > 3 or EMAIL.search(item) or item == general["name"]:
+                continue
+            if item.lower() not in {s.lower() for s in skills}:
+                skills.append(item)
+        if "list of skills" in prompt and "general:" not in prompt:
+            return {"skills": skills}
+        if "experience:[" in prompt and "general:" not in prompt:
+            return {"experience": []}
+        result = {"general": general}
+        if "skills:" in prompt:
+            result["skills"] = skills
+            result["experience"] = []
+        return result
+
+    def image(self, data, prompt, model):
+        return f"Fake transcription {_digest(model, prompt, data)[:12]}"
+
+    def embed(self, text):
+        """Signed feature hashing of the words, L2 normalised."""
+        vector = [0.0] * self.embedding_dim
+        for word in WORD.findall((text or "").lower()):
+            h = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+            vector[h % self.embedding_dim] += 1.0 if (h >> 64) & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector))
+        if norm == 0:
+            vector[0] = 1.0
+            return vector
+        return [x / norm for x in vector]
+
+
+class FakeBehaviour:
+    """Latency and error injection, shared by the request threads."""
+
+    def __init__(self, latency=FAKE_LLM_LATENCY, jitter=FAKE_LLM_LATENCY_JITTER, chunk_delay=FAKE_LLM_CHUNK_DELAY,
+                 error_rate=FAKE_LLM_ERROR_RATE, error_status=FAKE_LLM_ERROR_STATUS, seed=FAKE_LLM_SEED):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors_injected": 0, "chunks": 0, "embeddings": 0, "routes": {}}
+
+    def admit(self, route):
+        """Waits the configured latency. Returns the status to fail with, or None."""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["routes"][route] = self._stats["routes"].get(route, 0) + 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self._stats["errors_injected"] += 1
+        if delay:
+            time.sleep(delay)
+        return self.error_status if fail else None
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["routes"] = dict(self._stats["routes"])
+        return stats
+
+
+def split_chunks(text):
+    """Word sized stream chunks that join back to text."""
+    return re.findall(r"\S+\s*|\s+", text) or [text]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeLLM/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("fake llm: " + format % args)
+
+    @property
+    def responder(self):
+        return self.server.responder
+
+    @property
+    def behaviour(self):
+        return self.server.behaviour
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        if self.behaviour.chunk_delay:
+            time.sleep(self.behaviour.chunk_delay)
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+        self.behaviour.count("chunks")
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _error(self, status, gemini=False):
+        message = f"injected error {status}"
+        if gemini:
+            self._send_json({"error": {"code": status, "message": message, "status": "UNAVAILABLE"}}, status)
+        else:
+            self._send_json({"error": message}, status)
+
+    def do_GET(self):
+        if self.path.startswith("/api/version"):
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path.startswith("/api/tags"):
+            self._send_json({"models": []})
+        elif self.path.startswith("/stats"):
+            self._send_json(self.behaviour.stats())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        try:
+            body = self._body()
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        gemini = GEMINI_PATH.search(self.path)
+        if gemini:
+            self._gemini(gemini.group(1), gemini.group(2), body)
+            return
+        route = self.path.split("?")[0]
+        handlers = {
+            "/api/chat": self._ollama_chat,
+            "/api/generate": self._ollama_generate,
+            "/api/embed": self._ollama_embed,
+            "/api/embeddings": self._ollama_embeddings
+        }
+        if route not in handlers:
+            self._send_json({"error": "not found"}, 404)
+            return
+        status = self.behaviour.admit(route)
+        if status:
+            self._error(status)
+            return
+        handlers[route](body)
+
+    # --- Ollama ---
+
+    def _ollama_answer(self, prompt, body):
+        model = body.get("model", "fake")
+        if body.get("format"):
+            return self.responder.json(prompt, model)
+        return self.responder.text(prompt, model)
+
+    def _ollama_reply(self, body, text, wrap):
+        model = body.get("model", "fake")
+        done = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": True, "done_reason": "stop",
+                "prompt_eval_count": 0, "eval_count": len(text.split())}
+        if not body.get("stream", True):
+            self._send_json({**done, **wrap(text)})
+            return
+        self._start_chunked("application/x-ndjson")
+        for chunk in split_chunks(text):
+            part = {"model": model, "created_at": done["created_at"], "done": False, **wrap(chunk)}
+            self._write_chunk(json.dumps(part).encode("utf-8") + b"\n")
+        self._write_chunk(json.dumps({**done, **wrap("")}).encode("utf-8") + b"\n")
+        self._end_chunked()
+
+    def _ollama_chat(self, body):
+        messages = body.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        text = self._ollama_answer(prompt, body)
+        self._ollama_reply(body, text, lambda t: {"message": {"role": "assistant", "content": t}})
+
+    def _ollama_generate(self, body):
+        text = self._ollama_answer(body.get("prompt", ""), body)
+        self._ollama_reply(body, text, lambda t: {"response": t})
+
+    def _ollama_embed(self, body):
+        texts = body.get("input", "")
+        texts = [texts] if isinstance(texts, str) else texts
+        self.behaviour.count("embeddings", len(texts))
+        self._send_json({"model": body.get("model", "fake"), "embeddings": [self.responder.embed(t) for t in texts]})
+
+    def _ollama_embeddings(self, body):
+        self.behaviour.count("embeddings")
+        self._send_json({"embedding": self.responder.embed(body.get("prompt", ""))})
+
+    # --- Gemini ---
+
+    def _gemini_prompt(self, body):
+        texts = []
+        images = []
+        contents = body.get("contents") or []
+        if isinstance(contents, dict):
+            contents = [contents]
+        for content in contents:
+            for part in content.get("parts", []):
+                if "text" in part:
+                    texts.append(part["text"])
+                inline = part.get("inlineData") or part.get("inline_data")
+                if inline:
+                    images.append(base64.b64decode(inline.get("data", "")))
+        return "\n".join(texts), images
+
+    def _gemini(self, model, method, body):
+        status = self.behaviour.admit(f"gemini:{method}")
+        if status:
+            self._error(status, gemini=True)
+            return
+        if method in ("embedContent", "batchEmbedContents"):
+            requests = body.get("requests") or [body]
+            texts = [" ".join(p.get("text", "") for p in r.get("content", {}).get("parts", [])) for r in requests]
+            self.behaviour.count("embeddings", len(texts))
+            vectors = [{"values": self.responder.embed(t)} for t in texts]
+            self._send_json({"embedding": vectors[0]} if method == "embedContent" else {"embeddings": vectors})
+            return
+        if method not in ("generateContent", "streamGenerateContent"):
+            self._send_json({"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}, 404)
+            return
+        prompt, images = self._gemini_prompt(body)
+        config = body.get("generationConfig") or {}
+        if images:
+            text = self.responder.image(images[0], prompt, model)
+        elif config.get("responseMimeType") == "application/json":
+            text = self.responder.json(prompt, model)
+        else:
+            text = self.responder.text(prompt, model)
+
+        def candidate(chunk, final):
+            payload = {"candidates": [{"content": {"parts": [{"text": chunk}], "role": "model"}, "index": 0}],
+                       "modelVersion": model}
+            if final:
+                payload["candidates"][0]["finishReason"] = "STOP"
+                payload["usageMetadata"] = {"promptTokenCount": len(prompt.split()),
+                                            "candidatesTokenCount": len(text.split()),
+                                            "totalTokenCount": len(prompt.split()) + len(text.split())}
+            return payload
+
+        if method == "generateContent":
+            self._send_json(candidate(text, True))
+            return
+        self._start_chunked("text/event-stream")
+        chunks = split_chunks(text)
+        for i, chunk in enumerate(chunks):
+            self._write_chunk(b"data: " + json.dumps(candidate(chunk, i == len(chunks) - 1)).encode("utf-8") + b"\r\n\r\n")
+        self._end_chunked()
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host=FAKE_LLM_HOST, port=FAKE_LLM_PORT, responder=None, behaviour=None):
+        super().__init__((host, port), FakeLLMHandler)
+        self.responder = responder or FakeResponder()
+        self.behaviour = behaviour or FakeBehaviour()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves from a daemon thread. Returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake LLM server listening on {self.url}")
+        return self
+
+    def handle_error(self, request, client_address):
+        # load test clients hang up mid-response, that's not worth a traceback
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return self.behaviour.stats()
+
+
+def start_fake_server(host=FAKE_LLM_HOST, port=FAKE_LLM_PORT, **behaviour):
+    """
+    Starts the fake server in this process. port=0 picks a free port; the
+    behaviour keywords (latency, jitter, chunk_delay, error_rate,
+    error_status, seed) override the config.
+    """
+    return FakeLLMServer(host, port, behaviour=FakeBehaviour(**behaviour)).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama and Gemini APIs")
+    parser.add_argument("--host", default=FAKE_LLM_HOST)
+    parser.add_argument("--port", type=int, default=FAKE_LLM_PORT)
+    parser.add_argument("--latency", type=float, default=FAKE_LLM_LATENCY, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=FAKE_LLM_LATENCY_JITTER, help="extra random latency, seconds")
+    parser.add_argument("--chunk-delay", type=float, default=FAKE_LLM_CHUNK_DELAY, help="seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=FAKE_LLM_ERROR_RATE, help="share of failed requests")
+    parser.add_argument("--error-status", type=int, default=FAKE_LLM_ERROR_STATUS)
+    parser.add_argument("--seed", type=int, default=FAKE_LLM_SEED)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = FakeLLMServer(args.host, args.port, behaviour=FakeBehaviour(
+        args.latency, args.jitter, args.chunk_delay, args.error_rate, args.error_status, args.seed
+    ))
+    print(f"Fake LLM server on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
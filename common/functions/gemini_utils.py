@@ -1,5 +1,17 @@
 import os
+import sys
+import io
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
 from google import genai
+from google.genai import errors, types
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -7,108 +19,439 @@ load_dotenv()
 
 from PIL import Image
 
-def analyze_image_with_gemini(image: Image.Image, prompt: str, model_name: str = "gemini-2.0-flash") -> str:
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    GEMINI_MODEL, GEMINI_BASE_URL, GEMINI_TIMEOUT, GEMINI_MAX_CONCURRENCY,
+    GEMINI_RATE_PER_SEC, GEMINI_RATE_BURST, GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX,
+    GEMINI_EMBEDDING_MODEL
+)
+from functions.llm_cache import get_llm_cache, make_key
+
+logger = logging.getLogger('rag_logger')
+
+# One genai.Client per process (its HTTP connections are reused across calls),
+# wrapped with a concurrency limit, an optional token bucket on the request
+# rate, retries with jittered exponential backoff on retryable errors and a
+# per-request timeout. GEMINI_BASE_URL points the client at a local stand-in.
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class GeminiConfigError(ValueError):
+    """No API key and no local stand-in configured."""
+
+
+def is_retryable(error):
+    """Rate limits, server errors, timeouts and dropped connections are worth another try."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt, base=GEMINI_BACKOFF_BASE, cap=GEMINI_BACKOFF_MAX):
+    """Full jitter: anywhere between 0 and base * 2^attempt, capped."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Request rate limit. reserve() takes a token and says how long to wait for it."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # a negative balance queues the caller behind the ones already waiting
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class GeminiClientManager:
+
+    def __init__(self, api_key=None, base_url=GEMINI_BASE_URL, timeout=GEMINI_TIMEOUT,
+                 max_concurrency=GEMINI_MAX_CONCURRENCY, rate=GEMINI_RATE_PER_SEC, burst=GEMINI_RATE_BURST,
+                 max_retries=GEMINI_MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, burst)
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphores = weakref.WeakKeyDictionary()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "abandoned": 0,
+            "in_flight": 0, "max_in_flight": 0, "queued_seconds": 0.0,
+            "latency_total": 0.0, "latency_max": 0.0, "errors": {}
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    api_key = self.api_key or os.getenv("GEMINI_KEY")
+                    if not api_key and self.base_url:
+                        # a local stand-in doesn't check the key
+                        api_key = "local"
+                    if not api_key:
+                        raise GeminiConfigError("GEMINI_KEY not found in environment variables.")
+                    http_options = types.HttpOptions(timeout=int(self.timeout * 1000))
+                    if self.base_url:
+                        http_options.base_url = self.base_url
+                    self._client = genai.Client(api_key=api_key, http_options=http_options)
+        return self._client
+
+    def _count(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    def _started(self, queued):
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["queued_seconds"] += queued
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+
+    def _finished(self, started, error=None):
+        latency = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats["in_flight"] -= 1
+            self._stats["latency_total"] += latency
+            self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+            if error is None:
+                self._stats["succeeded"] += 1
+            else:
+                self._stats["failed"] += 1
+                key = str(getattr(error, "code", None) or type(error).__name__)
+                self._stats["errors"][key] = self._stats["errors"].get(key, 0) + 1
+
+    @contextmanager
+    def _slot(self):
+        waited = time.perf_counter()
+        delay = self.bucket.reserve()
+        if delay:
+            time.sleep(delay)
+        with self._semaphore:
+            self._started(time.perf_counter() - waited)
+            started = time.perf_counter()
+            try:
+                yield
+            except GeneratorExit:
+                # the consumer closed a stream early, the request didn't fail
+                self._finished(started)
+                self._count(abandoned=1)
+                raise
+            except BaseException as e:
+                self._finished(started, e)
+                raise
+            self._finished(started)
+
+    def _async_semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    @asynccontextmanager
+    async def _aslot(self):
+        waited = time.perf_counter()
+        delay = self.bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        async with self._async_semaphore():
+            self._started(time.perf_counter() - waited)
+            started = time.perf_counter()
+            try:
+                yield
+            except GeneratorExit:
+                self._finished(started)
+                self._count(abandoned=1)
+                raise
+            except BaseException as e:
+                self._finished(started, e)
+                raise
+            self._finished(started)
+
+    def _should_retry(self, error, attempt):
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        self._count(retries=1)
+        return True
+
+    def _call(self, call):
+        """call(client) with retries. Returns its result, raises when it gives up."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._slot():
+                    return call(self.client)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Gemini call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def _acall(self, call):
+        """Async _call, call(client) returns an awaitable."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._aslot():
+                    return await call(self.client)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Gemini call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def generate(self, contents, model=GEMINI_MODEL, config=None):
+        """generate_content with retries. Returns the response text, raises when it gives up."""
+        return self._call(lambda client: client.models.generate_content(model=model, contents=contents, config=config)).text
+
+    def stream(self, contents, model=GEMINI_MODEL, config=None):
+        """
+        generate_content_stream, yields text chunks. Retried only until the first chunk is out.
+
+        The concurrency slot is held until the stream ends or is closed, including
+        the time the caller spends between chunks: hand chunks on without blocking
+        on slow clients, and close the generator when giving up early.
+        """
+        for attempt in range(self.max_retries + 1):
+            yielded = False
+            try:
+                with self._slot():
+                    for chunk in self.client.models.generate_content_stream(model=model, contents=contents, config=config):
+                        if chunk.text:
+                            yielded = True
+                            yield chunk.text
+                return
+            except Exception as e:
+                if yielded or not self._should_retry(e, attempt):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Gemini stream failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def agenerate(self, contents, model=GEMINI_MODEL, config=None):
+        """Async generate."""
+        response = await self._acall(lambda client: client.aio.models.generate_content(model=model, contents=contents, config=config))
+        return response.text
+
+    async def astream(self, contents, model=GEMINI_MODEL, config=None):
+        """Async stream; holds its slot like stream does, close it (aclose) when giving up early."""
+        for attempt in range(self.max_retries + 1):
+            yielded = False
+            try:
+                async with self._aslot():
+                    async for chunk in await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config):
+                        if chunk.text:
+                            yielded = True
+                            yield chunk.text
+                return
+            except Exception as e:
+                if yielded or not self._should_retry(e, attempt):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Gemini stream failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def embed(self, texts, model=GEMINI_EMBEDDING_MODEL):
+        """embed_content with retries. Returns one vector per text."""
+        response = self._call(lambda client: client.models.embed_content(model=model, contents=texts))
+        return [embedding.values for embedding in response.embeddings]
+
+    async def aembed(self, texts, model=GEMINI_EMBEDDING_MODEL):
+        """Async embed."""
+        response = await self._acall(lambda client: client.aio.models.embed_content(model=model, contents=texts))
+        return [embedding.values for embedding in response.embeddings]
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["errors"] = dict(self._stats["errors"])
+        finished = stats["succeeded"] + stats["failed"]
+        stats["latency_avg"] = round(stats["latency_total"] / finished, 3) if finished else 0
+        stats["latency_total"] = round(stats["latency_total"], 3)
+        stats["latency_max"] = round(stats["latency_max"], 3)
+        stats["queued_seconds"] = round(stats["queued_seconds"], 3)
+        return stats
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_gemini_client_manager():
+    """The process wide client manager."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = GeminiClientManager()
+    return _manager
+
+
+def analyze_image_with_gemini(image: Image.Image, prompt: str, model_name: str = GEMINI_MODEL) -> str:
     """
-    Analyzes an image using the Gemini API.
-    
+    Analyzes an image using the Gemini API. Answers are kept in the LLM cache,
+    keyed by the image bytes, prompt and model; failed calls are not cached.
+
     Args:
         image (PIL.Image.Image): The image to analyze.
         prompt (str): The prompt/question about the image.
-        model_name (str): The model to use. Defaults to "gemini-2.0-flash".
-        
+        model_name (str): The model to use. Defaults to GEMINI_MODEL.
+
     Returns:
-        str: The analysis text from the API.
+        str: The analysis text from the API, "" when the call failed.
+    """
+    # Convert PIL Image to bytes
+    img_byte_arr = io.BytesIO()
+    # default to PNG if format is not available
+    fmt = image.format if image.format else 'PNG'
+    image.save(img_byte_arr, format=fmt)
+    img_byte_arr = img_byte_arr.getvalue()
+
+    def call():
+        try:
+            return get_gemini_client_manager().generate(
+                [
+                    types.Part.from_text(text=prompt),
+                    types.Part.from_bytes(data=img_byte_arr, mime_type=f"image/{fmt.lower()}")
+                ],
+                model=model_name
+            )
+        except GeminiConfigError:
+            raise
+        except Exception as e:
+            logger.error(f"Error calling Gemini API for image analysis: {e}")
+            return ""
+
+    key = make_key("gemini-image", model_name, prompt, {"image": img_byte_arr}, {"format": fmt})
+    return get_llm_cache().cached(key, call, model=model_name)
+
+
+def get_gemini_response(prompt: str, model_name: str = GEMINI_MODEL) -> str:
+    """
+    Calls the Gemini API with the given prompt.
+
+    Args:
+        prompt (str): The prompt to send to the API.
+        model_name (str): The model to use. Defaults to GEMINI_MODEL.
+
+    Returns:
+        str: The text response from the API, "" when the call failed.
     """
-    api_key = os.getenv("GEMINI_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_KEY not found in environment variables.")
-    
-    client = genai.Client(api_key=api_key)
-    
     try:
-        from google.genai import types
-        import io
-        
-        # Convert PIL Image to bytes
-        img_byte_arr = io.BytesIO()
-        # default to PNG if format is not available
-        fmt = image.format if image.format else 'PNG'
-        image.save(img_byte_arr, format=fmt)
-        img_byte_arr = img_byte_arr.getvalue()
-
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[
-                types.Part.from_text(text=prompt),
-                types.Part.from_bytes(data=img_byte_arr, mime_type=f"image/{fmt.lower()}")
-            ]
-        )
-        return response.text
+        return get_gemini_client_manager().generate(prompt, model=model_name)
+    except GeminiConfigError:
+        raise
     except Exception as e:
-        print(f"Error calling Gemini API for image analysis: {e}")
+        logger.error(f"Error calling Gemini API: {e}")
         return ""
 
-
-def get_gemini_response(prompt: str, model_name: str = "gemini-2.0-flash") -> str:
+def get_gemini_json_response(prompt: str, model_name: str = GEMINI_MODEL) -> str:
     """
-    Calls the Gemini API with the given prompt.
-    
+    Calls the Gemini API with the given prompt and requests JSON output.
+
     Args:
         prompt (str): The prompt to send to the API.
-        model_name (str): The model to use. Defaults to "gemini-2.0-flash".
-        
+        model_name (str): The model to use. Defaults to GEMINI_MODEL.
+
     Returns:
-        str: The text response from the API.
+        str: The JSON text response from the API, "" when the call failed.
     """
-    api_key = os.getenv("GEMINI_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_KEY not found in environment variables.")
-    
-    client = genai.Client(api_key=api_key)
-    
     try:
-        response = client.models.generate_content(
+        return get_gemini_client_manager().generate(
+            prompt,
             model=model_name,
-            contents=prompt
+            config={'response_mime_type': 'application/json'}
         )
-        return response.text
+    except GeminiConfigError:
+        raise
     except Exception as e:
-        # Log the error or handle it as appropriate for the application
-        print(f"Error calling Gemini API: {e}")
+        logger.error(f"Error calling Gemini API (JSON): {e}")
         return ""
 
-def get_gemini_json_response(prompt: str, model_name: str = "gemini-2.0-flash") -> str:
+def stream_gemini_response(prompt: str, model_name: str = GEMINI_MODEL):
     """
-    Calls the Gemini API with the given prompt and requests JSON output.
-    
+    Calls the Gemini API with the given prompt and streams the answer.
+
+    Args:
+        prompt (str): The prompt to send to the API.
+        model_name (str): The model to use. Defaults to GEMINI_MODEL.
+
+    Yields:
+        str: Text chunks as they arrive.
+    """
+    try:
+        yield from get_gemini_client_manager().stream(prompt, model=model_name)
+    except GeminiConfigError:
+        raise
+    except Exception as e:
+        logger.error(f"Error calling Gemini API (stream): {e}")
+
+
+async def aget_gemini_response(prompt: str, model_name: str = GEMINI_MODEL, is_json: bool = False) -> str:
+    """
+    Async version of get_gemini_response / get_gemini_json_response.
+
     Args:
         prompt (str): The prompt to send to the API.
-        model_name (str): The model to use. Defaults to "gemini-2.0-flash".
-        
+        model_name (str): The model to use. Defaults to GEMINI_MODEL.
+        is_json (bool): Request a JSON response.
+
     Returns:
-        str: The JSON text response from the API.
+        str: The text response from the API, "" when the call failed.
     """
-    api_key = os.getenv("GEMINI_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_KEY not found in environment variables.")
-    
-    client = genai.Client(api_key=api_key)
-    
     try:
-        response = client.models.generate_content(
+        return await get_gemini_client_manager().agenerate(
+            prompt,
             model=model_name,
-            contents=prompt,
-            config={
-                'response_mime_type': 'application/json'
-            }
+            config={'response_mime_type': 'application/json'} if is_json else None
         )
-        return response.text
+    except GeminiConfigError:
+        raise
     except Exception as e:
-        print(f"Error calling Gemini API (JSON): {e}")
+        logger.error(f"Error calling Gemini API (async): {e}")
         return ""
 
+async def astream_gemini_response(prompt: str, model_name: str = GEMINI_MODEL):
+    """
+    Async version of stream_gemini_response.
+
+    Args:
+        prompt (str): The prompt to send to the API.
+        model_name (str): The model to use. Defaults to GEMINI_MODEL.
+
+    Yields:
+        str: Text chunks as they arrive.
+    """
+    try:
+        async for chunk in get_gemini_client_manager().astream(prompt, model=model_name):
+            yield chunk
+    except GeminiConfigError:
+        raise
+    except Exception as e:
+        logger.error(f"Error calling Gemini API (async stream): {e}")
 
 
 if __name__ == "__main__":
     response = get_gemini_response("Hello, tell me a joke.")
     print(response)
+    print(get_gemini_client_manager().stats())
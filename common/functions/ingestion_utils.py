@@ -4,20 +4,19 @@ import sys
 # Add parent directory to path to allow importing config and functions
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import re
-import pickle
 import shutil
 from typing import List
 
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_core.documents import Document
-from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
 from config import DATA_PATH, DB_PATH, EMBEDDING_MODEL_NAME, COLLECTION_NAME
 from functions.gemini_utils import analyze_image_with_gemini
+from functions.llm_backends import get_embedding_backend
+from functions.chunk_store import write_chunk_store, get_store_path
 from PIL import Image
 import io
-import time
 
 # --- Constants ---
 
@@ -301,8 +300,6 @@ def load_documents_with_docling_and_gemini(data_path: str) -> List[Document]:
                                 md_content = md_content.replace("<!-- image -->", "",1)
                             else:
                                 md_content = md_content.replace("<!-- image -->", description,1)
-                            # wait for 2 seconds
-                            time.sleep(2)
                 
                 # Fallback: Check pages for images if no high-level pictures found
                 # (Some versions/pdfs might not detect 'figures' but render 'page_images')
@@ -371,12 +368,12 @@ def generate_chunk_ids(chunks: List[Document]) -> List[Document]:
         chunk.metadata["chunk_id"] = f"{doc_id}_{section}_{i}"
     return chunks
 
-def save_chunks_for_bm25(chunks: List[Document], db_path: str):
-    """Saves the chunks to a pickle file for later use."""
-    chunks_file = os.path.join(db_path, "chunks.pkl")
-    print(f"Saving chunks for BM25 to '{chunks_file}'...")
-    with open(chunks_file, "wb") as f:
-        pickle.dump(chunks, f)
+def save_chunks_for_bm25(chunks: List[Document], db_path: str, ids: List[str] = None, append: bool = False):
+    """Saves the chunks to the memory-mapped chunk store for later use."""
+    if ids is None:
+        ids = [chunk.metadata.get("chunk_id", str(i)) for i, chunk in enumerate(chunks)]
+    print(f"Saving chunks to '{get_store_path(db_path)}'...")
+    write_chunk_store(chunks, ids, db_path, append=append)
 
 def reset_vector_db(db_path: str):
     """Deletes the existing vector database directory if it exists."""
@@ -388,7 +385,7 @@ def reset_vector_db(db_path: str):
 def create_and_persist_db(chunks: List[Document], db_path: str, collection_name: str, model_name: str,ids:List[str]):
     """Initializes the embedding model and creates the Chroma vector store."""
     print(f"Initializing embedding model '{model_name}'...")
-    embeddings = OllamaEmbeddings(model=model_name)
+    embeddings = get_embedding_backend().embeddings(model_name)
 
     print(f"Creating vector store in '{db_path}'...")
     Chroma.from_documents(
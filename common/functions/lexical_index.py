@@ -0,0 +1,172 @@
+import os
+import sys
+import re
+import json
+import sqlite3
+import logging
+import threading
+
+from langchain_core.documents import Document
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DB_PATH, LEXICAL_INDEX_FILE, BM25_TOP_K
+
+logger = logging.getLogger('rag_logger')
+
+# Persistent BM25 index over the chunks (SQLite FTS5), written at ingest time
+# next to the vector store. Queries hit the on-disk postings directly instead
+# of rebuilding a BM25Retriever over the whole corpus.
+
+# Common question words, matching them would only add noise to the ranking
+QUERY_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "who", "what", "which", "where", "when",
+    "how", "can", "could", "does", "do", "did", "has", "have", "any", "of", "in", "on", "to",
+    "for", "with", "and", "or", "at", "me", "about", "their", "them", "they", "he", "she",
+    "his", "her", "there", "that", "this", "be"
+}
+
+_local = threading.local()
+
+
+def get_index_path(db_path=DB_PATH):
+    return os.path.join(db_path, LEXICAL_INDEX_FILE)
+
+
+def create_index(conn):
+    """
+    Create the FTS5 table. Only content is tokenized, the other columns are
+    stored alongside for filtering and for rebuilding the Document.
+
+    :param conn: Connection object
+    """
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        chunk_id UNINDEXED,
+        section UNINDEXED,
+        email UNINDEXED,
+        metadata UNINDEXED,
+        content,
+        tokenize = 'porter unicode61'
+    );
+    """)
+
+
+def index_chunks(chunks, ids, db_path=DB_PATH):
+    """
+    Adds or replaces chunks in the index, existing rows with the same ids are
+    dropped first so re-ingesting a CV updates it in place.
+
+    :param chunks: list of Documents
+    :param ids: chunk ids, same order as chunks (the vector store ids)
+    """
+    os.makedirs(db_path, exist_ok=True)
+    conn = sqlite3.connect(get_index_path(db_path))
+    try:
+        with conn:
+            create_index(conn)
+            conn.executemany("DELETE FROM chunks_fts WHERE chunk_id = ?", [(id,) for id in ids])
+            conn.executemany(
+                "INSERT INTO chunks_fts (chunk_id, section, email, metadata, content) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        id,
+                        chunk.metadata.get("section"),
+                        chunk.metadata.get("email"),
+                        json.dumps(chunk.metadata),
+                        chunk.page_content
+                    )
+                    for id, chunk in zip(ids, chunks)
+                ]
+            )
+    finally:
+        conn.close()
+    logger.info(f"Indexed {len(ids)} chunks for BM25")
+
+
+def delete_chunks(ids, db_path=DB_PATH):
+    """Removes chunks from the index."""
+    path = get_index_path(db_path)
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executemany("DELETE FROM chunks_fts WHERE chunk_id = ?", [(id,) for id in ids])
+    finally:
+        conn.close()
+
+
+def _get_read_connection(db_path):
+    """One read-only connection per thread and index file, opened on first use."""
+    path = os.path.abspath(get_index_path(db_path))
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        if not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        connections[path] = conn
+    return conn
+
+
+def build_match_query(query_text):
+    """Turns a question into an FTS5 OR query of its quoted terms."""
+    terms = []
+    for word in re.findall(r"\w+", (query_text or "").lower()):
+        if len(word) > 1 and word not in QUERY_STOPWORDS and word not in terms:
+            terms.append(word)
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def search(query_text, k=BM25_TOP_K, section_list=None, emails=None, db_path=DB_PATH):
+    """
+    BM25 search over the indexed chunks.
+
+    :param query_text: the question
+    :param k: number of chunks to return
+    :param section_list: only return chunks of these sections (optional)
+    :param emails: only return chunks of these candidates (optional)
+    :return: list of Documents, best first, with the score in metadata["bm25_score"]
+    """
+    match = build_match_query(query_text)
+    if not match:
+        return []
+    conn = _get_read_connection(db_path)
+    if conn is None:
+        logger.warning(f"BM25 index not found at {get_index_path(db_path)}. Run ingest first.")
+        return []
+
+    sql = "SELECT chunk_id, metadata, content, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ?"
+    params = [match]
+    if section_list:
+        sql += f" AND section IN ({','.join('?' * len(section_list))})"
+        params.extend(section_list)
+    if emails:
+        sql += f" AND email IN ({','.join('?' * len(emails))})"
+        params.extend(emails)
+    # bm25() is lower-is-better
+    sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+    params.append(k)
+
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"BM25 search failed: {e}")
+        return []
+
+    docs = []
+    for chunk_id, metadata, content, score in rows:
+        metadata = json.loads(metadata) if metadata else {}
+        metadata["bm25_score"] = -score
+        docs.append(Document(id=chunk_id, page_content=content, metadata=metadata))
+    return docs
+
+
+def close_connections():
+    """Closes the calling thread's read connections."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import socket
+import logging
+import threading
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_BACKEND, EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, OLLAMA_MODEL, OLLAMA_BASE_URL,
+    GEMINI_MODEL, GEMINI_EMBEDDING_MODEL, FAKE_LLM_HOST, FAKE_LLM_PORT, FAKE_LLM_URL,
+    FAKE_LLM_AUTOSTART, FAKE_LLM_MODEL
+)
+from functions.gemini_utils import GeminiConfigError, get_gemini_client_manager
+
+logger = logging.getLogger('rag_logger')
+
+# The models behind the pipeline, behind one interface: chat, json_chat,
+# stream (and their async versions), embed and embed_batch, plus a LangChain
+# Embeddings object for Chroma. Callers ask get_llm_backend() /
+# get_embedding_backend() instead of branching on the model name.
+#
+# - "ollama": ChatOllama / OllamaEmbeddings, OLLAMA_BASE_URL to reach another host
+# - "gemini": the shared client of gemini_utils (limits, retries, GEMINI_BASE_URL)
+# - "fake": the Ollama backend pointed at the bundled fake server
+#   (fake_llm_server.py), started in-process when it isn't running; for load
+#   tests and benchmarks without models or network
+#
+# register_backend adds another one.
+
+
+def parse_json(content):
+    """The JSON object in an LLM response, None when there is none."""
+    if not content:
+        return None
+    try:
+        return json.loads(content.strip())
+    except json.JSONDecodeError as e:
+        print(f"Failed to decode JSON {e}")
+        return None
+
+
+class LLMBackend:
+    """
+    Base class. A backend implements _complete, _acomplete, _stream, _astream
+    and embeddings; the rest is built on them.
+
+    Errors are the same for every backend: a failed text call is logged and
+    answers "" (json_chat None, a stream simply ends), callers go on with the
+    empty answer. Only fatal_errors, a misconfigured backend, are raised.
+    Embedding calls raise, there is no empty vector to go on with.
+    """
+
+    name = None
+    fatal_errors = ()
+
+    def __init__(self, model=None, embedding_model=EMBEDDING_MODEL_NAME):
+        self.model = model
+        self.embedding_model = embedding_model
+
+    def _complete(self, prompt, model, json_mode, temperature):
+        raise NotImplementedError
+
+    async def _acomplete(self, prompt, model, json_mode, temperature):
+        raise NotImplementedError
+
+    def _stream(self, prompt, model):
+        raise NotImplementedError
+
+    async def _astream(self, prompt, model):
+        raise NotImplementedError
+        yield
+
+    def embeddings(self, model=None):
+        """LangChain Embeddings for model (default the backend's embedding model)."""
+        raise NotImplementedError
+
+    def complete(self, prompt, model=None, json_mode=False, temperature=None):
+        """The response text for prompt, "" when the call failed."""
+        try:
+            return self._complete(prompt, model, json_mode, temperature) or ""
+        except self.fatal_errors:
+            raise
+        except Exception as e:
+            logger.error(f"{self.name} backend: call failed: {e}")
+            return ""
+
+    async def acomplete(self, prompt, model=None, json_mode=False, temperature=None):
+        try:
+            return await self._acomplete(prompt, model, json_mode, temperature) or ""
+        except self.fatal_errors:
+            raise
+        except Exception as e:
+            logger.error(f"{self.name} backend: async call failed: {e}")
+            return ""
+
+    def stream(self, prompt, model=None):
+        """Yields the response text in chunks; a failed call ends the stream."""
+        try:
+            yield from self._stream(prompt, model)
+        except self.fatal_errors:
+            raise
+        except Exception as e:
+            logger.error(f"{self.name} backend: stream failed: {e}")
+
+    async def astream(self, prompt, model=None):
+        try:
+            async for chunk in self._astream(prompt, model):
+                yield chunk
+        except self.fatal_errors:
+            raise
+        except Exception as e:
+            logger.error(f"{self.name} backend: async stream failed: {e}")
+
+    def chat(self, prompt, model=None, temperature=None):
+        return self.complete(prompt, model, False, temperature)
+
+    def json_chat(self, prompt, model=None, temperature=None):
+        """The response parsed as JSON, None when it isn't."""
+        return parse_json(self.complete(prompt, model, True, temperature))
+
+    async def achat(self, prompt, model=None, temperature=None):
+        return await self.acomplete(prompt, model, False, temperature)
+
+    async def ajson_chat(self, prompt, model=None, temperature=None):
+        return parse_json(await self.acomplete(prompt, model, True, temperature))
+
+    def embed(self, text, model=None):
+        return self.embeddings(model).embed_query(text)
+
+    def embed_batch(self, texts, model=None):
+        """One vector per text, in a single request where the backend allows it."""
+        return self.embeddings(model).embed_documents(texts)
+
+    async def aembed(self, text, model=None):
+        return await self.embeddings(model).aembed_query(text)
+
+    def describe(self):
+        return {"backend": self.name, "model": self.model, "embedding_model": self.embedding_model}
+
+
+class OllamaBackend(LLMBackend):
+
+    name = "ollama"
+
+    def __init__(self, model=OLLAMA_MODEL, embedding_model=EMBEDDING_MODEL_NAME, base_url=OLLAMA_BASE_URL):
+        super().__init__(model, embedding_model)
+        self.base_url = base_url
+        self._chat_models = {}
+        self._embeddings = {}
+        self._lock = threading.Lock()
+
+    def _kwargs(self, model, json_mode=False, temperature=None):
+        kwargs = {"model": model or self.model}
+        if json_mode:
+            kwargs["format"] = "json"
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return kwargs
+
+    def _chat_model(self, model, json_mode=False, temperature=None):
+        # one client per setting, so its HTTP connections are reused
+        key = (model or self.model, json_mode, temperature)
+        chat_model = self._chat_models.get(key)
+        if chat_model is None:
+            with self._lock:
+                chat_model = self._chat_models.get(key)
+                if chat_model is None:
+                    chat_model = self._chat_models[key] = ChatOllama(**self._kwargs(model, json_mode, temperature))
+        return chat_model
+
+    def _complete(self, prompt, model, json_mode, temperature):
+        return self._chat_model(model, json_mode, temperature).invoke(prompt).content
+
+    async def _acomplete(self, prompt, model, json_mode, temperature):
+        # a fresh model: the async HTTP client belongs to the event loop it was created on
+        response = await ChatOllama(**self._kwargs(model, json_mode, temperature)).ainvoke(prompt)
+        return response.content
+
+    def _stream(self, prompt, model):
+        for chunk in self._chat_model(model).stream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+    async def _astream(self, prompt, model):
+        async for chunk in ChatOllama(**self._kwargs(model)).astream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+    def embeddings(self, model=None):
+        model = model or self.embedding_model
+        embeddings = self._embeddings.get(model)
+        if embeddings is None:
+            with self._lock:
+                embeddings = self._embeddings.get(model)
+                if embeddings is None:
+                    kwargs = {"model": model}
+                    if self.base_url:
+                        kwargs["base_url"] = self.base_url
+                    embeddings = self._embeddings[model] = OllamaEmbeddings(**kwargs)
+        return embeddings
+
+
+class GeminiEmbeddings(Embeddings):
+    """LangChain Embeddings on the shared Gemini client."""
+
+    def __init__(self, model=GEMINI_EMBEDDING_MODEL):
+        self.model = model
+
+    def embed_documents(self, texts):
+        return get_gemini_client_manager().embed(list(texts), model=self.model) if texts else []
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await get_gemini_client_manager().aembed(list(texts), model=self.model) if texts else []
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini on the shared client of gemini_utils; a missing API key is raised."""
+
+    name = "gemini"
+    fatal_errors = (GeminiConfigError,)
+
+    def __init__(self, model=GEMINI_MODEL, embedding_model=GEMINI_EMBEDDING_MODEL):
+        super().__init__(model, embedding_model)
+
+    def _config(self, json_mode):
+        return {'response_mime_type': 'application/json'} if json_mode else None
+
+    def _complete(self, prompt, model, json_mode, temperature):
+        return get_gemini_client_manager().generate(prompt, model=model or self.model, config=self._config(json_mode))
+
+    async def _acomplete(self, prompt, model, json_mode, temperature):
+        return await get_gemini_client_manager().agenerate(prompt, model=model or self.model, config=self._config(json_mode))
+
+    def _stream(self, prompt, model):
+        yield from get_gemini_client_manager().stream(prompt, model=model or self.model)
+
+    async def _astream(self, prompt, model):
+        async for chunk in get_gemini_client_manager().astream(prompt, model=model or self.model):
+            yield chunk
+
+    def embeddings(self, model=None):
+        return GeminiEmbeddings(model or self.embedding_model)
+
+
+_fake_server = None
+_fake_server_lock = threading.Lock()
+
+
+def _listening(host, port):
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def ensure_fake_server():
+    """
+    URL of the fake server: FAKE_LLM_URL, else FAKE_LLM_HOST:FAKE_LLM_PORT,
+    started in this process when nothing listens there yet.
+    """
+    global _fake_server
+    if FAKE_LLM_URL:
+        return FAKE_LLM_URL
+    with _fake_server_lock:
+        if _fake_server is None and FAKE_LLM_AUTOSTART and not _listening(FAKE_LLM_HOST, FAKE_LLM_PORT):
+            from functions.fake_llm_server import start_fake_server
+            _fake_server = start_fake_server(FAKE_LLM_HOST, FAKE_LLM_PORT)
+    return f"http://{FAKE_LLM_HOST}:{FAKE_LLM_PORT}"
+
+
+class FakeBackend(OllamaBackend):
+    """Deterministic answers from the bundled fake server, over the Ollama API."""
+
+    name = "fake"
+
+    def __init__(self, model=FAKE_LLM_MODEL, embedding_model=EMBEDDING_MODEL_NAME, base_url=None):
+        super().__init__(model, embedding_model, base_url or ensure_fake_server())
+
+
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "gemini": GeminiBackend,
+    "fake": FakeBackend
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def register_backend(name, backend_class):
+    """Makes backend_class (an LLMBackend) available as name."""
+    BACKENDS[name] = backend_class
+
+
+def get_backend(name):
+    """The process wide backend called name."""
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                if name not in BACKENDS:
+                    raise ValueError(f"Unknown LLM backend '{name}', expected one of {sorted(BACKENDS)}")
+                logger.info(f"Using the {name} backend")
+                backend = _backends[name] = BACKENDS[name]()
+    return backend
+
+
+def get_llm_backend():
+    """The backend answering the questions (LLM_BACKEND)."""
+    return get_backend(LLM_BACKEND)
+
+
+def get_embedding_backend():
+    """The backend embedding chunks and questions (EMBEDDING_BACKEND)."""
+    return get_backend(EMBEDDING_BACKEND)
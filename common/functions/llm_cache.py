@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LLM_CACHE_ENABLED, LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, LLM_CACHE_BYPASS
+
+logger = logging.getLogger('rag_logger')
+
+# On-disk cache of the LLM responses used at ingest (CV parsing in md_parser,
+# Gemini image transcription), so re-running ingestion on unchanged CVs
+# doesn't ask the models again.
+#
+# Entries are content addressed: the file name is the sha256 of the model,
+# the prompt template, the inputs and the call options, so a changed prompt
+# or CV simply misses. Files sit in LLM_CACHE_DIR/<2 hex>/<hash>.json and are
+# written atomically. A hit touches the file; when the directory grows past
+# LLM_CACHE_MAX_BYTES the least recently used entries are removed.
+#
+# LLM_CACHE_BYPASS=1 in the environment skips the lookups (fresh answers are
+# still stored); LLM_CACHE_ENABLED=False turns the cache off.
+
+EVICT_TO = 0.9 # eviction goes down to this share of max_bytes
+
+
+def make_key(kind, model, template, inputs, options=None):
+    """
+    sha256 of everything that decides an LLM response.
+
+    :param kind: the kind of call, e.g. "ollama-json" or "gemini-image"
+    :param template: the prompt template (or the prompt itself)
+    :param inputs: dict of the values filled into the template; bytes are hashed
+    :param options: call options such as format or temperature
+    """
+    def encode(value):
+        if isinstance(value, (bytes, bytearray)):
+            return {"sha256": hashlib.sha256(value).hexdigest()}
+        return value
+
+    payload = {
+        "kind": kind,
+        "model": model,
+        "template": template,
+        "inputs": {name: encode(value) for name, value in (inputs or {}).items()},
+        "options": options or {}
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES,
+                 enabled=LLM_CACHE_ENABLED, bypass=LLM_CACHE_BYPASS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled and bool(directory)
+        self.bypass = bypass
+        self._size = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        """The cached response for key, or None."""
+        if not self.enabled or self.bypass:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"LLM cache entry {key} unreadable, ignoring it: {e}")
+            self._count("errors")
+            return None
+        self._count("hits")
+        return entry["value"]
+
+    def put(self, key, value, **info):
+        """Stores value (anything JSON serialisable) under key. info goes along for inspection."""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        data = json.dumps({"value": value, "created_at": time.time(), **info}, ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"LLM cache entry {key} not written: {e}")
+            self._count("errors")
+            return
+        self._count("stores")
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            over = self.max_bytes is not None and self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def cached(self, key, call, store_if=bool, **info):
+        """
+        The cached response for key, else call() stored when store_if(result)
+        holds (by default when it is non-empty, so failures are asked again).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = call()
+        if store_if(value):
+            self.put(key, value, **info)
+        return value
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is under EVICT_TO of max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            size = sum(size for _, size, _ in entries)
+            target = self.max_bytes * EVICT_TO
+            removed = 0
+            for _, entry_size, path in entries:
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                size -= entry_size
+                removed += 1
+            self._size = size
+            self._stats["evictions"] += removed
+        if removed:
+            logger.info(f"LLM cache: evicted {removed} entries, {size} bytes left")
+
+    def clear(self):
+        """Removes every entry."""
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            if self._size is None:
+                self._size = self._scan_size()
+            stats["bytes"] = self._size
+        stats["enabled"] = self.enabled
+        stats["bypass"] = self.bypass
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """The process wide LLM response cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    # python functions/llm_cache.py [clear]
+    cache = get_llm_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+    print(cache.stats())
@@ -0,0 +1,171 @@
+import os
+import sys
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LOG_EMIT_INTERVAL, LOG_EMIT_MAX_PENDING
+
+# Routes rag_logger records to the session that asked the question.
+#
+# A request handler opens log_session(room) around the pipeline; the session
+# sits in a context variable, so records logged on the stage pool or in
+# asyncio tasks of that request find it. Every record is kept in the session
+# (for the QA history) and, when the session has a room (the socket sid),
+# queued for it. A flusher thread sends each room its queued lines as one
+# 'log_batch' event every LOG_EMIT_INTERVAL seconds. When a room has more than
+# LOG_EMIT_MAX_PENDING lines waiting, further INFO lines are dropped and only
+# counted; warnings and errors always go through.
+#
+# Records logged outside of any session (startup, shared worker threads) are
+# broadcast to everyone.
+
+_current_session = contextvars.ContextVar("rag_log_session", default=None)
+
+BROADCAST = object()
+
+
+class LogSession:
+    """The log lines of one request."""
+
+    def __init__(self, room=None):
+        self.room = room
+        self.lines = []
+        self._lock = threading.Lock()
+
+    def add(self, line):
+        with self._lock:
+            self.lines.append(line)
+
+    def getvalue(self):
+        """All lines so far, one per line like the StreamHandler capture it replaces."""
+        with self._lock:
+            return "".join(line + "\n" for line in self.lines)
+
+
+@contextmanager
+def log_session(room=None):
+    """
+    Routes the records logged inside the block to room (a socket sid).
+    Without a room the records are only kept in the yielded LogSession.
+    """
+    with use_session(LogSession(room)) as session:
+        yield session
+
+
+@contextmanager
+def use_session(session):
+    """Routes the records logged inside the block to an existing LogSession."""
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+
+
+class SessionLogHandler(logging.Handler):
+    """
+    Logging handler batching records per room.
+
+    :param send: callable(room, payload) emitting 'log_batch' to a room,
+                 room is None for a broadcast; called from the flusher thread
+    """
+
+    def __init__(self, send, interval=LOG_EMIT_INTERVAL, max_pending=LOG_EMIT_MAX_PENDING):
+        super().__init__()
+        self.send = send
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._dropped = {}
+        self._pending_lock = threading.Lock()
+        self._stats = {"lines": 0, "batches": 0, "dropped": 0, "send_errors": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-stream", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        session = _current_session.get()
+        if session is not None:
+            session.add(line)
+            if session.room is None:
+                return
+            room = session.room
+        else:
+            room = BROADCAST
+        with self._pending_lock:
+            pending = self._pending.setdefault(room, [])
+            if len(pending) >= self.max_pending and record.levelno < logging.WARNING:
+                self._dropped[room] = self._dropped.get(room, 0) + 1
+                self._stats["dropped"] += 1
+                return
+            pending.append(line)
+            self._stats["lines"] += 1
+
+    def flush_pending(self):
+        """Sends every room its queued lines now."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            dropped, self._dropped = self._dropped, {}
+        for room in set(pending) | set(dropped):
+            payload = {"lines": pending.get(room, []), "dropped": dropped.get(room, 0)}
+            try:
+                self.send(None if room is BROADCAST else room, payload)
+                with self._pending_lock:
+                    self._stats["batches"] += 1
+            except Exception:
+                with self._pending_lock:
+                    self._stats["send_errors"] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush_pending()
+
+    def close(self):
+        """Stops the flusher after sending what is queued. Safe to call twice."""
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self.flush_pending()
+        super().close()
+
+    def stats(self):
+        with self._pending_lock:
+            stats = dict(self._stats)
+            stats["pending"] = sum(len(lines) for lines in self._pending.values())
+        return stats
+
+
+_handler = None
+
+
+def install(logger, send, formatter=None):
+    """Attaches a SessionLogHandler sending through send to logger and returns it."""
+    global _handler
+    handler = SessionLogHandler(send)
+    if formatter is not None:
+        handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    _handler = handler
+    return handler
+
+
+def uninstall(logger):
+    global _handler
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.close()
+        _handler = None
+
+
+def get_stats():
+    """Counters of the installed handler, None when the server has none."""
+    return _handler.stats() if _handler is not None else None
@@ -0,0 +1,24 @@
+from functions.embedding_cache import get_embedding_cache
+import functions.question_classifier as question_classifier
+import functions.section_router as section_router
+import functions.reranker as reranker
+import functions.database_utils as db_utils
+from functions.qa_log_writer import get_qa_log_writer
+import functions.log_stream as log_stream
+from functions.gemini_utils import get_gemini_client_manager
+from functions.llm_backends import get_llm_backend
+
+
+def get_pipeline_stats():
+    """Counters of the caches and local short-circuits used by query_rag."""
+    return {
+        'embedding_cache': get_embedding_cache().stats(),
+        'question_classifier': question_classifier.get_stats(),
+        'section_router': section_router.get_stats(),
+        'reranker': reranker.get_reranker().stats(),
+        'profile_cache': db_utils.profile_cache.stats(),
+        'qa_log_writer': get_qa_log_writer().stats(),
+        'log_stream': log_stream.get_stats(),
+        'gemini': get_gemini_client_manager().stats(),
+        'llm_backend': get_llm_backend().describe()
+    }
@@ -0,0 +1,141 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DB_NAME, QA_LOG_QUEUE_SIZE, QA_LOG_BATCH_SIZE, QA_LOG_FULL_POLICY, QA_LOG_BLOCK_TIMEOUT
+import functions.database_utils as db_utils
+
+logger = logging.getLogger('rag_logger')
+
+_STOP = object()
+
+
+class QALogWriter:
+    """
+    Write-behind queue for save_qa_log.
+    Requests put their record on a bounded queue and return; one background
+    thread commits whatever has queued up (up to batch_size records) in a
+    single transaction.
+
+    When the queue is full the policy decides:
+    "block" waits up to QA_LOG_BLOCK_TIMEOUT seconds for room and then writes
+    the record on the caller's thread, so nothing is lost;
+    "drop" drops the record and counts it.
+    """
+
+    def __init__(self, db_file=DB_NAME, max_queue=QA_LOG_QUEUE_SIZE, batch_size=QA_LOG_BATCH_SIZE,
+                 policy=QA_LOG_FULL_POLICY):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.policy = policy
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "dropped": 0, "written_inline": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="qa-log-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def submit(self, question, answer, logs, context=None, trace=None):
+        """
+        Queue a QA record, trace being the stage trace (tracing.Trace.to_dict()).
+        Returns False when it was dropped.
+        """
+        record = (question, answer, logs, context, trace)
+        if self._closed:
+            return self._write_inline(record)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.policy == "drop":
+                self._count("dropped")
+                logger.warning("QA log queue full, dropping record")
+                return False
+            try:
+                self._queue.put(record, timeout=QA_LOG_BLOCK_TIMEOUT)
+            except queue.Full:
+                return self._write_inline(record)
+        self._count("queued")
+        return True
+
+    def _write_inline(self, record):
+        self._write([record])
+        self._count("written_inline")
+        return True
+
+    def _write(self, records):
+        try:
+            with db_utils.get_db_connection(self.db_file) as conn:
+                db_utils.save_qa_logs(conn, records)
+            self._count("written", len(records))
+            self._count("batches")
+        except Exception as e:
+            self._count("failed", len(records))
+            logger.error(f"Error saving {len(records)} QA log(s): {e}")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            stop = item is _STOP
+            batch = [] if stop else [item]
+            # take what else is already waiting, without holding the batch back
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Wait until every queued record is written."""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the thread. Later records are written inline."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_qa_log_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = QALogWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def save_qa_log_async(question, answer, logs, context=None, trace=None):
+    """Queue a QA record on the shared writer."""
+    return get_qa_log_writer().submit(question, answer, logs, context, trace)
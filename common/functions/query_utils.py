@@ -1,21 +1,29 @@
-import pickle
 import os
 import sys
 import re
+import logging
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings, ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.retrievers import BM25Retriever
-from sentence_transformers import CrossEncoder
 # Ensure 'common' directory is in sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATA_PATH, DB_PATH, EMBEDDING_MODEL_NAME, MODEL_NAME,COLLECTION_NAME,DB_NAME,SQL_MODEL   
+from config import (
+    DATA_PATH, DB_PATH, EMBEDDING_MODEL_NAME,COLLECTION_NAME,DB_NAME,SQL_MODEL,SQL_BACKEND,BM25_ENABLED,BM25_TOP_K,
+    FUSION_RRF_K,FUSION_WEIGHTS,FUSION_TOP_N,SKILL_FILTER_ENABLED,SKILL_MATCH_TOP_K,CONTEXT_USE_DIGESTS
+)
 import functions.database_utils as db_utils
-from functions.gemini_utils import get_gemini_json_response,get_gemini_response
-import json
+from functions.retriever_pool import get_vector_store
+import functions.lexical_index as lexical_index
+from functions.chunk_store import get_chunk_store, chunk_key
+import functions.reranker as reranker
+from functions.skills import find_skills
+from functions.question_classifier import pre_classify
+from functions.section_router import route_sections
+from functions.llm_backends import get_llm_backend,get_backend
+from functions.tracing import span, current_span
+from functions.context_packer import pack_context
 
+logger = logging.getLogger('rag_logger')
 
-CHUNKS_FILE = os.path.join(DB_PATH, "chunks.pkl")
 
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context.
@@ -29,154 +37,7 @@ Question: {question}
 Answer:
 """
 
-def load_bm25_chunks():
-    """Lengths and loads chunks for BM25 retrieval."""
-    if not os.path.exists(CHUNKS_FILE):
-        print(f"Chunks file not found at {CHUNKS_FILE}. Run ingest.py first.")
-        return None
-    
-    with open(CHUNKS_FILE, "rb") as f:
-        return pickle.load(f)
-
-def get_bm25_results(chunks, query_text):
-    """Retrieves documents using BM25."""
-    if not chunks: 
-        return []
-    retriever = BM25Retriever.from_documents(chunks)
-    retriever.k = 10
-    return retriever.invoke(query_text)
-
-def get_vector_results(query_text,section_list=[],chunk_ids=[]):
-    """Retrieves documents using vector similarity."""
-    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL_NAME)
-    # use NER to get the section
-    db = Chroma(persist_directory=DB_PATH, embedding_function=embeddings, collection_name=COLLECTION_NAME)
-    lst=[{"section": x} for x in section_list]
-    filter=None
-    if len(section_list)==1:
-        filter=lst[0]
-    elif len(section_list)>1:
-        filter={
-            "$or": lst
-        }
-    
-    results = []
-    if(len(chunk_ids)>0):
-        return db.get_by_ids(chunk_ids)
-    else:
-        results=db.similarity_search_with_score(
-            query_text,
-            k=10,
-            filter=filter
-        )  
-    return [doc for doc, score in results]
-
-
-def merge_and_deduplicate(bm25_docs, vector_docs):
-    """Merges and deduplicates documents by content."""
-    seen = set()
-    merged = []
-    for doc in bm25_docs + vector_docs:
-        h = hash(doc.page_content)
-        if h not in seen:
-            seen.add(h)
-            merged.append(doc)
-    return merged
-
-def rerank_documents(query_text, docs):
-    """Reranks documents using CrossEncoder."""
-    if not docs:
-        return []
-        
-    reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L6-v2')
-    pairs = [[query_text, doc.page_content] for doc in docs]
-    scores = reranker.predict(pairs)
-    
-    # Sort and take top 5
-    ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)
-    return [doc for doc, _ in ranked[:5]]
-
-def merge_same_source(docs):
-    """Merges documents with the same source."""
-    merge_dict={}
-    for doc in docs:
-        source = doc.metadata.get('source', 'Unknown')
-        if(merge_dict[source]):
-            merge_dict[source].page_content += "\n\n" + doc.page_content
-        else:
-            merge_dict[source] = doc
-    return list(merge_dict.values())
-
-
-
-def get_connection():
-    return db_utils.get_db_connection(DB_NAME)
-
-
-def generate_answer(query_text, context_docs,section_list):
-    """Generates answer using LLM."""
-    context_index_dict={
-        0:[]
-    }
-    maximum_cv=10
-    for i in range(len(section_list)):
-        context_index_dict[i+1]=[]
-    context_list = []
-    email_group_content_dict={}
-    for doc in context_docs:
-        # check if email is already in the dictionary
-        if doc.metadata.get("email", "Unknown") in email_group_content_dict:
-            email_group_content_dict[doc.metadata.get("email", "Unknown")].append(doc)
-        else:
-            email_group_content_dict[doc.metadata.get("email", "Unknown")]=[doc]
-
-    with get_connection() as conn:
-        for email in email_group_content_dict:
-            sql_data=db_utils.get_data_by_email(conn,email)
-            result = (
-                f"\t=== CANDIDATE START ===\n"
-                f"\t# This is the cv of {sql_data[0]['general']['name']}\n"
-                f"\t## Personal information\n"
-                f"\tName: {sql_data[0]['general']['name']}\n"
-                f"\tEmail: {sql_data[0]['general']['email']}\n"
-            )
-            for doc in email_group_content_dict[email]:
-                result += f"\n\n\t## {doc.metadata.get('section', 'contents')}\n\n\t{doc.page_content}"
-            context_index_dict[len(email_group_content_dict[email])].append(result)
-            # context_list.append(result)
-        for keys in context_index_dict:
-            if len(context_list) >= maximum_cv:
-                    break
-            for cv_content in context_index_dict[keys]:
-                context_list.append(cv_content)
-                if len(context_list) >= maximum_cv:
-                    break
-    
-
-    context_text = "\n\n=== CANDIDATE END ===\n\n".join(context_list)
-    context_text+="\n\n=== CANDIDATE END ===\n\n"
-   
-    if MODEL_NAME=="gemini":
-        content=get_data_using_gemini(query_text,PROMPT_TEMPLATE,context_text,is_json=False)
-        return  content,context_text
-    template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = template.format(context=context_text, question=query_text)
-    
-    print(f"\nGenerating answer using {MODEL_NAME}...\n")
-    model = ChatOllama(model=MODEL_NAME)
-    response = model.invoke(prompt)
-    content=response.content
-     #  write to a log file
-    with open("log.txt", "a") as f:
-        f.write(f"Query: {query_text}\n")
-        f.write(f"Context: {context_text}\n")
-        f.write(f"Answer: {content}\n")
-    
-    return content,context_text
-
-
-def get_section_using_llm(question):
-    TEMPLATE = """
+SECTION_TEMPLATE = """
     You are an expert CV analyzer.
 
     Your task is to determine which CV section(s) are most relevant to answer a given user question.
@@ -212,103 +73,8 @@ def get_section_using_llm(question):
 
     before answering check this question do this question needs sections skills,experience,interest,projects,education,general information.
     """
-    if MODEL_NAME=="gemini":
-        res_dict=get_data_using_gemini(question,TEMPLATE,"")
-        return  res_dict
-    prompt = ChatPromptTemplate.from_template(TEMPLATE)
-    model = ChatOllama(model=MODEL_NAME, format="json")
-    chain = prompt | model
-    response = chain.invoke({"question": question})
-    content = response.content
-    cleaned_content = content.strip()
-    try:
-        json_data = json.loads(cleaned_content)
-        print(json_data)
-        return json_data
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON {e}")
-        return None
-
-def get_sql_using_llm(question,schema_text):
-    TEMPLATE = """
-    You are a Text-to-SQL assistant.
-    Do NOT hallucinate or invent new tables or columns or try to answer if the question is not clear or not applicable to this context.
-
-    ##Database schema:
-    {schema_text}
 
-    ##input question:
-    {question}
-
-    Rules:
-    - Use ONLY the tables and columns provided.
-    - Generate ONLY valid SQLite SELECT queries.
-    - Do NOT use INSERT, UPDATE, DELETE, DROP.
-    - Do NOT explain anything.
-    - Return ONLY the SQL query.
-    - use only like operator for string matching
-    - The query should match both case (Case-Insensitive)
-    - Return NA if the question is not related to the database or if the question is ambiguous or cannot be answered using the database
-    - split_query_list give you the query with only one condition. if the question is complex then split_query_list will have more than one query.
-    -The response should be in the following format:
-    
-    {{
-    "query": "sql query",
-    "reason": "short explanation",
-    "query_object":give json object of the query. for eg:'query_object': {{'table': 'users', 'columns': ['name'], 'conditions': {{'column': 'skills', 'operator': 'LIKE', 'value': '%web app%'}}}}
-    }}
-    """
-    prompt = ChatPromptTemplate.from_template(TEMPLATE)
-    model = ChatOllama(model=SQL_MODEL, format="json")
-    chain = prompt | model
-    response = chain.invoke({"question": question,"schema_text":schema_text})
-    content = response.content
-    cleaned_content = content.strip()
-    try:
-        json_data = json.loads(cleaned_content)
-        print(json_data)
-        return json_data
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON {e}")
-
-def get_data_using_llm(question,TEMPLATE,context=""):
-    prompt = ChatPromptTemplate.from_template(TEMPLATE)
-    model = ChatOllama(model=MODEL_NAME, format="json",temperature=0.0)
-    chain = prompt | model
-    response = chain.invoke({"question": question,"context":context})
-    content = response.content
-    cleaned_content = content.strip()
-    try:
-        json_data = json.loads(cleaned_content)
-        print(json_data)
-        return json_data
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON {e}")
-        return None
-
-def get_data_using_gemini(question,TEMPLATE,context="",**args):
-    is_json=args.get("is_json",True)
-    prompt = ChatPromptTemplate.from_template(TEMPLATE)
-    formatted_prompt = prompt.format(question=question,context=context)
-    content = get_gemini_json_response(formatted_prompt) if is_json else get_gemini_response(formatted_prompt)
-    
-    if not content:
-        return None
-
-    cleaned_content = content.strip()
-    try:
-        if is_json:
-            json_data = json.loads(cleaned_content)
-            print(json_data)
-            return json_data
-        return cleaned_content
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON {e}")
-        return None
-
-
-def polish_question(question):
-    TEMPLATE="""
+POLISH_TEMPLATE = """
     ## context:
     - skills : programming languages, tools, technologies
     - experience : worked at, employed, job history
@@ -400,14 +166,310 @@ def polish_question(question):
     ##input question:
     {question}
     """
-    # question_dict=get_data_using_llm(question,TEMPLATE,"")
-    if MODEL_NAME=="gemini":
-        question_dict=get_data_using_gemini(question,TEMPLATE,"")
+
+
+def get_bm25_results(query_text,section_list=[],chunk_ids=[]):
+    """
+    Retrieves documents using BM25 from the persistent lexical index.
+    Questions scoped to known candidates (chunk_ids) are answered by the vector
+    store lookup alone, so BM25 only runs for open questions.
+    """
+    if not BM25_ENABLED or len(chunk_ids)>0:
+        return []
+    return lexical_index.search(query_text,k=BM25_TOP_K,section_list=section_list)
+
+def get_chunks_by_ids(chunk_ids):
+    """
+    Fetches chunks by id from the memory-mapped chunk store, falling back to
+    the vector store for ids it doesn't have.
+    """
+    store = get_chunk_store(DB_PATH)
+    docs = store.get_by_ids(chunk_ids) if store is not None else []
+    found = {doc.id for doc in docs}
+    missing = [id for id in chunk_ids if id not in found]
+    if missing:
+        db = get_vector_store(DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME)
+        docs.extend(db.get_by_ids(missing))
+    return docs
+
+def _skill_vocabulary():
+    with get_read_connection() as conn:
+        return db_utils.get_skill_vocabulary(conn)
+
+def get_skill_results(query_text,chunk_ids=[]):
+    """
+    Skills chunks of the candidates whose listed skills match the skills named
+    in the question (user_skills index), most matched skills first.
+    Like BM25 this only runs for open questions.
+    """
+    if not SKILL_FILTER_ENABLED or len(chunk_ids)>0:
+        return []
+    skills=find_skills(query_text,_skill_vocabulary)
+    if not skills:
+        return []
+    with get_read_connection() as conn:
+        matches=db_utils.find_emails_by_skills(conn,skills)[:SKILL_MATCH_TOP_K]
+    docs=get_chunks_by_ids([email+"_skills" for email,_ in matches])
+    matched=dict(matches)
+    for doc in docs:
+        doc.metadata["skills_score"]=matched.get(doc.metadata.get("email"))
+    return docs
+
+def get_vector_results(query_text,section_list=[],chunk_ids=[],query_embedding=None):
+    """
+    Retrieves documents using vector similarity.
+    Pass query_embedding to reuse an embedding computed elsewhere (batch queries).
+    """
+    db = get_vector_store(DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME)
+    # use NER to get the section
+    lst=[{"section": x} for x in section_list]
+    filter=None
+    if len(section_list)==1:
+        filter=lst[0]
+    elif len(section_list)>1:
+        filter={
+            "$or": lst
+        }
+    
+    results = []
+    if(len(chunk_ids)>0):
+        return get_chunks_by_ids(chunk_ids)
+    elif query_embedding is not None:
+        results=db.similarity_search_by_vector_with_relevance_scores(
+            query_embedding,
+            k=10,
+            filter=filter
+        )
     else:
-        question_dict=get_data_using_llm(question,TEMPLATE,"")
-    names=question_dict["names"]
-    emails=question_dict["emails"]
-    polished_question=question_dict["polished_question"]
+        results=db.similarity_search_with_relevance_scores(
+            query_text,
+            k=10,
+            filter=filter
+        )  
+    for doc, score in results:
+        doc.metadata["vector_score"]=score
+    return [doc for doc, score in results]
+
+
+def embed_question(query_text):
+    """Embeds a question with the pooled (cached) embedding client."""
+    db = get_vector_store(DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME)
+    return db.embeddings.embed_query(query_text)
+
+
+def embed_questions(questions):
+    """Embeds several questions with one batched call for the cache misses."""
+    db = get_vector_store(DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME)
+    return db.embeddings.embed_queries(questions)
+
+
+def merge_and_deduplicate(bm25_docs, vector_docs):
+    """Merges and deduplicates documents by content."""
+    seen = set()
+    merged = []
+    for doc in bm25_docs + vector_docs:
+        h = hash(doc.page_content)
+        if h not in seen:
+            seen.add(h)
+            merged.append(doc)
+    return merged
+
+def fuse_results(results, weights=None, k=FUSION_RRF_K, top_n=FUSION_TOP_N):
+    """
+    Reciprocal rank fusion of ranked result lists, deduplicated by chunk id.
+    results maps a source name ("bm25", "vector") to its docs, best first.
+    Returns the top_n docs by fused score with metadata["fusion_score"] and
+    metadata["retrieval_scores"] ({source: {"rank", "score"}}) set.
+    """
+    weights = FUSION_WEIGHTS if weights is None else weights
+    fused = {}
+    for source, docs in results.items():
+        weight = weights.get(source, 1.0)
+        for rank, doc in enumerate(docs, start=1):
+            key = chunk_key(doc)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {"doc": doc, "score": 0.0, "sources": {}}
+            entry["score"] += weight / (k + rank)
+            entry["sources"][source] = {"rank": rank, "score": doc.metadata.get(f"{source}_score")}
+    ranked = sorted(fused.values(), key=lambda e: e["score"], reverse=True)[:top_n]
+    for entry in ranked:
+        entry["doc"].metadata["fusion_score"] = round(entry["score"], 6)
+        entry["doc"].metadata["retrieval_scores"] = entry["sources"]
+    return [entry["doc"] for entry in ranked]
+
+def rerank_documents(query_text, docs):
+    """Reranks documents with the resident CrossEncoder and keeps the top 5."""
+    if not docs:
+        return []
+    return reranker.rerank_documents(query_text, docs)
+
+def merge_same_source(docs):
+    """Merges documents with the same source."""
+    merge_dict={}
+    for doc in docs:
+        source = doc.metadata.get('source', 'Unknown')
+        if(merge_dict[source]):
+            merge_dict[source].page_content += "\n\n" + doc.page_content
+        else:
+            merge_dict[source] = doc
+    return list(merge_dict.values())
+
+
+
+def get_connection():
+    return db_utils.get_db_connection(DB_NAME)
+
+def get_read_connection():
+    return db_utils.get_read_connection(DB_NAME)
+
+
+def build_context(context_docs,section_list,profiles=None,full_text=False):
+    """
+    Groups the retrieved docs per candidate and builds the prompt context,
+    packed into CONTEXT_TOKEN_BUDGET tokens (see functions/context_packer.py).
+    profiles maps email -> profile (get_profiles_by_emails), read from SQLite when not given.
+    Sections are given as their ingest-time digests unless full_text is set.
+    """
+    if profiles is None:
+        emails=list(dict.fromkeys(doc.metadata.get("email", "Unknown") for doc in context_docs))
+        with get_read_connection() as conn:
+            profiles=db_utils.get_profiles_by_emails(conn,emails)
+    context_text,stats=pack_context(context_docs,section_list,profiles,use_digests=CONTEXT_USE_DIGESTS and not full_text)
+    current=current_span()
+    if current is not None:
+        current.set(**{f"packed_{key}":value for key,value in stats.items()})
+    return context_text
+
+
+def generate_answer(query_text, context_docs,section_list,full_text=False):
+    """Generates answer using LLM, from the full section text instead of the digests when full_text is set."""
+    with span("context_build",docs=len(context_docs)) as stage:
+        context_text=build_context(context_docs,section_list,full_text=full_text)
+        stage.set(context_chars=len(context_text))
+   
+    backend=get_llm_backend()
+    prompt = format_prompt(PROMPT_TEMPLATE, context=context_text, question=query_text)
+    
+    print(f"\nGenerating answer using {backend.name} ({backend.model})...\n")
+    with span("llm_generate",backend=backend.name,model=backend.model,prompt_chars=len(prompt)) as stage:
+        content=backend.chat(prompt)
+        stage.set(answer_chars=len(content or ""))
+     #  write to a log file
+    with open("log.txt", "a") as f:
+        f.write(f"Query: {query_text}\n")
+        f.write(f"Context: {context_text}\n")
+        f.write(f"Answer: {content}\n")
+    
+    return content,context_text
+
+
+def stream_answer(query_text, context_text):
+    """Generates the answer token by token. Yields text chunks."""
+    prompt = format_prompt(PROMPT_TEMPLATE, context=context_text, question=query_text)
+    yield from get_llm_backend().stream(prompt)
+
+
+def get_section_using_llm(question):
+    json_data=get_llm_backend().json_chat(format_prompt(SECTION_TEMPLATE, question=question))
+    print(json_data)
+    return json_data
+
+def get_section(question):
+    """Routes the question to CV sections locally, asking the LLM only when the local router is unsure."""
+    with span("section_routing",input_chars=len(question)) as stage:
+        section=route_sections(question)
+        if section:
+            stage.set(source="router",sections=section["sections"])
+            return section
+        section=get_section_using_llm(question)
+        if not isinstance(section,dict) or not isinstance(section.get("sections"),list):
+            # no usable answer from the LLM: search every section
+            section={"sections":[]}
+        stage.set(source="llm",sections=section["sections"])
+        return section
+
+def get_sql_using_llm(question,schema_text):
+    TEMPLATE = """
+    You are a Text-to-SQL assistant.
+    Do NOT hallucinate or invent new tables or columns or try to answer if the question is not clear or not applicable to this context.
+
+    ##Database schema:
+    {schema_text}
+
+    ##input question:
+    {question}
+
+    Rules:
+    - Use ONLY the tables and columns provided.
+    - Generate ONLY valid SQLite SELECT queries.
+    - Do NOT use INSERT, UPDATE, DELETE, DROP.
+    - Do NOT explain anything.
+    - Return ONLY the SQL query.
+    - use only like operator for string matching
+    - The query should match both case (Case-Insensitive)
+    - Return NA if the question is not related to the database or if the question is ambiguous or cannot be answered using the database
+    - split_query_list give you the query with only one condition. if the question is complex then split_query_list will have more than one query.
+    -The response should be in the following format:
+    
+    {{
+    "query": "sql query",
+    "reason": "short explanation",
+    "query_object":give json object of the query. for eg:'query_object': {{'table': 'users', 'columns': ['name'], 'conditions': {{'column': 'skills', 'operator': 'LIKE', 'value': '%web app%'}}}}
+    }}
+    """
+    # SQL_MODEL is a model of SQL_BACKEND
+    json_data=get_backend(SQL_BACKEND).json_chat(format_prompt(TEMPLATE, question=question, schema_text=schema_text), model=SQL_MODEL)
+    print(json_data)
+    return json_data
+
+def format_prompt(TEMPLATE, **values):
+    """The prompt text of a template, as the chat model receives it."""
+    return ChatPromptTemplate.from_template(TEMPLATE).format_messages(**values)[0].content
+
+
+def get_data_using_llm(question,TEMPLATE,context="",is_json=True):
+    """Fills TEMPLATE and asks the LLM backend. Parsed JSON (None when invalid) or the stripped text."""
+    backend=get_llm_backend()
+    prompt=format_prompt(TEMPLATE, question=question, context=context)
+    if not is_json:
+        content=backend.chat(prompt)
+        return content.strip() if content else None
+    json_data=backend.json_chat(prompt, temperature=0.0)
+    print(json_data)
+    return json_data
+
+
+def polish_question(question,on_llm=None):
+    """
+    The polished question dict, from the pre-classifier when it is confident,
+    else from the LLM. on_llm() is called right before the LLM is asked, to
+    start work that can overlap with the call.
+    """
+    with span("polish",input_chars=len(question)) as stage:
+        # greetings, self references and explicit emails/names don't need the LLM
+        question_dict=pre_classify(question)
+        if question_dict:
+            stage.set(source="classifier")
+            return question_dict
+        if on_llm is not None:
+            on_llm()
+        question_dict=get_data_using_llm(question,POLISH_TEMPLATE,"")
+        stage.set(source="llm")
+        return check_question_entities(question,question_dict)
+
+
+def check_question_entities(question,question_dict):
+    """
+    Drops names and emails the LLM returned that are not in the question.
+    When the LLM gave no usable answer (a failed call answers None) the raw
+    question goes on without names or emails.
+    """
+    if not isinstance(question_dict,dict) or not question_dict.get("polished_question"):
+        logger.warning("No polished question from the LLM, using the question as asked")
+        question_dict={"polished_question":question,"names":[],"emails":[],"short_description":""}
+    names=question_dict.get("names") or []
+    emails=question_dict.get("emails") or []
     # check the names and emails are present in the question
     # by seracrhing it
     names= [name for name in names if name in question]
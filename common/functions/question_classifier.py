@@ -0,0 +1,209 @@
+import os
+import sys
+import re
+import time
+import logging
+import threading
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DB_NAME, PRECLASSIFIER_ENABLED, PRECLASSIFIER_MIN_CONFIDENCE, PRECLASSIFIER_NAMES_TTL
+import functions.database_utils as db_utils
+
+logger = logging.getLogger('rag_logger')
+
+EMAIL_REGEX = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4}")
+
+GREETING_PHRASES = [
+    "nice to meet you", "how are you doing", "what are you doing", "where are you",
+    "who are you", "how are you", "how r u", "good morning", "good afternoon",
+    "good evening", "good night", "what's up", "whats up", "thank you", "thanks",
+    "hello", "hii", "hi", "hey", "hola", "yo", "sup", "there", "ok", "okay",
+    "bye", "goodbye", "please", "dear"
+]
+GREETING_REGEX = re.compile(
+    r"\b(?:" + "|".join(re.escape(p) for p in sorted(GREETING_PHRASES, key=len, reverse=True)) + r")\b"
+)
+
+FIRST_PERSON_WORDS = {"i", "me", "my", "myself", "mine", "im", "i'm", "i've", "i'd"}
+
+# Words that show the question is about CV content
+TOPIC_WORDS = {
+    "skill", "skills", "experience", "experienced", "worked", "work", "job", "education",
+    "degree", "college", "university", "project", "projects", "built", "developed",
+    "develop", "developer", "implemented", "certification", "certifications", "certified",
+    "interest", "interests", "hobby", "hobbies", "sports", "language", "languages",
+    "candidate", "candidates", "resume", "cv", "email", "phone", "position", "company"
+}
+
+# Never treat these as candidate names
+NOT_NAME_WORDS = {
+    "who", "what", "where", "when", "why", "how", "which", "can", "the", "and", "any",
+    "app", "web", "all"
+}
+
+# Short-circuit counters, see get_stats()
+_stats = {"total": 0, "short_circuit": 0, "fallthrough": 0, "reasons": {}}
+_stats_lock = threading.Lock()
+
+_names = {"loaded_at": 0, "full": set(), "parts": set()}
+_names_lock = threading.Lock()
+
+
+def _record(reason, short_circuit):
+    with _stats_lock:
+        _stats["total"] += 1
+        _stats["short_circuit" if short_circuit else "fallthrough"] += 1
+        _stats["reasons"][reason] = _stats["reasons"].get(reason, 0) + 1
+
+
+def get_stats():
+    """Returns how often questions were answered locally vs sent to the LLM."""
+    with _stats_lock:
+        return {**_stats, "reasons": dict(_stats["reasons"])}
+
+
+def _load_names():
+    """
+    Lower-cased candidate full names and single name parts from the users
+    table, reloaded every PRECLASSIFIER_NAMES_TTL. Returns (full_names, name_parts).
+    """
+    now = time.time()
+    if now - _names["loaded_at"] < PRECLASSIFIER_NAMES_TTL:
+        return _names["full"], _names["parts"]
+    with _names_lock:
+        if now - _names["loaded_at"] < PRECLASSIFIER_NAMES_TTL:
+            return _names["full"], _names["parts"]
+        full, parts = set(), set()
+        try:
+            with db_utils.get_read_connection(DB_NAME) as conn:
+                for _, name in db_utils.get_user_names(conn):
+                    name = " ".join(name.lower().split())
+                    if " " in name:
+                        full.add(name)
+                        parts.update(p for p in name.split() if len(p) >= 3)
+                    elif name:
+                        parts.add(name)
+        except Exception as e:
+            logger.warning(f"Could not load candidate names: {e}")
+        _names["full"] = full - NOT_NAME_WORDS
+        _names["parts"] = parts - NOT_NAME_WORDS
+        _names["loaded_at"] = now
+        return _names["full"], _names["parts"]
+
+
+def _sentence_start(question, index):
+    before = question[:index].rstrip()
+    return not before or before[-1] in ".!?"
+
+
+def find_names(question, full_names, name_parts):
+    """
+    Returns the known candidate names in the question, as written in the
+    question, and whether any of them is uncertain.
+
+    Full names match in any case. A single name part is often an ordinary
+    word ("will", "mark"), so it only counts when capitalised, and is
+    uncertain at the start of a sentence, where every word is capitalised.
+    """
+    found = []
+    uncertain = False
+    candidates = [(name, True) for name in full_names] + [(part, False) for part in name_parts]
+    # longest first so "athul jacob" wins over "athul"
+    for part, full in sorted(candidates, key=lambda c: len(c[0]), reverse=True):
+        for match in re.finditer(r"\b" + re.escape(part) + r"\b", question, re.IGNORECASE):
+            if not full and not match.group(0)[0].isupper():
+                continue
+            if not any(match.group(0).lower() in f.lower() for _, f in found):
+                found.append((match.start(), match.group(0)))
+                uncertain = uncertain or (not full and _sentence_start(question, match.start()))
+            break
+    return [name for _, name in sorted(found)], uncertain
+
+
+def _clean_question(question):
+    """Drops a leading greeting and fixes casing / trailing question mark."""
+    text = re.sub(r"\s+", " ", question).strip()
+    text = re.sub(r"^(?:hi|hello|hey|dear)\b[\s,!.]*", "", text, flags=re.IGNORECASE).strip()
+    if not text:
+        return question.strip()
+    text = text[0].upper() + text[1:]
+    text = text.rstrip(" .!")
+    if not text.endswith("?"):
+        text += "?"
+    return text
+
+
+def _result(polished_question, names, emails, description, confidence, reason):
+    return {
+        "polished_question": polished_question,
+        "names": names,
+        "emails": emails,
+        "short_description": description,
+        "intents": [],
+        "confidence": confidence,
+        "classified_by": reason
+    }
+
+
+def classify_question(question, full_names=None, name_parts=None):
+    """
+    Rule based classification of a raw question.
+    Returns a polish_question shaped dict with a confidence in [0, 1],
+    or None when the rules have nothing to say.
+    """
+    if full_names is None or name_parts is None:
+        full_names, name_parts = _load_names()
+    emails = EMAIL_REGEX.findall(question)
+    names, uncertain_names = find_names(EMAIL_REGEX.sub(" ", question), full_names, name_parts)
+
+    lowered = EMAIL_REGEX.sub(" ", question.lower())
+    for name in names:
+        lowered = re.sub(r"\b" + re.escape(name.lower()) + r"\b", " ", lowered)
+    words = re.findall(r"[a-z']+", lowered)
+
+    # Nothing left once greetings, emails and names are removed: a greeting,
+    # or a bare candidate lookup when there was a name or email
+    greeted = GREETING_REGEX.search(lowered) is not None
+    remainder = re.sub(r"[^a-z\s']", " ", GREETING_REGEX.sub(" ", lowered)).strip()
+    if not remainder and greeted and not emails and not names:
+        return _result("not related", [], [], "not related, it is a greeting", 0.95, "greeting")
+
+    has_topic = any(w in TOPIC_WORDS for w in words)
+    if not emails and not names and any(w in FIRST_PERSON_WORDS for w in words):
+        confidence = 0.5 if has_topic else 0.85
+        return _result("not related", [], [], "not related, the user is asking about themselves", confidence, "self_reference")
+
+    if emails or names:
+        # a first person question about a candidate is ambiguous, and so is a
+        # lone first name that may be an ordinary word: let the LLM decide
+        if any(w in FIRST_PERSON_WORDS for w in words):
+            confidence = 0.5
+        elif uncertain_names and not emails:
+            confidence = 0.6
+        else:
+            confidence = 0.9
+        subject = ", ".join(names + emails)
+        polished_question = f"Tell me about {subject}?" if not remainder else _clean_question(question)
+        return _result(polished_question, names, emails, f"Question about {subject}.", confidence, "entity")
+
+    return None
+
+
+def pre_classify(question):
+    """
+    Answers polish_question locally when the rules are confident enough.
+    Returns None when the question should go to the LLM.
+    """
+    if not PRECLASSIFIER_ENABLED:
+        return None
+    result = classify_question(question)
+    if result is None:
+        _record("no_rule", False)
+        return None
+    if result["confidence"] < PRECLASSIFIER_MIN_CONFIDENCE:
+        _record(f"{result['classified_by']}_low_confidence", False)
+        return None
+    _record(result["classified_by"], True)
+    logger.info(f"Pre-classified question ({result['classified_by']}, {result['confidence']}) without LLM")
+    return result
@@ -0,0 +1,169 @@
+import os
+import sys
+import queue
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    RERANK_ENABLED, RERANKER_MODEL, RERANK_TOP_N, RERANK_CANDIDATES,
+    RERANK_BATCH_SIZE, RERANK_BATCH_WAIT, RERANK_CACHE_SIZE, RERANK_CACHE_TTL
+)
+from functions.cache_utils import LRUCache
+from functions.embedding_cache import normalize_text
+from functions.chunk_store import chunk_key
+
+logger = logging.getLogger('rag_logger')
+
+# Resident cross-encoder. The model is loaded once per process; a worker
+# thread collects the (question, chunk) pairs of concurrent queries for up to
+# RERANK_BATCH_WAIT seconds and scores them in one predict call. Scores are
+# cached per (question, chunk, chunk text) so repeated questions skip the
+# model entirely, and a chunk re-ingested with new text is scored again.
+
+
+class Reranker:
+
+    def __init__(self, model_name=RERANKER_MODEL, batch_size=RERANK_BATCH_SIZE, batch_wait=RERANK_BATCH_WAIT,
+                 cache_size=RERANK_CACHE_SIZE, cache_ttl=RERANK_CACHE_TTL):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.cache = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self._model = None
+        self._load_error = None
+        self._load_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "pairs_scored": 0}
+
+    def load(self):
+        """Loads the model on first use. Returns None when it can't be loaded."""
+        if self._model is None and self._load_error is None:
+            with self._load_lock:
+                if self._model is None and self._load_error is None:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        logger.info(f"Loading reranker model {self.model_name}")
+                        self._model = CrossEncoder(self.model_name)
+                    except Exception as e:
+                        logger.warning(f"Reranker unavailable, keeping retrieval order: {e}")
+                        self._load_error = e
+        return self._model
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="reranker", daemon=True)
+                    self._worker.start()
+
+    def _next_batch(self):
+        """Blocks for one request, then takes whatever else arrives within batch_wait."""
+        batch = [self._queue.get()]
+        pairs = len(batch[0][0])
+        while pairs < self.batch_size:
+            try:
+                item = self._queue.get(timeout=self.batch_wait)
+            except queue.Empty:
+                break
+            batch.append(item)
+            pairs += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            pairs = [pair for item_pairs, _ in batch for pair in item_pairs]
+            try:
+                scores = self._model.predict(pairs, batch_size=self.batch_size)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["pairs_scored"] += len(pairs)
+            start = 0
+            for item_pairs, future in batch:
+                future.set_result([float(s) for s in scores[start:start + len(item_pairs)]])
+                start += len(item_pairs)
+
+    def cache_key(self, question, doc):
+        """(normalized question, chunk key, hash of the chunk text): chunk ids outlive re-ingestion."""
+        content = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+        return (question, chunk_key(doc), content)
+
+    def score(self, query_text, docs):
+        """Cross-encoder scores of docs for the question, from the cache where possible."""
+        question = normalize_text(query_text)
+        keys = [self.cache_key(question, doc) for doc in docs]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        with self._stats_lock:
+            self._stats["requests"] += 1
+        if missing:
+            self._ensure_worker()
+            future = Future()
+            self._queue.put(([[query_text, docs[i].page_content] for i in missing], future))
+            for i, score in zip(missing, future.result()):
+                scores[i] = score
+                self.cache.set(keys[i], score)
+        return scores
+
+    def rerank(self, query_text, docs, top_n=RERANK_TOP_N, candidates=RERANK_CANDIDATES):
+        """
+        Scores the first `candidates` docs (the input order is the retrieval
+        ranking) and returns the best top_n, with metadata["rerank_score"] set.
+        """
+        if not docs or self.load() is None:
+            return docs
+        docs = docs[:candidates]
+        try:
+            scores = self.score(query_text, docs)
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping retrieval order: {e}")
+            return docs
+        ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)[:top_n]
+        for doc, score in ranked:
+            doc.metadata["rerank_score"] = score
+        return [doc for doc, _ in ranked]
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["loaded"] = self._model is not None
+        stats["avg_batch_pairs"] = round(stats["pairs_scored"] / stats["batches"], 2) if stats["batches"] else 0
+        stats["cache"] = self.cache.stats()
+        return stats
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
+
+
+def warm_up():
+    """Loads the model up front so the first query doesn't pay for it."""
+    if RERANK_ENABLED:
+        get_reranker().load()
+
+
+def rerank_documents(query_text, docs, top_n=RERANK_TOP_N):
+    """Reranks docs with the shared reranker, returns them unchanged when reranking is off."""
+    if not RERANK_ENABLED:
+        return docs
+    return get_reranker().rerank(query_text, docs, top_n=top_n)
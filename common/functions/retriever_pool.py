@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import logging
+
+from langchain_chroma import Chroma
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME
+from functions.embedding_cache import CachedEmbeddings
+from functions.llm_backends import get_embedding_backend
+
+logger = logging.getLogger('rag_logger')
+
+# Process-wide registry of open vector stores.
+# key -> (persist_directory, collection_name, embedding_model_name)
+_stores = {}
+_lock = threading.Lock()
+
+
+def _make_key(persist_directory, collection_name, model_name):
+    return (os.path.abspath(persist_directory), collection_name, model_name)
+
+
+def _build_store(persist_directory, collection_name, model_name):
+    """Creates the embedding client and the Chroma store for a registry key."""
+    embeddings = None
+    if model_name:
+        # query embeddings go through the shared LRU cache, keyed per backend
+        backend = get_embedding_backend()
+        embeddings = CachedEmbeddings(backend.embeddings(model_name), f"{backend.name}:{model_name}")
+    return Chroma(
+        persist_directory=persist_directory,
+        embedding_function=embeddings,
+        collection_name=collection_name
+    )
+
+
+def get_vector_store(persist_directory=DB_PATH, collection_name=COLLECTION_NAME, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Returns the shared Chroma store for the given persist dir, collection and
+    embedding model, creating it on first use.
+    Pass model_name=None for a read-only store without an embedding function.
+    """
+    key = _make_key(persist_directory, collection_name, model_name)
+    store = _stores.get(key)
+    if store is not None:
+        return store
+    with _lock:
+        # another thread may have built it while we were waiting
+        store = _stores.get(key)
+        if store is None:
+            logger.info(f"Opening vector store {collection_name} in {persist_directory} ({model_name})")
+            store = _build_store(persist_directory, collection_name, model_name)
+            _stores[key] = store
+        return store
+
+
+def warm_up(persist_directory=DB_PATH, collection_name=COLLECTION_NAME, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Opens the store ahead of the first query so the collection metadata is
+    loaded and the embedding model is resident in Ollama.
+    """
+    store = get_vector_store(persist_directory, collection_name, model_name)
+    try:
+        store._collection.count()
+        if store.embeddings is not None:
+            store.embeddings.embed_query("warm up")
+    except Exception as e:
+        logger.warning(f"Vector store warm up failed: {e}")
+    return store
+
+
+def release(persist_directory=DB_PATH, collection_name=COLLECTION_NAME, model_name=EMBEDDING_MODEL_NAME):
+    """Drops a single store from the registry, e.g. after its directory was reset."""
+    with _lock:
+        _stores.pop(_make_key(persist_directory, collection_name, model_name), None)
+
+
+def close_all():
+    """Drops every pooled store. Chroma persists on write so there is nothing to flush."""
+    with _lock:
+        count = len(_stores)
+        _stores.clear()
+    if count:
+        logger.info(f"Closed {count} pooled vector store(s)")
@@ -0,0 +1,127 @@
+import os
+import sys
+import re
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DIGEST_FACT_MAX_CHARS, DIGEST_MAX_CHARS
+
+# Compact digest of a CV section, computed once at ingest and stored in the
+# chunk metadata ("digest") next to the full text. The prompt uses the digest
+# by default (see context_packer), so the markdown/OCR noise of the parsed CV
+# doesn't go to the LLM with every question.
+#
+# The digest is extractive and deterministic: the section is cleaned of
+# markdown and OCR debris, split into facts (bullets, lines, sentences, table
+# rows), wrapped lines are joined back, duplicates are dropped and every fact
+# and the whole digest are capped at a fixed length.
+
+BULLET = re.compile(r"^\s*(?:[-*+•●▪◦·]|\d+[.)])\s+")
+HEADING = re.compile(r"^\s*#{1,6}\s*")
+IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+HTML_TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+EMPHASIS = re.compile(r"(\*\*|__|\*|`)")
+TABLE_RULE = re.compile(r"^\s*\|?\s*:?-{3,}")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+SPACES = re.compile(r"\s+")
+
+
+def clean_line(line):
+    """Markdown and OCR debris out of one line."""
+    line = IMAGE.sub(" ", line)
+    line = LINK.sub(r"\1", line)
+    line = HTML_TAG.sub(" ", line)
+    line = HEADING.sub("", line)
+    line = EMPHASIS.sub("", line)
+    line = line.replace("\\", "")
+    if "|" in line:
+        line = "; ".join(cell.strip() for cell in line.strip().strip("|").split("|") if cell.strip())
+    # runs of separators left over from OCR, e.g. "---:::" or "....."
+    line = re.sub(r"([^\w\s])\1{2,}", " ", line)
+    return SPACES.sub(" ", line).strip(" -:;,")
+
+
+def _is_noise(fact):
+    if len(fact) < 3:
+        return True
+    letters = sum(ch.isalnum() for ch in fact)
+    return letters < len(fact) * 0.5
+
+
+def _cap(fact, limit):
+    if len(fact) <= limit:
+        return fact
+    cut = fact[:limit - 1]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:-") + "…"
+
+
+def extract_facts(text):
+    """Cleaned, de-duplicated facts of a section, in their order in the CV."""
+    facts = []
+    previous_open = False
+    previous_comma = False
+    raw_previous = ""
+    for raw in (text or "").splitlines():
+        if not raw.strip() or TABLE_RULE.match(raw):
+            previous_open = previous_comma = False
+            continue
+        is_bullet = bool(BULLET.match(raw))
+        line = clean_line(BULLET.sub("", raw))
+        if not line:
+            continue
+        # PDF text wraps mid-sentence: a line continuing in lower case, or after
+        # a line ending in a comma, belongs to the one before
+        if facts and previous_open and not is_bullet and (line[0].islower() or line[0] in "(&" or previous_comma):
+            facts[-1] = facts[-1] + (", " if previous_comma and raw_previous.endswith(",") else " ") + line
+        else:
+            facts.append(line)
+        previous_open = not line.endswith((".", "!", "?", ":"))
+        raw_previous = raw.rstrip()
+        previous_comma = raw_previous.endswith((",", "&"))
+
+    split = []
+    for fact in facts:
+        split.extend(part.strip() for part in SENTENCE_END.split(fact))
+
+    seen = set()
+    unique = []
+    for fact in split:
+        if _is_noise(fact):
+            continue
+        key = re.sub(r"[^a-z0-9]+", " ", fact.lower()).strip()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(fact)
+    return unique
+
+
+def make_digest(text, fact_max_chars=DIGEST_FACT_MAX_CHARS, max_chars=DIGEST_MAX_CHARS):
+    """
+    Bullet list digest of a section, at most max_chars long.
+
+    :param text: the section text (markdown)
+    :return: "- fact\n- fact ..." or "" when nothing is left
+    """
+    lines = []
+    size = 0
+    for fact in extract_facts(text):
+        line = "- " + _cap(fact, fact_max_chars)
+        if size + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def add_digests(chunks):
+    """Sets metadata["digest"] on the chunks whose digest is shorter than their text."""
+    for chunk in chunks:
+        digest = make_digest(chunk.page_content)
+        if digest and len(digest) < len(chunk.page_content):
+            chunk.metadata["digest"] = digest
+    return chunks
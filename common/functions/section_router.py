@@ -0,0 +1,251 @@
+import os
+import sys
+import re
+import json
+import logging
+import threading
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SECTION_ROUTER_ENABLED, SECTION_ROUTER_USE_EMBEDDINGS, SECTION_ROUTER_MIN_CONFIDENCE
+from functions.make_section import CV_HEADING_PATTERNS
+from functions.embedding_cache import cosine_similarity
+
+logger = logging.getLogger('rag_logger')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LABELLED_EXAMPLES_FILE = os.path.join(PROJECT_ROOT, "test_results.json")
+
+# Same descriptions the LLM router gets in get_section_using_llm
+SECTION_DESCRIPTIONS = {
+    "skills": "programming languages, tools, technologies, frameworks, can develop, knows, android, web, java, python, flutter, react, node",
+    "experience": "worked at, employed, job history, company, role, years, intern, employer, worked on",
+    "education": "education history, degree, college, university, school, studied, graduated, passed out, fresher, btech, mca",
+    "projects": "built, developed, implemented, worked on a product, app, application, created",
+    "certifications": "certifications obtained, certified, course, certificate, license",
+    "interests": "sports, hobbies, extracurricular activities, interested, football, cricket, music, play, games",
+    "languages": "languages known, speak, english, hindi, malayalam, fluent",
+    "general": "general information like name, email, phone, place, location, address, contact, personal information",
+    "summary": "summary, profile, about, overview, tell me about, who is",
+    "achievements": "achievements, accomplishments, awards, honors, won, prize",
+}
+
+# "summary" is an overview from all sections (as the LLM router is told), and
+# many CVs have no summary chunk of their own to scope retrieval to
+SUMMARY_SECTIONS = [
+    "summary", "skills", "experience", "education", "projects",
+    "certifications", "interests", "languages", "general"
+]
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "who", "what", "which", "where", "when",
+    "how", "can", "could", "does", "do", "did", "has", "have", "any", "of", "in", "on", "to",
+    "for", "with", "and", "or", "at", "me", "about", "candidate", "candidates", "someone", "anyone", "ability",
+    "their", "them", "they", "he", "she", "his", "her", "there", "that", "this", "be"
+}
+
+CONFIDENCE_LEVELS = {"low": 0, "medium": 1, "high": 2}
+
+# Weights of the keyword profile sources
+HEADING_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 1.0
+EXAMPLE_WEIGHT = 0.5
+
+_stats = {"local": 0, "escalated": 0}
+_stats_lock = threading.Lock()
+
+
+def _stem(word):
+    """Very small stemmer so 'skills'/'skill' and 'interested'/'interest' meet."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    return [_stem(w) for w in re.findall(r"[a-z0-9+#]+", (text or "").lower()) if w not in STOPWORDS]
+
+
+def _load_examples():
+    """Labelled (question, sections) pairs from test_results.json."""
+    try:
+        with open(LABELLED_EXAMPLES_FILE, "r", encoding="utf-8") as f:
+            return [
+                (item["question"], item["section"]["sections"])
+                for item in json.load(f)
+                if item.get("section") and item["section"].get("sections")
+            ]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Section router examples not loaded: {e}")
+        return []
+
+
+def build_keyword_profiles(examples=None):
+    """
+    Builds {section: {token: weight}} from CV_HEADING_PATTERNS, the section
+    descriptions and the labelled example questions.
+    """
+    if examples is None:
+        examples = _load_examples()
+    sections = set(CV_HEADING_PATTERNS) | set(SECTION_DESCRIPTIONS)
+    profiles = {section: {} for section in sections}
+
+    def add(section, text, weight):
+        profile = profiles.setdefault(section, {})
+        for token in set(tokenize(text)):
+            profile[token] = max(profile.get(token, 0), weight)
+
+    for section, variants in CV_HEADING_PATTERNS.items():
+        add(section, " ".join(variants + [section]), HEADING_WEIGHT)
+    for section, description in SECTION_DESCRIPTIONS.items():
+        add(section, description, DESCRIPTION_WEIGHT)
+    # Example questions only contribute words the headings/descriptions don't
+    # already assign, otherwise "android ... sports" would leak sports into skills.
+    known = set().union(*profiles.values())
+    for question, labelled in examples:
+        novel = " ".join(t for t in tokenize(question) if t not in known)
+        for section in labelled:
+            add(section, novel, EXAMPLE_WEIGHT)
+    return profiles
+
+
+def _profile_text(section, examples):
+    """Text embedded as the prototype of a section."""
+    lines = [f"{section}: {SECTION_DESCRIPTIONS.get(section, '')}"]
+    lines.append(", ".join(CV_HEADING_PATTERNS.get(section, [])))
+    lines.extend(question for question, labelled in examples if section in labelled)
+    return "\n".join(lines)
+
+
+class SectionRouter:
+    """
+    Scores a question against per-section keyword profiles and, when an
+    embedding function is available, per-section prototype embeddings.
+    """
+
+    def __init__(self, embed_fn=None, examples=None):
+        self.examples = _load_examples() if examples is None else examples
+        self.profiles = build_keyword_profiles(self.examples)
+        self.embed_fn = embed_fn
+        self._prototypes = None
+        self._lock = threading.Lock()
+
+    def _get_prototypes(self):
+        if self.embed_fn is None:
+            return None
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    try:
+                        self._prototypes = {
+                            section: self.embed_fn(_profile_text(section, self.examples))
+                            for section in self.profiles
+                        }
+                    except Exception as e:
+                        logger.warning(f"Section prototypes unavailable, keyword routing only: {e}")
+                        self.embed_fn = None
+                        return None
+        return self._prototypes
+
+    def keyword_scores(self, question):
+        tokens = tokenize(question)
+        return {
+            section: sum(profile.get(token, 0) for token in tokens)
+            for section, profile in self.profiles.items()
+        }
+
+    def embedding_scores(self, question):
+        prototypes = self._get_prototypes()
+        if not prototypes:
+            return {}
+        try:
+            query_embedding = self.embed_fn(question)
+        except Exception as e:
+            logger.warning(f"Section router could not embed question: {e}")
+            return {}
+        return {section: cosine_similarity(query_embedding, vector) for section, vector in prototypes.items()}
+
+    def route(self, question):
+        """
+        Returns {"sections", "confidence", "reason"} like get_section_using_llm.
+        """
+        keyword = self.keyword_scores(question)
+        embedding = self.embedding_scores(question)
+        best_keyword = max(keyword.values()) if keyword else 0
+        ranked_embedding = sorted(embedding, key=lambda s: (-embedding[s], s))
+
+        if best_keyword >= 1:
+            cutoff = max(best_keyword / 2, 1)
+            sections = sorted(
+                (s for s, score in keyword.items() if score >= cutoff),
+                key=lambda s: (-keyword[s], s)
+            )
+            agrees = bool(ranked_embedding) and ranked_embedding[0] in sections
+            confidence = "high" if best_keyword >= 2 or agrees else "medium"
+            reason = f"keyword match {', '.join(f'{s}={keyword[s]:.1f}' for s in sections)}"
+        elif len(ranked_embedding) >= 2:
+            top, second = ranked_embedding[0], ranked_embedding[1]
+            margin = embedding[top] - embedding[second]
+            sections = [top]
+            confidence = "medium" if margin > 0.03 else "low"
+            reason = f"closest section prototype {top} ({embedding[top]:.3f}, margin {margin:.3f})"
+        else:
+            sections = []
+            confidence = "low"
+            reason = "no keyword matched"
+
+        if "summary" in sections:
+            sections = SUMMARY_SECTIONS + [s for s in sections if s not in SUMMARY_SECTIONS]
+
+        return {
+            "sections": sections,
+            "confidence": confidence,
+            "reason": reason,
+            "routed_by": "local"
+        }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def _pooled_embed(text):
+    from functions.retriever_pool import get_vector_store
+    return get_vector_store().embeddings.embed_query(text)
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = SectionRouter(embed_fn=_pooled_embed if SECTION_ROUTER_USE_EMBEDDINGS else None)
+    return _router
+
+
+def get_stats():
+    """Returns how often routing was answered locally vs escalated to the LLM."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def route_sections(question):
+    """
+    Routes a question locally. Returns None when the router is disabled or
+    not confident enough, so the caller can escalate to the LLM.
+    """
+    if not SECTION_ROUTER_ENABLED:
+        return None
+    result = get_router().route(question)
+    confident = (
+        result["sections"]
+        and CONFIDENCE_LEVELS[result["confidence"]] >= CONFIDENCE_LEVELS[SECTION_ROUTER_MIN_CONFIDENCE]
+    )
+    with _stats_lock:
+        _stats["local" if confident else "escalated"] += 1
+    if not confident:
+        logger.info(f"Local section routing not confident ({result['reason']}), asking the LLM")
+        return None
+    logger.info(f"Routed sections locally: {result['sections']} ({result['confidence']}, {result['reason']})")
+    return result
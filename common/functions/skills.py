@@ -0,0 +1,119 @@
+import os
+import sys
+import re
+import time
+import threading
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SKILL_VOCABULARY_TTL
+
+# Canonical skill names and the spellings CVs and questions use for them.
+# normalize_skill maps every alias onto the canonical name, so "ReactJS",
+# "react.js" and "React" all end up as "react" in user_skills.
+SKILL_ALIASES = {
+    "javascript": ["js", "java script", "ecmascript", "es6"],
+    "typescript": ["ts"],
+    "python": ["python3", "python 3", "py"],
+    "java": ["core java", "java8", "java 8"],
+    "c++": ["cpp", "c plus plus"],
+    "c#": ["csharp", "c sharp"],
+    "golang": ["go lang"],
+    "kotlin": [],
+    "swift": [],
+    "dart": [],
+    "php": [],
+    "android": ["android development", "android app development", "android sdk"],
+    "ios": ["ios development"],
+    "flutter": [],
+    "react": ["reactjs", "react.js", "react js"],
+    "react native": ["react-native", "reactnative"],
+    "angular": ["angularjs", "angular.js", "angular js"],
+    "vue": ["vuejs", "vue.js", "vue js"],
+    "next.js": ["nextjs", "next js"],
+    "node.js": ["node", "nodejs", "node js"],
+    "express": ["expressjs", "express.js"],
+    "django": [],
+    "flask": [],
+    "spring boot": ["springboot", "spring-boot"],
+    ".net": ["dotnet", "dot net", "asp.net"],
+    "html": ["html5"],
+    "css": ["css3"],
+    "sql": [],
+    "mysql": [],
+    "postgresql": ["postgres", "psql"],
+    "mongodb": ["mongo"],
+    "firebase": [],
+    "aws": ["amazon web services"],
+    "gcp": ["google cloud", "google cloud platform"],
+    "azure": ["microsoft azure"],
+    "docker": [],
+    "kubernetes": ["k8s"],
+    "git": [],
+    "rest api": ["rest", "restful api", "restful apis", "rest apis"],
+    "machine learning": ["ml"],
+    "deep learning": ["dl"],
+    "tensorflow": [],
+    "pytorch": [],
+    "figma": [],
+}
+
+ALIAS_TO_SKILL = {
+    alias: skill
+    for skill, aliases in SKILL_ALIASES.items()
+    for alias in aliases + [skill]
+}
+
+# Too ambiguous to spot in free text, still stored when a CV lists them
+AMBIGUOUS_SKILLS = {"go", "r", "c", "d", "it", "ts", "py", "dl", "rest", "express"}
+
+_vocabulary = {"loaded_at": 0, "regex": None}
+_vocabulary_lock = threading.Lock()
+
+
+def normalize_skill(skill):
+    """Lower-cases, trims and maps a skill onto its canonical name."""
+    text = re.sub(r"\s+", " ", str(skill or "")).strip().lower()
+    text = text.lstrip(" ,;:-").rstrip(" .,;:-")
+    return ALIAS_TO_SKILL.get(text, text)
+
+
+def _build_regex(terms):
+    terms = sorted((t for t in terms if len(t) >= 2 and t not in AMBIGUOUS_SKILLS), key=len, reverse=True)
+    if not terms:
+        return None
+    # \b doesn't work around "c++" / ".net", so look at the neighbouring characters instead
+    return re.compile(r"(?<![\w.+#])(?:" + "|".join(re.escape(t) for t in terms) + r")(?![\w+#])")
+
+
+def _get_vocabulary_regex(load_skills):
+    now = time.time()
+    if _vocabulary["regex"] is not None and now - _vocabulary["loaded_at"] < SKILL_VOCABULARY_TTL:
+        return _vocabulary["regex"]
+    with _vocabulary_lock:
+        if _vocabulary["regex"] is None or now - _vocabulary["loaded_at"] >= SKILL_VOCABULARY_TTL:
+            try:
+                known = set(load_skills())
+            except Exception:
+                known = set()
+            _vocabulary["regex"] = _build_regex(known | set(ALIAS_TO_SKILL))
+            _vocabulary["loaded_at"] = now
+        return _vocabulary["regex"]
+
+
+def find_skills(question, load_skills=list):
+    """
+    Returns the canonical skills mentioned in a question, in order.
+
+    :param question: the question text
+    :param load_skills: callable returning the skill_norm values known to the database
+    """
+    regex = _get_vocabulary_regex(load_skills)
+    if regex is None:
+        return []
+    found = []
+    for match in regex.finditer(question.lower()):
+        skill = normalize_skill(match.group(0))
+        if skill not in found:
+            found.append(skill)
+    return found
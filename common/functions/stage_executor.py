@@ -0,0 +1,52 @@
+import os
+import sys
+import re
+import atexit
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure 'common' directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STAGE_EXECUTOR_WORKERS
+
+# Shared pool for independent, network bound pipeline stages (LLM calls, lookups)
+_executor = ThreadPoolExecutor(max_workers=STAGE_EXECUTOR_WORKERS, thread_name_prefix="rag-stage")
+
+
+def submit_stage(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) on the stage pool and returns its Future.
+    The caller's context variables are carried over to the worker thread.
+    """
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def run_parallel(stages):
+    """
+    Runs independent stages concurrently and waits for all of them.
+
+    :param stages: dict of name -> (fn, args tuple)
+    :return: dict of name -> result
+    """
+    futures = {name: submit_stage(fn, *args) for name, (fn, args) in stages.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9@._+-]+", (text or "").lower()))
+
+
+def question_similarity(a, b):
+    """Word overlap (Jaccard) of two questions, 1.0 means the same words."""
+    words_a, words_b = _words(a), _words(b)
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def shutdown(wait=True):
+    _executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown, False)
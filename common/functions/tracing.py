@@ -0,0 +1,134 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Per-request tracing. The server opens a trace around a question with
+# start_trace; the pipeline wraps its stages in span(...). Spans record their
+# start (relative to the trace), duration and a few attributes (sizes, cache
+# hits). The trace lives in a context variable, so stages running on the stage
+# pool (submit_stage copies the context) or in asyncio tasks land in the right
+# trace. Without an open trace span() costs next to nothing.
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+_current_span = contextvars.ContextVar("rag_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start_ms", "duration_ms", "attributes")
+
+    def __init__(self, name, start_ms, attributes):
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Adds attributes, e.g. output sizes once the stage is done."""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "start_ms": self.start_ms,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+
+    def __init__(self, question=None):
+        self.question = question
+        self.spans = []
+        self.total_ms = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self):
+        return round((time.perf_counter() - self._started) * 1000, 3)
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self):
+        if self.total_ms is None:
+            self.total_ms = self.elapsed_ms()
+
+    def to_dict(self):
+        """Spans ordered by start time, plus the total request time."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ms)
+        return {
+            "total_ms": self.total_ms if self.total_ms is not None else self.elapsed_ms(),
+            "spans": [span.to_dict() for span in spans]
+        }
+
+
+def current_trace():
+    """The trace of the running request, or None."""
+    return _current_trace.get()
+
+
+def current_span():
+    """The innermost open span of the running request, or None."""
+    return _current_span.get()
+
+
+@contextmanager
+def start_trace(question=None):
+    """Opens a trace for one request. Yields the Trace, finished on exit."""
+    trace = Trace(question)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _current_trace.reset(token)
+
+
+@contextmanager
+def use_trace(trace):
+    """Makes an existing trace the current one, e.g. for one question of a batch."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a pipeline stage in the current trace. Yields the span so the stage
+    can add attributes (span.set(docs=3)); exceptions are recorded and re-raised.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+    started = time.perf_counter()
+    current = Span(name, round((started - trace._started) * 1000, 3), attributes)
+    # set/restore rather than a token: spans in generators may close in another context
+    parent = _current_span.get()
+    _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        _current_span.set(parent)
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        trace.add(current)
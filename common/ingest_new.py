@@ -2,10 +2,14 @@ from config import MODEL_NAME,PARSER,DB_NAME,DB_PATH,EMBEDDING_MODEL_NAME, COLLE
 import os
 import json
 import functions.database_utils as db_utils
+import functions.answer_cache as answer_cache
+import functions.lexical_index as lexical_index
+from functions.section_digest import add_digests
 from langchain_core.documents import Document
 from functions.ingestion_utils import (
     create_and_persist_db,
-    reset_vector_db
+    reset_vector_db,
+    save_chunks_for_bm25
 )
 
 
@@ -16,10 +20,15 @@ def get_connection():
 def create_tables():
     with get_connection() as conn:
         db_utils.create_resume_tables(conn)
+        answer_cache.create_answer_cache_table(conn)
 
 
 def insert_data():
     path=os.path.join("processed/json/"+PARSER)
+    all_chunks=[]
+    all_chunk_ids=[]
+    changed_emails=[]
+    changed_sections=set()
     for filename in os.listdir(path):
         if filename.endswith(".json"):
             with open(os.path.join(path, filename), "r", encoding="utf-8") as f:
@@ -42,8 +51,12 @@ def insert_data():
                         
                         chunk_ids.append(id)
                         chunks.append(chunk)
+                # compact digest of every section, used for the prompt instead of the full text
+                add_digests(chunks)
                 with get_connection() as conn:
                     db_utils.insert_resume_data(conn,data["structured_data"])
+                changed_emails.append(data["structured_data"]["general"]["email"])
+                changed_sections.update(chunk.metadata["section"] for chunk in chunks)
                 create_and_persist_db(
                     chunks=chunks,
                     db_path=DB_PATH,
@@ -51,6 +64,20 @@ def insert_data():
                     model_name=EMBEDDING_MODEL_NAME,
                     ids=chunk_ids
                 )
+                lexical_index.index_chunks(chunks,chunk_ids,DB_PATH)
+                all_chunks.extend(chunks)
+                all_chunk_ids.extend(chunk_ids)
+
+    # one rewrite of the chunk store for the whole run
+    if all_chunks:
+        save_chunks_for_bm25(all_chunks,DB_PATH,all_chunk_ids,append=True)
+
+    # cached answers built from these candidates or sections are stale now; only
+    # once every index has the new chunks, or a question asked in between would
+    # cache an answer from the old ones again
+    if changed_emails:
+        with get_connection() as conn:
+            answer_cache.invalidate_answers(conn,emails=changed_emails,sections=sorted(changed_sections))
 
     # with get_connection() as conn:
     #     db_utils.insert_resume(conn,resume)
@@ -59,6 +86,9 @@ def insert_data():
 def main():
     reset_vector_db(DB_PATH)
     create_tables()
+    # the whole candidate set is rebuilt, nothing cached is valid anymore
+    with get_connection() as conn:
+        answer_cache.clear_answer_cache(conn)
     insert_data()
 
 
@@ -1,10 +1,10 @@
 import os
 import json
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
 from functions.make_section import extract_sections
+from functions.llm_cache import get_llm_cache, make_key
+from functions.llm_backends import get_llm_backend
 import re
-from common.config import MODEL_NAME,PARSER
+from common.config import PARSER
 should_owerrite=False
 
 GENERAL_TEMPLATE = """Role: You are an expert Resume/CV Parser.
@@ -56,18 +56,38 @@ prompts_template = {
     "skills": SKILLS_TEMPLATE,
     "experience": EXPERIENCE_TEMPLATE
 }
+def _is_json(content):
+    try:
+        json.loads(content)
+        return True
+    except (TypeError, json.JSONDecodeError):
+        return False
+
+
+def invoke_json_template(template, cv_text, strip_fences=False):
+    """
+    Runs a JSON prompt template on cv_text with the LLM backend, through the
+    LLM cache: an unchanged CV asked the same thing again is answered from
+    disk. Only responses that parse as JSON are kept.
+    """
+    backend = get_llm_backend()
+
+    def call():
+        content = backend.complete(template.format(cv_text=cv_text), json_mode=True).strip()
+        if strip_fences:
+            if content.startswith("```json"):
+                content = content[7:]
+            if content.endswith("```"):
+                content = content[:-3]
+            content = content.strip()
+        return content
+
+    key = make_key(f"{backend.name}-json", backend.model, template, {"cv_text": cv_text}, {"format": "json", "strip_fences": strip_fences})
+    return get_llm_cache().cached(key, call, store_if=_is_json, model=backend.model)
+
+
 def parser_with_llm_full(data,cv_text):
-    prompt = ChatPromptTemplate.from_template(FULL_TEMPLATE)
-    model = ChatOllama(model=MODEL_NAME, format="json")
-    chain = prompt | model
-    response = chain.invoke({"cv_text": cv_text})
-    content = response.content
-    cleaned_content = content.strip()
-    if cleaned_content.startswith("```json"):
-        cleaned_content = cleaned_content[7:]
-    if cleaned_content.endswith("```"):
-        cleaned_content = cleaned_content[:-3]
-    cleaned_content = cleaned_content.strip()
+    cleaned_content = invoke_json_template(FULL_TEMPLATE, cv_text, strip_fences=True)
 
     try:
         json_data = json.loads(cleaned_content)
@@ -90,13 +110,8 @@ def parser_with_llm(data,cv_data):
     structured_data={}
     for key, value in prompts_template.items():
         print("calling llm for key ",key)
-        prompt = ChatPromptTemplate.from_template(value)
-        model = ChatOllama(model=MODEL_NAME, format="json")
-        chain = prompt | model
         if data[key] and  len(data[key])>5:
-            response = chain.invoke({"cv_text": data[key]})
-            content = response.content
-            cleaned_content = content.strip()
+            cleaned_content = invoke_json_template(value, data[key])
             try:
                 json_data = json.loads(cleaned_content)
                 #  check the key json_data[key] 
@@ -1,19 +1,29 @@
 from functions.query_utils import (
-    load_bm25_chunks,
     get_bm25_results,
+    get_skill_results,
     get_vector_results,
-    merge_and_deduplicate,
+    fuse_results,
     rerank_documents,
     generate_answer,
+    build_context,
+    stream_answer,
     get_section_using_llm,
-    polish_question
+    get_section,
+    polish_question,
+    embed_question
 )
 from functions.make_section import CV_HEADING_PATTERNS
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama
-from config import MODEL_NAME,DB_NAME,PARSER,EMBEDDING_MODEL_NAME
+from functions.llm_backends import get_llm_backend
+from config import (
+    DB_NAME,PARSER,EMBEDDING_MODEL_NAME,EMBEDDING_BACKEND,ANSWER_CACHE_ENABLED,
+    SPECULATIVE_SECTION_ROUTING,SPECULATIVE_SECTION_MIN_SIMILARITY
+)
 import json
 import functions.database_utils as db_utils
+import functions.answer_cache as answer_cache
+from functions.stage_executor import submit_stage, question_similarity
+from functions.tracing import span
 import logging
 
 # Configure logger
@@ -23,27 +33,15 @@ def get_connection():
     return db_utils.get_db_connection(DB_NAME)
 
 
-def query_rag(query_text):
-    """Main RAG pipeline."""
-    logger.info(f"Starting RAG query for: {query_text}")
-    logger.info(f"LLM Model: {MODEL_NAME}")
-    logger.info(f"Used PARSER: {PARSER}")
-    logger.info(f"Embedding Model: {EMBEDDING_MODEL_NAME}")
-    # 1. BM25 Retrieval
-    # chunks = load_bm25_chunks()
-    # if chunks is None: return
-    # bm25_docs = get_bm25_results(chunks, query_text)
-    # bm25_docs = []
-    
-   
-    question_dict=polish_question(query_text)
-    logger.info(f"Polished question: {question_dict}")
-    names=question_dict["names"]
-    emails=question_dict["emails"]
-    polished_question=question_dict["polished_question"]
+def get_read_connection():
+    return db_utils.get_read_connection(DB_NAME)
+
+
+def lookup_candidates(names,emails):
+    """Resolves the names/emails in a question to candidates in SQLite."""
     db_results=[]
     if(len(emails)>0):
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             sql_data=db_utils.get_data_by_email(conn,emails)
             if sql_data:
                 db_results.append({
@@ -51,60 +49,237 @@ def query_rag(query_text):
                     "email":sql_data[0]["general"]["email"],
                 })
     elif(len(names)>0):
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             sql_data=db_utils.get_data_by_name(conn,names)
             for data in sql_data:
                 db_results.append({
                     "name":data["general"]["name"],
                     "email":data["general"]["email"],
                 })
+    return db_results
+
+
+def _cancel(future):
+    """Drops a speculative stage that hasn't started yet; a running one finishes unused."""
+    if future is not None:
+        future.cancel()
+
+
+def get_chunk_ids(db_results,section_names):
+    """Chunk ids (email_section) of the requested sections of known candidates."""
+    chunk_ids=[]
+    for data in db_results:
+        for section in section_names:
+            chunk_ids.append(data["email"]+"_"+section)
+    return chunk_ids
+
+
+def retrieve(query_text,use_cache=True):
+    """
+    Runs every stage before answer generation. use_cache=False skips the answer cache.
+    Returns a dict with "answer"/"context" when the pipeline can stop early
+    (not related, cached, nothing found), otherwise the retrieval state:
+    polished_question, names, emails, section_names, chunk_ids and docs.
+    """
+    logger.info(f"Starting RAG query for: {query_text}")
+    logger.info(f"LLM Model: {get_llm_backend().model} ({get_llm_backend().name})")
+    logger.info(f"Used PARSER: {PARSER}")
+    logger.info(f"Embedding Model: {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})")
+    # Section routing only needs the question text, so start it on the raw
+    # question while the LLM polishes it and reconcile once we have both.
+    # Questions the pre-classifier answers have no LLM call to overlap with.
+    section_future=None
+
+    def start_section_routing():
+        nonlocal section_future
+        section_future=submit_stage(get_section,query_text)
+
+    question_dict=polish_question(query_text,start_section_routing if SPECULATIVE_SECTION_ROUTING else None)
+    logger.info(f"Polished question: {question_dict}")
+    names=question_dict["names"]
+    emails=question_dict["emails"]
+    polished_question=question_dict["polished_question"]
+    with span("sql_lookup",names=len(names),emails=len(emails)) as stage:
+        db_results=lookup_candidates(names,emails)
+        stage.set(candidates=len(db_results))
     
     if polished_question.lower()=="not related":
+        _cancel(section_future)
         logger.info("Question not related to context.")
-        return "I can only answer questions related to the resume/context.","no context"
+        return {"answer":"I can only answer questions related to the resume/context.","context":"no context"}
+
+    if ANSWER_CACHE_ENABLED and use_cache:
+        with span("answer_cache") as stage:
+            with get_read_connection() as conn:
+                cached=answer_cache.get_cached_answer(conn,polished_question,names+emails,embed_question)
+            stage.set(hit=cached["match"] if cached else False)
+        if cached:
+            _cancel(section_future)
+            logger.info(f"Answer cache hit ({cached['match']}): {cached['question']}")
+            return {"answer":cached["answer"],"context":cached["context"]}
 
     logger.info(f"Polished question: {polished_question}")
-    section=get_section_using_llm(polished_question)
-    # 2. Vector Retrieval
+    section=None
+    if section_future is not None:
+        similarity=question_similarity(query_text,polished_question)
+        if similarity>=SPECULATIVE_SECTION_MIN_SIMILARITY:
+            try:
+                section=section_future.result()
+            except Exception as e:
+                logger.warning(f"Speculative section routing failed: {e}")
+        else:
+            _cancel(section_future)
+            logger.info(f"Polished question changed materially ({similarity:.2f}), re-routing sections")
+    if not section:
+        section=get_section(polished_question)
     section_names=section["sections"]
     logger.info(f"Identified sections: {section_names}")
 
-    chunk_ids=[]
-    if(len(db_results)>0):
-        for data in db_results:
-            for section in section_names:
-                chunk_ids.append(data["email"]+"_"+section)
+    chunk_ids=get_chunk_ids(db_results,section_names)
     
+    # 1. BM25 Retrieval
+    with span("bm25") as stage:
+        bm25_docs = get_bm25_results(polished_question,section_names,chunk_ids)
+        stage.set(docs=len(bm25_docs))
+    logger.info(f"BM25 docs id: {[doc.id for doc in bm25_docs]}")
 
-    vector_docs = get_vector_results(polished_question,section_names,chunk_ids)
+    with span("skill_match") as stage:
+        skill_docs = get_skill_results(polished_question,chunk_ids)
+        stage.set(docs=len(skill_docs))
+    if skill_docs:
+        logger.info(f"Skill match docs id: {[doc.id for doc in skill_docs]}")
+
+    # 2. Vector Retrieval
+    with span("vector_search",chunk_ids=len(chunk_ids)) as stage:
+        vector_docs = get_vector_results(polished_question,section_names,chunk_ids)
+        stage.set(docs=len(vector_docs))
     vector_ids=[]
     for doc in vector_docs:
         vector_ids.append(doc.id)
     logger.info(f"Vector docs id: {vector_ids}")
 
-    # 3. Merge & Deduplicate
-    # merged_docs = merge_and_deduplicate(bm25_docs, vector_docs)
-    merged_docs = vector_docs
-    
-    if not merged_docs:
+    if not bm25_docs and not vector_docs and not skill_docs:
         logger.info("No relevant documents found.")
-        return "No relevant documents found.","no context"
+        return {"answer":"No relevant documents found.","context":"no context"}
 
-    # 4. Rerank
-    # top_docs = rerank_documents(query_text, merged_docs)
-    top_docs = merged_docs
+    # 3. Fuse & 4. Rerank, chunks picked by candidate and section are all kept
+    if len(chunk_ids)>0:
+        top_docs = vector_docs
+    else:
+        with span("fusion") as stage:
+            merged_docs = fuse_results({"bm25":bm25_docs,"vector":vector_docs,"skills":skill_docs})
+            stage.set(docs=len(merged_docs))
+        logger.info(f"Fused docs id: {[doc.id for doc in merged_docs]}")
+        with span("rerank",candidates=len(merged_docs)) as stage:
+            top_docs = rerank_documents(polished_question, merged_docs)
+            stage.set(docs=len(top_docs))
+        logger.info(f"Reranked docs id: {[doc.id for doc in top_docs]}")
     
+    return {
+        "polished_question":polished_question,
+        "names":names,
+        "emails":emails,
+        "section_names":section_names,
+        "chunk_ids":chunk_ids,
+        "docs":top_docs
+    }
+
+
+def format_sources(docs):
+    result = "\n\nSources:\n"
+    for doc in docs:
+        result += f"- {doc.metadata.get('source', 'Unknown')}\n"
+    return result
+
+
+def cache_answer(state, result, context_text):
+    """Stores a generated answer in the answer cache."""
+    if not ANSWER_CACHE_ENABLED:
+        return
+    with span("answer_cache_store"), get_connection() as conn:
+        answer_cache.save_cached_answer(
+            conn,
+            state["polished_question"],
+            result,
+            context_text,
+            emails=[doc.metadata.get("email") for doc in state["docs"] if doc.metadata.get("email")],
+            sections=state["section_names"],
+            entities=state["names"]+state["emails"],
+            scoped=len(state["chunk_ids"])>0,
+            embedding=embed_question(state["polished_question"])
+        )
+
+
+def query_rag(query_text,full_text=False):
+    """
+    Main RAG pipeline.
+    The prompt uses the section digests; full_text=True sends the full sections
+    instead and skips the cached answers, which were built from digests.
+    """
+    state=retrieve(query_text,use_cache=not full_text)
+    if "answer" in state:
+        return state["answer"],state["context"]
+
     # 5. Generate Answer
-    answer,context_text = generate_answer(query_text, top_docs,section_names)
+    answer,context_text = generate_answer(query_text, state["docs"],state["section_names"],full_text)
     
     logger.info("Answer generated successfully.")
     
-    result = answer + "\n\nSources:\n"
-    for doc in top_docs:
-        result += f"- {doc.metadata.get('source', 'Unknown')}\n"
+    result = answer + format_sources(state["docs"])
+    # a failed LLM call answers "", don't keep that for ANSWER_CACHE_TTL
+    if answer:
+        cache_answer(state,result,context_text)
     
     return result, context_text
 
+
+def query_rag_stream(query_text,full_text=False):
+    """
+    Streaming variant of query_rag (same full_text option). Yields events:
+    {"type": "candidates", "data": [...]} once retrieval is done,
+    {"type": "token", "data": "..."} while the answer is generated,
+    {"type": "sources", "data": [...]} and finally
+    {"type": "done", "answer": ..., "context": ...}.
+    """
+    state=retrieve(query_text,use_cache=not full_text)
+    if "answer" in state:
+        yield {"type":"token","data":state["answer"]}
+        yield {"type":"done","answer":state["answer"],"context":state["context"]}
+        return
+
+    docs=state["docs"]
+    yield {
+        "type":"candidates",
+        "data":[
+            {
+                "id":doc.id,
+                "email":doc.metadata.get("email"),
+                "section":doc.metadata.get("section"),
+                "source":doc.metadata.get("source")
+            }
+            for doc in docs
+        ]
+    }
+
+    with span("context_build",docs=len(docs)) as stage:
+        context_text=build_context(docs,state["section_names"],full_text=full_text)
+        stage.set(context_chars=len(context_text))
+    answer=""
+    # includes the time the consumer takes to send each token on
+    backend=get_llm_backend()
+    with span("llm_generate",backend=backend.name,model=backend.model,context_chars=len(context_text),streamed=True) as stage:
+        for token in stream_answer(query_text,context_text):
+            answer+=token
+            yield {"type":"token","data":token}
+        stage.set(answer_chars=len(answer))
+    logger.info("Answer streamed successfully.")
+
+    yield {"type":"sources","data":[doc.metadata.get("source","Unknown") for doc in docs]}
+    result=answer+format_sources(docs)
+    if answer:
+        cache_answer(state,result,context_text)
+    yield {"type":"done","answer":result,"context":context_text}
+
 def main():
     # Setup basic logging for CLI usage
     logging.basicConfig(level=logging.INFO)
@@ -3,7 +3,6 @@ import os
 import logging
 from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
-import io
 # Ensure we can import from common
 # Assuming server directory is at project_root/server
 # We need to add project_root to sys.path
@@ -14,47 +13,57 @@ sys.path.append(project_root)
 sys.path.append(common_dir)
 
 import functions.database_utils as db_utils
-from config import DB_NAME
+import functions.retriever_pool as retriever_pool
+import functions.reranker as reranker
+from functions.qa_log_writer import save_qa_log_async
+from functions.pipeline_stats import get_pipeline_stats
+from functions.tracing import start_trace
+import functions.log_stream as log_stream
+from functions.log_stream import log_session
+from config import DB_NAME, HISTORY_PAGE_SIZE
+import atexit
 
 try:
     # We use common.query if we want to be explicit, but since common is in path, 
     # query.py's internal imports work. 
     # However, to import query_rag, we can do it from common.query
-    from common.query import query_rag
+    from common.query import query_rag, query_rag_stream
+    from common.batch_query import query_rag_batch
 except ImportError as e:
     # Try importing directly if common is in path but project_root isn't the package root
     try:
-        from query import query_rag
+        from query import query_rag, query_rag_stream
+        from batch_query import query_rag_batch
     except ImportError as e2:
         print(f"Error importing common.query: {e}")
         print(f"Error importing query: {e2}")
         print("Make sure you are running from the correct directory or PYTHONPATH is set.")
         # Fallback to prevent immediate crash if just testing app framework
-        def query_rag(q): return f"Mock response for: {q}. Error importing query_rag: {e}"
+        def query_rag(q, full_text=False): return f"Mock response for: {q}. Error importing query_rag: {e}"
+        def query_rag_stream(q, full_text=False):
+            yield {'type': 'done', 'answer': f"Mock response for: {q}. Error importing query_rag: {e}", 'context': ''}
+        def query_rag_batch(qs):
+            return {'results': [{'question': q, 'answer': f"Mock response for: {q}. Error importing query_rag: {e}"} for q in qs], 'timings': {}}
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
 # Allow all origins for dev simplicity
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Custom WebSocket Logging Handler
-class WebSocketHandler(logging.Handler):
-    def emit(self, record):
-        try:
-            log_entry = self.format(record)
-            socketio.emit('log_message', {'data': log_entry})
-        except Exception:
-            pass # Handle errors if socket not ready
+def send_log_batch(room, payload):
+    """Sends a batch of log lines to one session (room is its sid), or to everyone when room is None."""
+    socketio.emit('log_batch', payload, to=room)
 
 # Configure Logger for RAG
-# We attach to the logger name 'rag_logger' which is used in common/query.py
+# We attach to the logger name 'rag_logger' which is used in common/query.py.
+# Records are routed to the session that asked the question and sent in batches,
+# see common/functions/log_stream.py
 rag_logger = logging.getLogger('rag_logger')
 rag_logger.setLevel(logging.INFO)
 
-ws_handler = WebSocketHandler()
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
-ws_handler.setFormatter(formatter)
-rag_logger.addHandler(ws_handler)
+log_stream.install(rag_logger, send_log_batch, formatter)
+atexit.register(log_stream.uninstall, rag_logger)
 
 # Also attach to root logger or app logger if we want more logs?
 # For now, just 'rag_logger' as requested: "add this log call in the query.py page"
@@ -70,39 +79,86 @@ def chat():
     if not question:
         return jsonify({'error': 'No question provided'}), 400
     
-    # We call query_rag. It logs to 'rag_logger', which emits to websocket.
-    # It returns the string result.
-    
-    # Capture logs
-    log_capture_string = io.StringIO()
-    ch = logging.StreamHandler(log_capture_string)
-    ch.setLevel(logging.INFO)
-    rag_logger.addHandler(ch)
-    
-    try:
-        answer, context_str = query_rag(question)
-        
-        # Save to DB
-        captured_logs = log_capture_string.getvalue()
+    # We call query_rag. It logs to 'rag_logger'; the lines of this request
+    # are collected in its log session. It returns the string result.
+    with log_session() as logs:
         try:
-            with db_utils.get_db_connection(DB_NAME) as conn:
-                db_utils.save_qa_log(conn, question, answer, captured_logs, context_str)
-        except Exception as db_e:
-            rag_logger.error(f"Error saving to DB: {db_e}")
+            with start_trace(question) as trace:
+                # full_text: answer from the full CV sections instead of their digests
+                answer, context_str = query_rag(question, full_text=bool(data.get('full_text')))
+            
+            # Save to DB, written in the background
+            save_qa_log_async(question, answer, logs.getvalue(), context_str, trace.to_dict())
 
-        return jsonify({'response': answer})
-    except Exception as e:
-        rag_logger.error(f"Error in query_rag: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        rag_logger.removeHandler(ch)
-        log_capture_string.close()
+            return jsonify({'response': answer})
+        except Exception as e:
+            rag_logger.error(f"Error in query_rag: {e}")
+            return jsonify({'error': str(e)}), 500
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answers a list of questions in one pass, see common/batch_query.py."""
+    data = request.json or {}
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        return jsonify({'error': 'Provide a non-empty list of questions'}), 400
+
+    with log_session():
+        try:
+            batch = query_rag_batch(questions)
+
+            # each question is saved with its own log lines and trace
+            for result in batch['results']:
+                if 'answer' in result:
+                    save_qa_log_async(result['question'], result['answer'], result['logs'], result.get('context'), result['trace'])
+
+            # the context and logs can be large and the client doesn't need them
+            for result in batch['results']:
+                result.pop('context', None)
+                result.pop('logs', None)
+                result.pop('trace', None)
+            return jsonify(batch)
+        except Exception as e:
+            rag_logger.error(f"Error in query_rag_batch: {e}")
+            return jsonify({'error': str(e)}), 500
+
+@socketio.on('chat_stream')
+def chat_stream(data):
+    """Streams retrieval results and answer tokens to the requesting client only."""
+    sid = request.sid
+    question = (data or {}).get('question')
+    if not question:
+        socketio.emit('chat_event', {'type': 'error', 'error': 'No question provided'}, to=sid)
+        return
+
+    # the pipeline's log lines go live to this client only
+    with log_session(sid) as logs:
+        try:
+            answer, context_str = None, None
+            with start_trace(question) as trace:
+                for event in query_rag_stream(question, full_text=bool(data.get('full_text'))):
+                    if event['type'] == 'done':
+                        answer, context_str = event['answer'], event['context']
+                        # the context can be large and the client doesn't need it
+                        event = {'type': 'done', 'answer': answer}
+                    socketio.emit('chat_event', event, to=sid)
+
+            save_qa_log_async(question, answer, logs.getvalue(), context_str, trace.to_dict())
+        except Exception as e:
+            rag_logger.error(f"Error in query_rag_stream: {e}")
+            socketio.emit('chat_event', {'type': 'error', 'error': str(e)}, to=sid)
 
 @app.route('/history', methods=['GET'])
 def get_history():
+    """One page of questions, newest first: ?before_id=<next_before_id>&limit=50&q=<search>"""
     try:
-        with db_utils.get_db_connection(DB_NAME) as conn:
-            history = db_utils.get_qa_history(conn)
+        with db_utils.get_read_connection(DB_NAME) as conn:
+            history = db_utils.get_qa_history(
+                conn,
+                before_id=request.args.get('before_id', type=int),
+                limit=request.args.get('limit', HISTORY_PAGE_SIZE, type=int),
+                search=request.args.get('q', '').strip() or None
+            )
         return jsonify(history)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -110,7 +166,7 @@ def get_history():
 @app.route('/history/<int:id>', methods=['GET'])
 def get_history_details(id):
     try:
-        with db_utils.get_db_connection(DB_NAME) as conn:
+        with db_utils.get_read_connection(DB_NAME) as conn:
             details = db_utils.get_qa_details(conn, id)
         if details:
             return jsonify(details)
@@ -119,11 +175,33 @@ def get_history_details(id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/history/<int:id>/trace', methods=['GET'])
+def get_history_trace(id):
+    """Stage timings recorded for a question, see common/functions/tracing.py."""
+    try:
+        with db_utils.get_read_connection(DB_NAME) as conn:
+            trace = db_utils.get_qa_trace(conn, id)
+        if trace:
+            return jsonify(trace)
+        else:
+            return jsonify({'error': 'Not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    return jsonify(get_pipeline_stats())
+
 if __name__ == '__main__':
     print("Starting Flask SocketIO Server...")
     # Initialize DB tables
     with db_utils.get_db_connection(DB_NAME) as conn:
         db_utils.create_qa_tables(conn)
+
+    # Open the shared vector store and load the reranker before the first /chat request
+    retriever_pool.warm_up()
+    reranker.warm_up()
+    atexit.register(retriever_pool.close_all)
         
     # Use allow_unsafe_werkzeug=True if needed for dev environment with socketio
     socketio.run(app, debug=True, port=5000, allow_unsafe_werkzeug=True, use_reloader=False)
@@ -0,0 +1,212 @@
+import sys
+import os
+import asyncio
+import logging
+import contextlib
+# ASGI entry point running the asyncio-native pipeline (common/async_query.py).
+# Run with:  uvicorn server.asgi:app --port 5000
+# Same routes and socket events as server/app.py, but every in-flight question
+# is a coroutine instead of a pinned thread.
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+common_dir = os.path.join(project_root, 'common')
+sys.path.append(project_root)
+sys.path.append(common_dir)
+
+import socketio
+from jinja2 import Environment, FileSystemLoader
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse
+from starlette.routing import Route, Mount
+from starlette.staticfiles import StaticFiles
+
+import functions.database_utils as db_utils
+import functions.retriever_pool as retriever_pool
+import functions.reranker as reranker
+from functions.qa_log_writer import save_qa_log_async, get_qa_log_writer
+from functions.pipeline_stats import get_pipeline_stats
+from functions.tracing import start_trace
+import functions.log_stream as log_stream
+from functions.log_stream import log_session
+from config import DB_NAME, HISTORY_PAGE_SIZE
+from async_query import aquery_rag, aquery_rag_stream
+from batch_query import query_rag_batch
+
+server_dir = os.path.dirname(os.path.abspath(__file__))
+templates = Environment(loader=FileSystemLoader(os.path.join(server_dir, 'templates')))
+# index.html uses Flask's url_for('static', filename=...)
+templates.globals['url_for'] = lambda endpoint, filename: f"/{endpoint}/{filename}"
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+rag_logger = logging.getLogger('rag_logger')
+rag_logger.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
+
+
+def log_batch_sender(loop):
+    """Sends log batches (from the flusher thread) through the event loop, room None broadcasts."""
+    def send(room, payload):
+        asyncio.run_coroutine_threadsafe(sio.emit('log_batch', payload, to=room), loop)
+    return send
+
+
+async def save_qa(question, answer, logs, context, trace=None):
+    # queued for the background writer; off the loop since a full queue may block
+    await asyncio.to_thread(save_qa_log_async, question, answer, logs, context, trace)
+
+
+async def index(request):
+    return HTMLResponse(templates.get_template('index.html').render())
+
+
+async def chat(request):
+    data = await request.json()
+    question = data.get('question')
+    if not question:
+        return JSONResponse({'error': 'No question provided'}, status_code=400)
+
+    with log_session() as logs:
+        try:
+            with start_trace(question) as trace:
+                # full_text: answer from the full CV sections instead of their digests
+                answer, context_str = await aquery_rag(question, full_text=bool(data.get('full_text')))
+            await save_qa(question, answer, logs.getvalue(), context_str, trace.to_dict())
+            return JSONResponse({'response': answer})
+        except Exception as e:
+            rag_logger.error(f"Error in aquery_rag: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def chat_batch(request):
+    data = await request.json()
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        return JSONResponse({'error': 'Provide a non-empty list of questions'}, status_code=400)
+
+    with log_session():
+        try:
+            # the batch pipeline fans out on the stage pool itself
+            batch = await asyncio.to_thread(query_rag_batch, questions)
+            # each question is saved with its own log lines and trace
+            for result in batch['results']:
+                if 'answer' in result:
+                    await save_qa(result['question'], result['answer'], result['logs'], result.get('context'), result['trace'])
+                result.pop('context', None)
+                result.pop('logs', None)
+                result.pop('trace', None)
+            return JSONResponse(batch)
+        except Exception as e:
+            rag_logger.error(f"Error in query_rag_batch: {e}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@sio.on('chat_stream')
+async def chat_stream(sid, data):
+    """Streams retrieval results and answer tokens to the requesting client only."""
+    question = (data or {}).get('question')
+    if not question:
+        await sio.emit('chat_event', {'type': 'error', 'error': 'No question provided'}, to=sid)
+        return
+
+    # the pipeline's log lines go live to this client only
+    with log_session(sid) as logs:
+        try:
+            answer, context_str = None, None
+            with start_trace(question) as trace:
+                async for event in aquery_rag_stream(question, full_text=bool(data.get('full_text'))):
+                    if event['type'] == 'done':
+                        answer, context_str = event['answer'], event['context']
+                        event = {'type': 'done', 'answer': answer}
+                    await sio.emit('chat_event', event, to=sid)
+            await save_qa(question, answer, logs.getvalue(), context_str, trace.to_dict())
+        except Exception as e:
+            rag_logger.error(f"Error in aquery_rag_stream: {e}")
+            await sio.emit('chat_event', {'type': 'error', 'error': str(e)}, to=sid)
+
+
+def _read_history(before_id, limit, search):
+    with db_utils.get_read_connection(DB_NAME) as conn:
+        return db_utils.get_qa_history(conn, before_id=before_id, limit=limit, search=search)
+
+
+def _read_history_details(id):
+    with db_utils.get_read_connection(DB_NAME) as conn:
+        return db_utils.get_qa_details(conn, id)
+
+
+def _read_history_trace(id):
+    with db_utils.get_read_connection(DB_NAME) as conn:
+        return db_utils.get_qa_trace(conn, id)
+
+
+async def get_history(request):
+    """One page of questions, newest first: ?before_id=<next_before_id>&limit=50&q=<search>"""
+    params = request.query_params
+    try:
+        before_id = int(params['before_id']) if params.get('before_id') else None
+        limit = int(params.get('limit') or HISTORY_PAGE_SIZE)
+    except ValueError:
+        return JSONResponse({'error': 'before_id and limit must be integers'}, status_code=400)
+    try:
+        return JSONResponse(await asyncio.to_thread(_read_history, before_id, limit, params.get('q', '').strip() or None))
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_history_details(request):
+    try:
+        details = await asyncio.to_thread(_read_history_details, request.path_params['id'])
+        if details:
+            return JSONResponse(details)
+        return JSONResponse({'error': 'Not found'}, status_code=404)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_history_trace(request):
+    try:
+        trace = await asyncio.to_thread(_read_history_trace, request.path_params['id'])
+        if trace:
+            return JSONResponse(trace)
+        return JSONResponse({'error': 'Not found'}, status_code=404)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_stats(request):
+    return JSONResponse(get_pipeline_stats())
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Initialize DB tables
+    with db_utils.get_db_connection(DB_NAME) as conn:
+        db_utils.create_qa_tables(conn)
+    # log records are routed to the asking session and sent in batches
+    log_stream.install(rag_logger, log_batch_sender(asyncio.get_running_loop()), formatter)
+    # Open the shared vector store and load the reranker before the first /chat request
+    await asyncio.to_thread(retriever_pool.warm_up)
+    await asyncio.to_thread(reranker.warm_up)
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(log_stream.uninstall, rag_logger)
+        await asyncio.to_thread(get_qa_log_writer().close)
+        retriever_pool.close_all()
+
+
+starlette_app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/chat', chat, methods=['POST']),
+        Route('/chat/batch', chat_batch, methods=['POST']),
+        Route('/history', get_history, methods=['GET']),
+        Route('/history/{id:int}', get_history_details, methods=['GET']),
+        Route('/history/{id:int}/trace', get_history_trace, methods=['GET']),
+        Route('/stats', get_stats, methods=['GET']),
+        Mount('/static', StaticFiles(directory=os.path.join(server_dir, 'static')), name='static'),
+    ],
+    lifespan=lifespan
+)
+
+app = socketio.ASGIApp(sio, other_asgi_app=starlette_app)
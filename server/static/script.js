@@ -10,6 +10,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const tabLogs = document.getElementById('tab-logs');
     const tabHistory = document.getElementById('tab-history');
     const historyContainer = document.getElementById('history-container');
+    const historyList = document.getElementById('history-list');
+    const historySearch = document.getElementById('history-search');
+    const historyMore = document.getElementById('history-more');
 
     tabLogs.addEventListener('click', () => {
         tabLogs.classList.add('active');
@@ -26,33 +29,59 @@ document.addEventListener('DOMContentLoaded', () => {
         loadHistory();
     });
 
-    async function loadHistory() {
-        historyContainer.innerHTML = '<div class="log-entry system">Loading history...</div>';
-        try {
-            const res = await fetch('/history');
-            const history = await res.json();
+    // History is paged: /history returns a page and the id to continue before
+    let historyNextBeforeId = null;
 
-            historyContainer.innerHTML = '';
-            if (history.length === 0) {
-                historyContainer.innerHTML = '<div class="log-entry system">No history found.</div>';
+    async function loadHistory(more = false) {
+        if (!more) {
+            historyNextBeforeId = null;
+            historyList.innerHTML = '<div class="log-entry system">Loading history...</div>';
+        }
+        historyMore.classList.add('hidden');
+        try {
+            const params = new URLSearchParams();
+            const search = historySearch.value.trim();
+            if (search) params.set('q', search);
+            if (more && historyNextBeforeId) params.set('before_id', historyNextBeforeId);
+            const res = await fetch(`/history?${params}`);
+            const page = await res.json();
+            if (page.error) throw new Error(page.error);
+
+            if (!more) historyList.innerHTML = '';
+            if (!more && page.items.length === 0) {
+                historyList.innerHTML = '<div class="log-entry system">No history found.</div>';
                 return;
             }
 
-            history.forEach(item => {
+            page.items.forEach(item => {
                 const itemDiv = document.createElement('div');
                 itemDiv.className = 'history-item';
-                itemDiv.innerHTML = `
-                    <div class="history-question">${item.question}</div>
-                    <div class="history-date">${new Date(item.timestamp).toLocaleString()}</div>
-                `;
+                const questionDiv = document.createElement('div');
+                questionDiv.className = 'history-question';
+                questionDiv.textContent = item.question;
+                const dateDiv = document.createElement('div');
+                dateDiv.className = 'history-date';
+                dateDiv.textContent = new Date(item.timestamp).toLocaleString();
+                itemDiv.append(questionDiv, dateDiv);
                 itemDiv.addEventListener('click', () => loadHistoryDetails(item.id));
-                historyContainer.appendChild(itemDiv);
+                historyList.appendChild(itemDiv);
             });
+
+            historyNextBeforeId = page.next_before_id;
+            if (historyNextBeforeId) historyMore.classList.remove('hidden');
         } catch (e) {
-            historyContainer.innerHTML = `<div class="log-entry ERROR">Error loading history: ${e.message}</div>`;
+            historyList.innerHTML = `<div class="log-entry ERROR">Error loading history: ${e.message}</div>`;
         }
     }
 
+    historyMore.addEventListener('click', () => loadHistory(true));
+
+    let historySearchTimer = null;
+    historySearch.addEventListener('input', () => {
+        clearTimeout(historySearchTimer);
+        historySearchTimer = setTimeout(() => loadHistory(), 300);
+    });
+
     async function loadHistoryDetails(id) {
         try {
             const res = await fetch(`/history/${id}`);
@@ -105,6 +134,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 chatMessages.appendChild(contextDiv);
             }
 
+            await showTrace(id);
+
             // Show logs
             logContainer.innerHTML = '';
             if (data.logs) {
@@ -132,23 +163,112 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Handle WebSocket Logs
-    socket.on('log_message', (msg) => {
-        const entry = document.createElement('div');
-        entry.className = 'log-entry';
-
-        // Simple heuristic for log level styling
-        if (msg.data.includes('ERROR')) entry.classList.add('ERROR');
-        else if (msg.data.includes('WARNING')) entry.classList.add('WARNING');
-        else entry.classList.add('INFO');
+    // Stage timings of a history entry, drawn as a waterfall
+    async function showTrace(id) {
+        const res = await fetch(`/history/${id}/trace`);
+        if (!res.ok) return; // questions from before tracing have none
+        const trace = await res.json();
+        const total = trace.total_ms || Math.max(1, ...trace.spans.map(s => s.start_ms + s.duration_ms));
+
+        const traceDiv = document.createElement('div');
+        traceDiv.className = 'context-container';
+
+        const toggleBtn = document.createElement('button');
+        toggleBtn.textContent = `Show Trace (${Math.round(total)} ms)`;
+        toggleBtn.className = 'toggle-context-btn';
+
+        const table = document.createElement('div');
+        table.className = 'trace-content hidden';
+        trace.spans.forEach(span => {
+            const row = document.createElement('div');
+            row.className = 'trace-row';
+
+            const name = document.createElement('div');
+            name.className = 'trace-stage';
+            name.textContent = span.stage;
+
+            const track = document.createElement('div');
+            track.className = 'trace-track';
+            const bar = document.createElement('div');
+            bar.className = 'trace-bar';
+            if (span.attributes.error) bar.classList.add('error');
+            bar.style.marginLeft = `${(span.start_ms / total) * 100}%`;
+            bar.style.width = `${Math.max(0.5, (span.duration_ms / total) * 100)}%`;
+            track.appendChild(bar);
+
+            const ms = document.createElement('div');
+            ms.className = 'trace-ms';
+            ms.textContent = `${span.duration_ms.toFixed(1)} ms`;
+
+            const attrs = document.createElement('div');
+            attrs.className = 'trace-attrs';
+            attrs.textContent = Object.entries(span.attributes)
+                .map(([key, value]) => `${key}=${JSON.stringify(value)}`)
+                .join('  ');
+
+            row.append(name, track, ms, attrs);
+            table.appendChild(row);
+        });
+
+        toggleBtn.addEventListener('click', () => {
+            const hidden = table.classList.toggle('hidden');
+            toggleBtn.textContent = `${hidden ? 'Show' : 'Hide'} Trace (${Math.round(total)} ms)`;
+        });
+
+        traceDiv.appendChild(toggleBtn);
+        traceDiv.appendChild(table);
+        chatMessages.appendChild(traceDiv);
+    }
 
-        entry.textContent = msg.data;
-        logContainer.appendChild(entry);
+    // Handle WebSocket Logs, the server sends this session's lines in batches
+    socket.on('log_batch', (batch) => {
+        const fragment = document.createDocumentFragment();
+        batch.lines.forEach(line => {
+            const entry = document.createElement('div');
+            entry.className = 'log-entry';
+
+            // Simple heuristic for log level styling
+            if (line.includes('ERROR')) entry.classList.add('ERROR');
+            else if (line.includes('WARNING')) entry.classList.add('WARNING');
+            else entry.classList.add('INFO');
+
+            entry.textContent = line;
+            fragment.appendChild(entry);
+        });
+        if (batch.dropped) {
+            const note = document.createElement('div');
+            note.className = 'log-entry system';
+            note.textContent = `... ${batch.dropped} log line(s) skipped`;
+            fragment.appendChild(note);
+        }
+        logContainer.appendChild(fragment);
 
         // Auto-scroll
         logContainer.scrollTop = logContainer.scrollHeight;
     });
 
+    // Streamed answer currently being received
+    let streamingMessage = null;
+
+    socket.on('chat_event', (event) => {
+        if (!streamingMessage) return;
+        const { contentDiv, button } = streamingMessage;
+
+        if (event.type === 'candidates') {
+            contentDiv.dataset.text = '';
+            contentDiv.innerHTML = `<span class="candidates-note">Found ${event.data.length} matching section(s), generating answer...</span>`;
+        } else if (event.type === 'token') {
+            contentDiv.dataset.text = (contentDiv.dataset.text || '') + event.data;
+            contentDiv.innerHTML = contentDiv.dataset.text.replace(/\n/g, '<br>');
+        } else if (event.type === 'done' || event.type === 'error') {
+            const text = event.type === 'done' ? event.answer : 'Error: ' + event.error;
+            contentDiv.innerHTML = (text || '').replace(/\n/g, '<br>');
+            button.disabled = false;
+            streamingMessage = null;
+        }
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    });
+
     // Handle Chat Submission
     chatForm.addEventListener('submit', async (e) => {
         e.preventDefault();
@@ -163,6 +283,14 @@ document.addEventListener('DOMContentLoaded', () => {
         const button = chatForm.querySelector('button');
         button.disabled = true;
 
+        // Prefer streaming over the socket, fall back to the blocking endpoint
+        if (socket.connected) {
+            const contentDiv = addMessage('Searching...', 'bot');
+            streamingMessage = { contentDiv, button };
+            socket.emit('chat_stream', { question: text });
+            return;
+        }
+
         try {
             const controller = new AbortController();
             const timeoutId = setTimeout(() => controller.abort(), 480000); // 8 minutes timeout
@@ -207,5 +335,6 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Auto-scroll
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return contentDiv;
     }
 });
@@ -0,0 +1,45 @@
+import os
+import sys
+import socket
+import tempfile
+
+import pytest
+
+# The modules import config and each other from common/, as the scripts do
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+sys.path.insert(0, COMMON_DIR)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# config reads the environment once, on import: the tests run on the fake
+# backend, with every store in a scratch directory
+SCRATCH_DIR = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_PORT"] = str(_free_port())
+os.environ["DB_PATH"] = os.path.join(SCRATCH_DIR, "vector_db")
+os.environ["DB_NAME"] = os.path.join(SCRATCH_DIR, "db.db")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(SCRATCH_DIR, "embedding_cache.db")
+for name in ("FAKE_LLM_URL", "FAKE_LLM_LATENCY", "FAKE_LLM_ERROR_RATE", "GEMINI_BASE_URL"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def fake_server():
+    """Starts fake LLM servers on free ports, fake_server(**behaviour); stopped after the test."""
+    from functions.fake_llm_server import start_fake_server
+
+    servers = []
+
+    def start(**behaviour):
+        server = start_fake_server("127.0.0.1", 0, **behaviour)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+import functions.answer_cache as answer_cache
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    answer_cache.create_answer_cache_table(conn)
+    yield conn
+    conn.close()
+
+
+def save(conn, question, emails, sections, scoped=False):
+    answer_cache.save_cached_answer(conn, question, f"answer to {question}", "context", emails, sections, scoped=scoped)
+
+
+def cached_questions(conn):
+    return sorted(row[0] for row in conn.execute("SELECT question FROM answer_cache"))
+
+
+def test_invalidates_entries_of_changed_candidates(conn):
+    save(conn, "What are the skills of Ada?", ["ada@example.com"], ["skills"], scoped=True)
+    save(conn, "What are the skills of Grace?", ["grace@example.com"], ["skills"], scoped=True)
+
+    assert answer_cache.invalidate_answers(conn, emails=["ada@example.com"], sections=["skills"]) == 1
+    assert cached_questions(conn) == ["What are the skills of Grace?"]
+
+
+def test_invalidates_open_searches_over_changed_sections(conn):
+    save(conn, "Who knows Django?", ["ada@example.com"], ["skills"])
+    save(conn, "Who studied physics?", ["ada@example.com"], ["education"])
+
+    answer_cache.invalidate_answers(conn, emails=["new@example.com"], sections=["skills"])
+
+    assert cached_questions(conn) == ["Who studied physics?"]
+
+
+def test_open_search_over_every_section_is_invalidated(conn):
+    # no sections: the section routing fell back to searching every section
+    save(conn, "Who would fit a startup?", ["ada@example.com"], [])
+    save(conn, "What did Grace build?", ["grace@example.com"], [], scoped=True)
+
+    assert answer_cache.invalidate_answers(conn, emails=["new@example.com"], sections=["projects"]) == 1
+    assert cached_questions(conn) == ["What did Grace build?"]
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.genai import errors
+
+import functions.gemini_utils as gemini_utils
+from functions.gemini_utils import GeminiClientManager, backoff_delay
+from functions.llm_backends import GeminiBackend
+
+# GeminiClientManager against the fake server: retries with backoff on
+# injected 503s, the concurrency limit and the stats counters.
+
+
+def make_manager(server, **kwargs):
+    return GeminiClientManager(api_key="test", base_url=server.url, timeout=10, rate=0, **kwargs)
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """The attempts that backed off before a retry, without the sleeping."""
+    attempts = []
+
+    def delay(attempt):
+        attempts.append(attempt)
+        return 0
+
+    monkeypatch.setattr(gemini_utils, "backoff_delay", delay)
+    return attempts
+
+
+def test_backoff_delay_is_capped_full_jitter():
+    for attempt in range(8):
+        for _ in range(20):
+            assert 0 <= backoff_delay(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2 ** attempt)
+
+
+def test_retries_503_until_success(fake_server, backoffs):
+    server = fake_server(error_rate=0.5, error_status=503, seed=7)
+    manager = make_manager(server, max_retries=10)
+
+    answers = [manager.generate(f"question {i}") for i in range(6)]
+
+    assert all(answers)
+    injected = server.stats()["errors_injected"]
+    assert injected > 0
+    stats = manager.stats()
+    assert stats["succeeded"] == 6
+    assert stats["failed"] == injected
+    assert stats["retries"] == injected
+    assert stats["errors"] == {"503": injected}
+    assert len(backoffs) == injected
+    assert server.stats()["requests"] == 6 + injected
+
+
+def test_gives_up_after_max_retries(fake_server, backoffs):
+    server = fake_server(error_rate=1.0, error_status=503)
+    manager = make_manager(server, max_retries=2)
+
+    with pytest.raises(errors.APIError) as raised:
+        manager.generate("question")
+
+    assert raised.value.code == 503
+    assert backoffs == [0, 1]
+    stats = manager.stats()
+    assert (stats["calls"], stats["failed"], stats["retries"]) == (3, 3, 2)
+    assert server.stats()["requests"] == 3
+
+
+def test_client_errors_are_not_retried(fake_server, backoffs):
+    server = fake_server(error_rate=1.0, error_status=400)
+    manager = make_manager(server, max_retries=3)
+
+    with pytest.raises(errors.APIError):
+        manager.generate("question")
+
+    assert backoffs == []
+    assert server.stats()["requests"] == 1
+
+
+def test_gemini_backend_answers_empty_when_it_gives_up(fake_server, backoffs, monkeypatch):
+    server = fake_server(error_rate=1.0, error_status=503)
+    monkeypatch.setattr(gemini_utils, "_manager", make_manager(server, max_retries=1))
+    backend = GeminiBackend()
+
+    assert backend.chat("question") == ""
+    assert backend.json_chat("question") is None
+    assert list(backend.stream("question")) == []
+
+
+def test_concurrency_bound(fake_server):
+    server = fake_server(latency=0.2)
+    manager = make_manager(server, max_concurrency=2)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=manager.generate, args=(f"question {i}",)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = manager.stats()
+    assert stats["succeeded"] == 6
+    assert stats["max_in_flight"] == 2
+    assert stats["in_flight"] == 0
+    # three rounds of two requests
+    assert elapsed >= 0.6
+    assert stats["queued_seconds"] > 0
+
+
+def test_async_concurrency_bound(fake_server):
+    server = fake_server(latency=0.2)
+    manager = make_manager(server, max_concurrency=2)
+
+    async def run():
+        return await asyncio.gather(*(manager.agenerate(f"question {i}") for i in range(6)))
+
+    answers = asyncio.run(run())
+
+    assert all(answers)
+    stats = manager.stats()
+    assert stats["max_in_flight"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_stats_counters(fake_server):
+    server = fake_server(latency=0.05)
+    manager = make_manager(server)
+
+    manager.generate("one")
+    manager.generate("two", config={"response_mime_type": "application/json"})
+    chunks = list(manager.stream("three"))
+    vectors = manager.embed(["four", "five"])
+    asyncio.run(manager.agenerate("six"))
+
+    assert chunks and len(vectors) == 2
+    stats = manager.stats()
+    assert stats["calls"] == 5
+    assert stats["succeeded"] == 5
+    assert (stats["failed"], stats["retries"], stats["in_flight"]) == (0, 0, 0)
+    assert stats["errors"] == {}
+    assert stats["latency_max"] >= stats["latency_avg"] >= 0.05
+    assert stats["max_in_flight"] == 1
+    routes = server.stats()["routes"]
+    assert routes["gemini:generateContent"] == 3
+    assert routes["gemini:streamGenerateContent"] == 1
+    assert routes["gemini:batchEmbedContents"] == 1
+
+
+def test_closing_a_stream_early_is_not_a_failure(fake_server):
+    server = fake_server()
+    manager = make_manager(server)
+
+    stream = manager.stream("question")
+    next(stream)
+    stream.close()
+
+    async def run():
+        astream = manager.astream("question")
+        await astream.__anext__()
+        await astream.aclose()
+
+    asyncio.run(run())
+
+    stats = manager.stats()
+    assert (stats["calls"], stats["succeeded"], stats["failed"]) == (2, 2, 0)
+    assert stats["abandoned"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["errors"] == {}
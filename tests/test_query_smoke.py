@@ -0,0 +1,124 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+from conftest import SCRATCH_DIR
+
+# query_rag end to end on LLM_BACKEND=fake: two CVs ingested into the scratch
+# stores, then questions through polishing, routing, retrieval and generation.
+
+CVS = [
+    {
+        "structured_data": {
+            "general": {"name": "Ada Lovelace", "email": "ada@example.com", "position": "Backend Engineer"},
+            "skills": ["python", "django", "postgresql"],
+            "experience": [{"company_name": "Analytical Engines", "start_date": "2019", "end_date": "2024",
+                            "position": "Backend Engineer", "description": "Built Django APIs on PostgreSQL."}]
+        },
+        "summary": "Backend engineer building Python web services.",
+        "skills": "Python, Django, PostgreSQL, Docker",
+        "experience": "Analytical Engines, Backend Engineer, 2019-2024. Built Django APIs on PostgreSQL."
+    },
+    {
+        "structured_data": {
+            "general": {"name": "Grace Hopper", "email": "grace@example.com", "position": "Data Engineer"},
+            "skills": ["spark", "scala", "airflow"],
+            "experience": [{"company_name": "Compiler Works", "start_date": "2017", "end_date": "2023",
+                            "position": "Data Engineer", "description": "Ran Spark pipelines scheduled with Airflow."}]
+        },
+        "summary": "Data engineer running batch pipelines.",
+        "skills": "Spark, Scala, Airflow, Kafka",
+        "experience": "Compiler Works, Data Engineer, 2017-2023. Ran Spark pipelines scheduled with Airflow."
+    }
+]
+
+
+@pytest.fixture(scope="module")
+def ingested():
+    """The fixture CVs ingested with the fake backend; the working directory is the scratch directory."""
+    from config import PARSER
+    import ingest_new
+
+    cwd = os.getcwd()
+    os.chdir(SCRATCH_DIR)
+    try:
+        folder = os.path.join("processed", "json", PARSER)
+        os.makedirs(folder, exist_ok=True)
+        for i, cv in enumerate(CVS):
+            with open(os.path.join(folder, f"cv{i}.json"), "w", encoding="utf-8") as f:
+                json.dump(cv, f)
+        ingest_new.create_tables()
+        ingest_new.insert_data()
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def test_fake_backend_is_in_use():
+    from config import LLM_BACKEND, EMBEDDING_BACKEND, DB_NAME
+    from functions.llm_backends import get_llm_backend, get_embedding_backend
+
+    assert (LLM_BACKEND, EMBEDDING_BACKEND) == ("fake", "fake")
+    assert get_llm_backend().name == get_embedding_backend().name == "fake"
+    assert DB_NAME.startswith(SCRATCH_DIR)
+
+
+def test_query_rag(ingested):
+    from query import query_rag
+
+    answer, context = query_rag("Which candidates know Django and PostgreSQL?")
+
+    assert answer.strip()
+    assert "Sources:" in answer
+    assert context
+
+
+def test_query_rag_named_candidate(ingested):
+    from query import query_rag
+
+    answer, context = query_rag("What is the experience of Grace Hopper?")
+
+    assert answer.strip()
+    assert "cv1.json" in answer
+
+
+def test_query_rag_stream(ingested):
+    from query import query_rag_stream
+
+    events = list(query_rag_stream("Who has worked with Spark pipelines?"))
+
+    kinds = [event["type"] for event in events]
+    assert kinds[-1] == "done"
+    assert "token" in kinds
+    assert events[-1]["answer"].strip()
+
+
+def test_aquery_rag(ingested):
+    from async_query import aquery_rag
+
+    answer, context = asyncio.run(aquery_rag("Which candidates know Airflow?"))
+
+    assert answer.strip()
+    assert context
+
+
+def test_section_routing_starts_only_when_the_llm_polishes(ingested, monkeypatch):
+    import query
+
+    started = []
+    submit_stage = query.submit_stage
+
+    def recording_submit_stage(fn, *args):
+        started.append(args)
+        return submit_stage(fn, *args)
+
+    monkeypatch.setattr(query, "submit_stage", recording_submit_stage)
+
+    answer, _ = query.query_rag("hello there")
+    assert "only answer questions related" in answer
+    assert started == []
+
+    query.query_rag("Which candidates have run batch pipelines?")
+    assert started == [("Which candidates have run batch pipelines?",)]
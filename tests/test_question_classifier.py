@@ -0,0 +1,76 @@
+from config import PRECLASSIFIER_MIN_CONFIDENCE
+from functions.question_classifier import classify_question, find_names
+
+FULL_NAMES = {"athul jacob", "will smith", "mark twain"}
+NAME_PARTS = {"athul", "jacob", "will", "smith", "mark", "twain"}
+
+
+def classify(question):
+    return classify_question(question, FULL_NAMES, NAME_PARTS)
+
+
+def test_full_name_matches_in_any_case():
+    result = classify("what are the skills of athul jacob")
+
+    assert result["names"] == ["athul jacob"]
+    assert result["confidence"] == 0.9
+
+
+def test_email_matches():
+    result = classify("Where did jacob@example.com work?")
+
+    assert result["emails"] == ["jacob@example.com"]
+    assert result["confidence"] == 0.9
+
+
+def test_lower_case_name_part_is_an_ordinary_word():
+    assert find_names("who will mark the candidates with python skills", FULL_NAMES, NAME_PARTS) == ([], False)
+    assert classify("who will mark the candidates with python skills") is None
+
+
+def test_capitalised_name_part_matches():
+    result = classify("What projects has Mark built?")
+
+    assert result["names"] == ["Mark"]
+    assert result["confidence"] >= PRECLASSIFIER_MIN_CONFIDENCE
+
+
+def test_name_part_at_sentence_start_goes_to_the_llm():
+    names, uncertain = find_names("Will anyone here know Django?", FULL_NAMES, NAME_PARTS)
+    assert (names, uncertain) == (["Will"], True)
+
+    result = classify("Will anyone here know Django?")
+    assert result["confidence"] < PRECLASSIFIER_MIN_CONFIDENCE
+
+
+def test_full_name_wins_over_its_parts():
+    names, uncertain = find_names("Mark Twain and Athul worked together?", FULL_NAMES, NAME_PARTS)
+
+    assert names == ["Mark Twain", "Athul"]
+    assert not uncertain
+
+
+def test_greeting_is_not_related():
+    result = classify("hi there!")
+
+    assert result["polished_question"] == "not related"
+    assert result["classified_by"] == "greeting"
+
+
+def test_bare_name_is_a_candidate_lookup():
+    for question in ("athul jacob", "Athul Jacob?", "Hi Athul Jacob"):
+        result = classify(question)
+
+        assert result["classified_by"] == "entity"
+        assert result["names"] == [question.strip("?").replace("Hi ", "")]
+        assert result["polished_question"] != "not related"
+        assert result["confidence"] >= PRECLASSIFIER_MIN_CONFIDENCE
+
+
+def test_bare_email_is_a_candidate_lookup():
+    result = classify("jacob@example.com")
+
+    assert result["classified_by"] == "entity"
+    assert result["emails"] == ["jacob@example.com"]
+    assert result["polished_question"] == "Tell me about jacob@example.com?"
+    assert result["confidence"] >= PRECLASSIFIER_MIN_CONFIDENCE
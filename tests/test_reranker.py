@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+
+from functions.reranker import Reranker
+
+
+class CountingModel:
+    """Stands in for the cross-encoder: the score is the length of the chunk text."""
+
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=None):
+        self.pairs.extend(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+
+def make_reranker():
+    reranker = Reranker(batch_wait=0)
+    reranker._model = CountingModel()
+    return reranker
+
+
+def test_repeated_question_is_scored_from_the_cache():
+    reranker = make_reranker()
+    docs = [Document(id="a@example.com_skills", page_content="Python, Django")]
+
+    first = reranker.score("Who knows Django?", docs)
+    second = reranker.score("who knows  django?", docs)
+
+    assert first == second
+    assert len(reranker._model.pairs) == 1
+
+
+def test_reingested_chunk_is_scored_again():
+    reranker = make_reranker()
+    old = Document(id="a@example.com_skills", page_content="Python, Django")
+    new = Document(id="a@example.com_skills", page_content="Python, Django, PostgreSQL, Kubernetes")
+
+    before = reranker.score("Who knows Django?", [old])
+    after = reranker.score("Who knows Django?", [new])
+
+    assert after != before
+    assert len(reranker._model.pairs) == 2
@@ -0,0 +1,19 @@
+from functions.section_router import SectionRouter, SUMMARY_SECTIONS
+
+
+def make_router():
+    return SectionRouter(embed_fn=None, examples=[])
+
+
+def test_overview_question_searches_every_section():
+    result = make_router().route("tell me about athul")
+
+    assert result["sections"][:len(SUMMARY_SECTIONS)] == SUMMARY_SECTIONS
+    assert "skills" in result["sections"] and "experience" in result["sections"]
+
+
+def test_specific_question_stays_scoped():
+    result = make_router().route("which candidates know python and flutter")
+
+    assert result["sections"] == ["skills"]
+    assert result["confidence"] == "high"
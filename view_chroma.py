@@ -2,6 +2,7 @@ import streamlit as st
 from langchain_chroma import Chroma
 import json
 from common.config import collections
+from common.functions.retriever_pool import get_vector_store
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -55,12 +56,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Database Connection ---
-@st.cache_resource
 def get_db(collection_name):
-    return Chroma(
-        collection_name=collection_name,
+    # Browsing only, so no embedding function is needed
+    return get_vector_store(
         persist_directory="./vector_db",
-        embedding_function=None
+        collection_name=collection_name,
+        model_name=None
     )
 
 def main():